@@ -17,12 +17,23 @@
 
 import sys
 import time
+import queue
+import asyncio
 import datetime
 import tsmppt60_driver as CHARGE_CONTROLLER
 from solar_monitor import argparser
 from solar_monitor import config
 from solar_monitor import logger
-from solar_monitor.timer import RecursiveTimer
+from solar_monitor import profiling
+from solar_monitor.replay import Recorder
+from solar_monitor.replay import ReplaySource
+from solar_monitor.sample import Sample
+from solar_monitor.scheduler import Scheduler
+from solar_monitor.stats import REGISTRY
+from solar_monitor.timer import MonotonicTimer
+from solar_monitor.timer import OVERRUN_CATCH_UP
+from solar_monitor.timer import OVERRUN_CONCURRENT
+from solar_monitor.watchdog import MemoryWatchdog
 
 
 def start_triggers(triggers):
@@ -39,7 +50,8 @@ def start_triggers(triggers):
 
 
 def stop_triggers(triggers):
-    """ Stop event trigger/handler.
+    """ Stop event trigger/handler, and the worker threads of the dispatcher
+        shared by them if any.
 
     Args:
         triggers: List of event trigger to be started.
@@ -52,29 +64,116 @@ def stop_triggers(triggers):
     for trigger in triggers:
         trigger.join()
 
+    dispatchers = []
+    for trigger in triggers:
+        dispatcher = getattr(trigger, "dispatcher_", None)
+        if dispatcher is not None and dispatcher not in dispatchers:
+            dispatchers.append(dispatcher)
+
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
 
-def put_to_triggers(triggers, data):
+def tick_triggers(triggers):
+    """ Request event trigger/handler to run the periodic work like flushing
+        the batch or retrying the spooled uploads on their threads.
+
+    Args:
+        triggers: List of event trigger to be ticked.
+    Returns:
+        None
+    """
+    for trigger in triggers:
+        trigger.tick()
+
+
+def put_to_triggers(triggers, data, is_blocking=True):
     """ Put data to all event trigger.
 
     Args:
         triggers: List of event trigger to be started.
         data: data object to be put to all trigger.
+        is_blocking: wait for all triggers to receive the data if True. If
+            False, just hand off the data and return right away. A trigger
+            whose queue is full is skipped without affecting the others.
     Returns:
         None
     """
     for trigger in triggers:
-        trigger.put_q(data)
+        if is_blocking:
+            trigger.put_q(data)
+            continue
+
+        try:
+            trigger.put_q(data)
+        except queue.Full:
+            logger.warning("{} is busy, data at {} is not delivered.".format(
+                type(trigger).__name__, data["at"]))
+
+    if not is_blocking:
+        return
 
     for trigger in triggers:
         trigger.join_q()
 
 
+async def async_put_to_triggers(triggers, data, is_blocking=True):
+    """ Put data to all event trigger running on asyncio.
+
+    Args:
+        triggers: List of AsyncEventTrigger object.
+        data: data object to be put to all trigger.
+        is_blocking: wait for all triggers to receive the data if True.
+    Returns:
+        None
+    """
+    for trigger in triggers:
+        try:
+            await trigger.put(data)
+        except asyncio.QueueFull:
+            logger.warning("{} is busy, data at {} is not delivered.".format(
+                type(trigger).__name__, data["at"]))
+
+    if not is_blocking:
+        return
+
+    for trigger in triggers:
+        await trigger.join_q()
+
+
+def get_rawdata(host_name, is_status_all, port=80):
+    """ Get the status of charge controller as the data passed to triggers.
+
+    Args:
+        host_name: host address of charge controller.
+        is_status_all: get all status if True.
+        port: port number of charge controller.
+    Returns:
+        Sample object shared by all triggers and handlers.
+    """
+    now = datetime.datetime.utcnow()
+    with REGISTRY.measure("get_rawdata"):
+        system_status = CHARGE_CONTROLLER.SystemStatus(host_name, port=port)
+        got_data = system_status.get(is_status_all)
+
+    rawdata = Sample("solar", now, got_data)
+
+    for key, data in rawdata["data"].items():
+        logger.info(
+            "{date}: {group}, {elem}, {value}[{unit}]".format(
+                date=now, group=data["group"], elem=key,
+                value=str(data["value"]), unit=data["unit"]))
+
+    return rawdata
+
+
 def event_loop(**kwargs):
     """ Monitor charge controller and update database like xively or
         internal database. This method should be called with a timer.
 
     Args:
-        kwargs: keyword argument object
+        kwargs: keyword argument object. The polled data is also written to
+            "recorder" if it's given as replay.Recorder object.
     Returns:
         None
     Exceptions:
@@ -83,23 +182,199 @@ def event_loop(**kwargs):
     host_name = kwargs["host_name"]
     is_status_all = kwargs["status_all"]
     triggers = kwargs["triggers"]
+    is_blocking = not kwargs.get("non_blocking", False)
 
-    now = datetime.datetime.utcnow()
-    system_status = CHARGE_CONTROLLER.SystemStatus(host_name)
-    got_data = system_status.get(is_status_all)
+    with REGISTRY.measure("event_loop"):
+        try:
+            rawdata = get_rawdata(
+                host_name, is_status_all, kwargs.get("port", 80))
+        except Exception:
+            REGISTRY.count("poll_errors")
+            raise
 
-    rawdata = {}
-    rawdata["source"] = "solar"
-    rawdata["data"] = got_data
-    rawdata["at"] = now
+        recorder = kwargs.get("recorder")
+        if recorder is not None:
+            recorder.write(rawdata)
 
-    for key, data in got_data.items():
-        logger.info(
-            "{date}: {group}, {elem}, {value}[{unit}]".format(
-                date=now, group=data["group"], elem=key,
-                value=str(data["value"]), unit=data["unit"]))
+        with REGISTRY.measure("put_to_triggers"):
+            put_to_triggers(triggers, rawdata, is_blocking=is_blocking)
+
+
+async def async_event_loop(**kwargs):
+    """ Same as event_loop() but for the triggers running on asyncio. The
+        charge controller is polled on the executor not to block the other
+        tasks like uploading to cloud services.
+
+    Args:
+        kwargs: keyword argument object same as event_loop().
+    Returns:
+        None
+    """
+    host_name = kwargs["host_name"]
+    is_status_all = kwargs["status_all"]
+    triggers = kwargs["triggers"]
+    is_blocking = not kwargs.get("non_blocking", False)
+
+    with REGISTRY.measure("event_loop"):
+        loop = asyncio.get_event_loop()
+        try:
+            rawdata = await loop.run_in_executor(
+                None, get_rawdata, host_name, is_status_all,
+                kwargs.get("port", 80))
+        except Exception:
+            REGISTRY.count("poll_errors")
+            raise
+
+        recorder = kwargs.get("recorder")
+        if recorder is not None:
+            recorder.write(rawdata)
+
+        with REGISTRY.measure("put_to_triggers"):
+            await async_put_to_triggers(
+                triggers, rawdata, is_blocking=is_blocking)
+
+
+def replay_loop(source, **kwargs):
+    """ Put the recorded data to the triggers instead of polling charge
+        controller.
+
+    Args:
+        source: iterable of Sample objects like replay.ReplaySource.
+        kwargs: keyword argument object same as event_loop().
+    Returns:
+        Number of the replayed data.
+    """
+    triggers = kwargs["triggers"]
+    is_blocking = not kwargs.get("non_blocking", False)
+    replayed = 0
 
-    put_to_triggers(triggers, rawdata)
+    for rawdata in source:
+        with REGISTRY.measure("event_loop"):
+            with REGISTRY.measure("put_to_triggers"):
+                put_to_triggers(triggers, rawdata, is_blocking=is_blocking)
+        replayed += 1
+
+    return replayed
+
+
+async def async_replay_loop(source, **kwargs):
+    """ Same as replay_loop() but for the triggers running on asyncio. The
+        recorded data is read on the executor not to block the other tasks.
+
+    Args:
+        source: iterable of Sample objects like replay.ReplaySource.
+        kwargs: keyword argument object same as event_loop().
+    Returns:
+        Number of the replayed data.
+    """
+    triggers = kwargs["triggers"]
+    is_blocking = not kwargs.get("non_blocking", False)
+    replayed = 0
+
+    loop = asyncio.get_event_loop()
+    samples = iter(source)
+
+    for trigger in triggers:
+        await trigger.start()
+
+    try:
+        while True:
+            rawdata = await loop.run_in_executor(None, next, samples, None)
+            if rawdata is None:
+                break
+
+            with REGISTRY.measure("event_loop"):
+                with REGISTRY.measure("put_to_triggers"):
+                    await async_put_to_triggers(
+                        triggers, rawdata, is_blocking=is_blocking)
+            replayed += 1
+    finally:
+        for trigger in triggers:
+            await trigger.stop()
+        for trigger in triggers:
+            await trigger.join()
+
+    return replayed
+
+
+async def async_tick_loop(triggers, interval):
+    """ Call tick_triggers() with the interval until cancelled, like the
+        "tick" job of the scheduler in the threaded mode.
+
+    Args:
+        triggers: List of AsyncEventTrigger object.
+        interval: interval time as second.
+    Returns:
+        None
+    """
+    while True:
+        await asyncio.sleep(interval)
+        tick_triggers(triggers)
+
+
+async def async_main_loop(interval, tick_interval=10.0, **kwargs):
+    """ Start the triggers running on asyncio, and call async_event_loop()
+        with the interval until cancelled. The triggers are also ticked with
+        tick_interval to flush the batches and retry the spooled uploads.
+
+    Args:
+        interval: interval time as second.
+        tick_interval: interval time as second to tick the triggers.
+        kwargs: keyword argument object passed to async_event_loop().
+    Returns:
+        None
+    """
+    triggers = kwargs["triggers"]
+    for trigger in triggers:
+        await trigger.start()
+
+    loop = asyncio.get_event_loop()
+    deadline = loop.time()
+    ticker = asyncio.ensure_future(async_tick_loop(triggers, tick_interval))
+
+    try:
+        while True:
+            deadline += interval
+
+            try:
+                await async_event_loop(**kwargs)
+            except Exception as e:
+                logger.debug(str(e) + ' error!!!')
+
+            await asyncio.sleep(max(0, deadline - loop.time()))
+    finally:
+        ticker.cancel()
+        for trigger in triggers:
+            await trigger.stop()
+        for trigger in triggers:
+            await trigger.join()
+
+
+def run_on_new_loop(coro):
+    """ Run the coroutine as a task on a new event loop until it finishes. If
+        interrupted by KeyboardInterrupt, the task is cancelled and run until
+        it finishes before the loop is closed, so that the triggers are
+        stopped and joined by its cleanup.
+
+    Args:
+        coro: coroutine object like async_main_loop().
+    Returns:
+        Result of the coroutine.
+    """
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(coro)
+    try:
+        return loop.run_until_complete(task)
+    except KeyboardInterrupt:
+        if not task.done():
+            task.cancel()
+            try:
+                loop.run_until_complete(task)
+            except asyncio.CancelledError:
+                pass
+        raise
+    finally:
+        loop.close()
 
 
 def main():
@@ -108,21 +383,91 @@ def main():
 
     logger.configure(path_file=args.log_file, is_debug=args.debug)
 
+    if args.profile_dir:
+        profiling.install(args.profile_dir, top=args.profile_top)
+
+    recorder = Recorder(args.record_file) if args.record_file else None
+
     if args.just_get_status:
-        event_loop(**kwargs)
+        kwargs["triggers"] = []
+        kwargs["recorder"] = recorder
+        try:
+            event_loop(**kwargs)
+        finally:
+            if recorder is not None:
+                recorder.close()
         return
 
     triggers = config.init_triggers(**kwargs)
-    start_triggers(triggers)
 
     kwargs = {}
     kwargs["host_name"] = args.host_name
+    kwargs["port"] = args.port
     kwargs["status_all"] = args.status_all
     kwargs["triggers"] = triggers
-    timer = RecursiveTimer(args.interval, event_loop, **kwargs)
+    kwargs["non_blocking"] = args.non_blocking
+    kwargs["recorder"] = recorder
+
+    if args.replay_file:
+        source = ReplaySource(args.replay_file, speed=args.replay_speed)
+
+        if args.engine == "asyncio":
+            replayed = run_on_new_loop(async_replay_loop(source, **kwargs))
+        else:
+            start_triggers(triggers)
+            try:
+                replayed = replay_loop(source, **kwargs)
+            finally:
+                stop_triggers(triggers)
+
+        logger.info("{} data are replayed from {}.".format(replayed, args.replay_file))
+        return
+
+    if args.engine == "asyncio":
+        try:
+            run_on_new_loop(async_main_loop(
+                args.interval, tick_interval=args.tick_interval, **kwargs))
+        except KeyboardInterrupt:
+            logger.debug("monitor program will be killed by user.")
+            raise
+        finally:
+            if recorder is not None:
+                recorder.close()
+        return
+
+    start_triggers(triggers)
+
+    scheduler = Scheduler()
+    scheduler.add(
+        tick_triggers, args.tick_interval, name="tick",
+        timeout=args.tick_interval, kwargs={"triggers": triggers})
+
+    # the watchdog checks on its own thread not to delay the polling.
+    watchdog = None
+    if args.watchdog_interval > 0:
+        watchdog = MemoryWatchdog(
+            is_tracing=args.watchdog_trace, interval=args.watchdog_interval)
+        REGISTRY.add_source(watchdog)
+
+    # polling runs on the scheduler thread unless it should run concurrently.
+    timer = None
+    if args.overrun == OVERRUN_CONCURRENT:
+        timer = MonotonicTimer(
+            args.interval, event_loop, is_immediate=args.immediate,
+            overrun=args.overrun, max_concurrent=args.max_concurrent, **kwargs)
+        REGISTRY.add_source(timer, name="poll")
+    else:
+        scheduler.add(
+            event_loop, args.interval, delay=0 if args.immediate else None,
+            timeout=args.interval, is_catch_up=args.overrun == OVERRUN_CATCH_UP,
+            name="poll", kwargs=kwargs)
 
     try:
-        timer.start()
+        scheduler.start()
+        if timer is not None:
+            timer.start()
+        if watchdog is not None:
+            watchdog.start()
         while True:
             time.sleep(10)
     except KeyboardInterrupt:
@@ -133,7 +478,35 @@ def main():
         logger.debug("Another exception: " + str(e[0]) + " is raised.")
         raise
     finally:
-        timer.cancel()
-        stop_triggers(triggers)
+        if timer is not None:
+            timer.cancel()
+        if watchdog is not None:
+            watchdog.stop()
+        scheduler.stop()
+        try:
+            scheduler.join(timeout=args.interval)
+        except SystemError as e:
+            # the poll job is still running, but the triggers should stop.
+            logger.warning(str(e))
+        finally:
+            if watchdog is not None:
+                try:
+                    watchdog.join()
+                except (RuntimeError, SystemError) as e:
+                    # RuntimeError if interrupted before the watchdog started.
+                    logger.warning(str(e))
+            try:
+                stop_triggers(triggers)
+            finally:
+                if recorder is not None:
+                    recorder.close()
+
+        statuses = [] if timer is None else [dict(timer.get_status(), name="poll")]
+        statuses.extend(scheduler.get_status())
+        for status in statuses:
+            logger.info("{} executed {} and skipped {} ticks.".format(
+                status["name"], status["executed"], status["skipped"]))
+
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Append-only columnar archive of the polled data. The archive is a directory
+having one fixed-width column file per label and a timestamp column like below.
+
+    timestamp.i64         int64 microseconds since 1970-01-01 of each sample
+    battery_voltage.f64   float64 value of "Battery Voltage" of each sample
+    ...
+    columns.json          label -> {"file": column file name, "unit": unit}
+
+All column files are little endian and have the same number of rows, and NaN
+is written if the label is missing in a sample. The columns are read back
+through mmap without parsing and creating any object per row, as numpy arrays
+if numpy is installed or memoryview objects if not. The range of a column can
+be also exported as compressed blocks of solar_monitor.gorilla.
+"""
+
+import bisect
+import datetime
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from threading import Lock
+from solar_monitor.gorilla import encode_block
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TIMESTAMP_FILE = "timestamp.i64"
+COLUMNS_FILE = "columns.json"
+
+# max samples per compressed block, a day of 5 minutes interval.
+BLOCK_SIZE = 288
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+_INT64 = struct.Struct("<q")
+_FLOAT64 = struct.Struct("<d")
+_NAN = _FLOAT64.pack(float("nan"))
+
+
+def to_microseconds(at):
+    """ Convert datetime object to microseconds since 1970-01-01.
+
+    Args:
+        at: naive datetime object.
+    Returns:
+        int value of microseconds.
+    """
+    return (at - EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def from_microseconds(us):
+    """ Convert microseconds since 1970-01-01 to datetime object.
+
+    Args:
+        us: int value of microseconds.
+    Returns:
+        naive datetime object.
+    """
+    return EPOCH + datetime.timedelta(microseconds=int(us))
+
+
+def _get_file_name(label, used):
+    """ Make a column file name like "battery_voltage.f64" from the label. """
+    base = re.sub(r"[^0-9a-z]+", "_", label.lower()).strip("_") or "column"
+    name = base + ".f64"
+    i = 1
+    while name in used or name == TIMESTAMP_FILE:
+        name = "{}_{}.f64".format(base, i)
+        i += 1
+    return name
+
+
+def _map_column(path, typecode, dtype):
+    """ Map the column file on memory.
+
+    Returns:
+        numpy array or memoryview object of the column.
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        if numpy is not None:
+            return numpy.empty(0, dtype=dtype)
+        return memoryview(array(typecode))
+
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+
+    if numpy is not None:
+        return numpy.frombuffer(mapped, dtype=dtype)
+
+    if sys.byteorder == "little":
+        return memoryview(mapped).cast(typecode)
+
+    column = array(typecode, mapped)
+    column.byteswap()
+    return memoryview(column)
+
+
+class ColumnarArchive(object):
+    """ Append samples to the columnar archive and read them back.
+
+    Args:
+        path: directory path of the archive. Created if not exists.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, path):
+        self.path_ = path
+        self.lock_ = Lock()
+
+        # label -> {"file": column file name, "unit": unit}
+        self.columns_ = {}
+        # label -> file object opened to append.
+        self.files_ = {}
+        self.timestamp_file_ = None
+        self.rows_ = 0
+        self.last_us_ = None
+
+        self._load()
+
+    def _load(self):
+        """ Load the column index, and fit the columns to the number of rows
+            of the timestamp column in case the last append was interrupted.
+        """
+        os.makedirs(self.path_, exist_ok=True)
+
+        index_path = os.path.join(self.path_, COLUMNS_FILE)
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                self.columns_ = json.load(f)
+
+        timestamp_path = os.path.join(self.path_, TIMESTAMP_FILE)
+        size = os.path.getsize(timestamp_path) \
+            if os.path.exists(timestamp_path) else 0
+        self.rows_ = size // 8
+
+        for column in self.columns_.values():
+            with open(os.path.join(self.path_, column["file"]), "ab") as f:
+                if f.tell() > self.rows_ * 8:
+                    f.truncate(self.rows_ * 8)
+                elif f.tell() < self.rows_ * 8:
+                    f.write(_NAN * (self.rows_ - f.tell() // 8))
+
+        if size != self.rows_ * 8:
+            with open(timestamp_path, "ab") as f:
+                f.truncate(self.rows_ * 8)
+
+        if self.rows_ > 0:
+            with open(timestamp_path, "rb") as f:
+                f.seek((self.rows_ - 1) * 8)
+                self.last_us_ = _INT64.unpack(f.read(8))[0]
+
+    def _save_columns(self):
+        """ Save the column index atomically. """
+        index_path = os.path.join(self.path_, COLUMNS_FILE)
+        temp_path = index_path + ".tmp"
+
+        with open(temp_path, "w") as f:
+            json.dump(self.columns_, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_path, index_path)
+
+    def _get_file(self, label):
+        """ Get the column file of the label to append. The new column is
+            filled with NaN for the rows before it appears.
+        """
+        f = self.files_.get(label)
+        if f is not None:
+            return f
+
+        f = open(os.path.join(self.path_, self.columns_[label]["file"]), "ab")
+        if f.tell() < self.rows_ * 8:
+            f.write(_NAN * (self.rows_ - f.tell() // 8))
+
+        self.files_[label] = f
+        return f
+
+    def _add_column(self, label, unit):
+        """ Add the new column of the label. """
+        used = set(column["file"] for column in self.columns_.values())
+        self.columns_[label] = {"file": _get_file_name(label, used), "unit": unit}
+        self._save_columns()
+
+    def append(self, sample):
+        """ Append the sample as a row of all columns.
+
+        Args:
+            sample: Sample object or dict object having the same shape.
+        Raises:
+            ValueError if the timestamp is older than the last row.
+        """
+        us = to_microseconds(sample["at"])
+
+        with self.lock_:
+            if self.last_us_ is not None and us < self.last_us_:
+                raise ValueError(
+                    "{} is older than the last row.".format(sample["at"]))
+
+            data = sample["data"]
+            for label in data:
+                if label not in self.columns_:
+                    self._add_column(label, data[label]["unit"])
+
+            for label in self.columns_:
+                datum = data.get(label)
+                value = float("nan") if datum is None else datum["value"]
+                self._get_file(label).write(_FLOAT64.pack(value))
+
+            if self.timestamp_file_ is None:
+                self.timestamp_file_ = open(
+                    os.path.join(self.path_, TIMESTAMP_FILE), "ab")
+
+            # timestamp is written at last so that the row is valid only if
+            # all columns are written.
+            for f in self.files_.values():
+                f.flush()
+            self.timestamp_file_.write(_INT64.pack(us))
+            self.timestamp_file_.flush()
+
+            self.rows_ += 1
+            self.last_us_ = us
+
+    def __len__(self):
+        return self.rows_
+
+    def get_labels(self):
+        """ Get labels of the columns.
+
+        Returns:
+            list of labels.
+        """
+        return list(self.columns_)
+
+    def get_unit(self, label):
+        """ Get unit of the label like "V". """
+        return self.columns_[label]["unit"]
+
+    def read(self, label, start=None, end=None):
+        """ Read the column of the label in the time range without parsing.
+
+        Args:
+            label: label of the data like "Battery Voltage".
+            start: datetime object of the start (inclusive). None for the first.
+            end: datetime object of the end (exclusive). None for the last.
+        Returns:
+            (timestamps, values) tuple. timestamps is int64 microseconds since
+            1970-01-01 and values is float64. They are numpy arrays if numpy
+            is installed, or memoryview objects if not.
+        Raises:
+            KeyError if the label is not archived.
+        """
+        with self.lock_:
+            column = self.columns_[label]
+            rows = self.rows_
+
+        timestamps = _map_column(
+            os.path.join(self.path_, TIMESTAMP_FILE), "q", "<i8")[:rows]
+        values = _map_column(
+            os.path.join(self.path_, column["file"]), "d", "<f8")[:rows]
+
+        lo = 0 if start is None else \
+            bisect.bisect_left(timestamps, to_microseconds(start))
+        hi = rows if end is None else \
+            bisect.bisect_left(timestamps, to_microseconds(end))
+
+        return timestamps[lo:hi], values[lo:hi]
+
+    def encode(self, label, start=None, end=None, block_size=BLOCK_SIZE):
+        """ Export the column of the label in the time range as compressed
+            blocks.
+
+        Args:
+            label: label of the data like "Battery Voltage".
+            start: datetime object of the start (inclusive). None for the first.
+            end: datetime object of the end (exclusive). None for the last.
+            block_size: max number of samples per block.
+        Returns:
+            list of bytes objects in time order, each to be decoded by
+            solar_monitor.gorilla.decode_block().
+        Raises:
+            KeyError if the label is not archived.
+            ValueError if block_size is not positive.
+        """
+        if block_size <= 0:
+            raise ValueError("block_size must be positive.")
+
+        timestamps, values = self.read(label, start, end)
+        return [
+            encode_block(timestamps[i:i + block_size], values[i:i + block_size])
+            for i in range(0, len(timestamps), block_size)]
+
+    def close(self):
+        """ Close the column files. """
+        with self.lock_:
+            for f in self.files_.values():
+                f.close()
+            self.files_.clear()
+
+            if self.timestamp_file_ is not None:
+                self.timestamp_file_.close()
+                self.timestamp_file_ = None
@@ -17,6 +17,10 @@
 
 import sys
 import argparse
+from solar_monitor.event.base import Q_POLICIES
+from solar_monitor.event.base import Q_POLICY_RAISE
+from solar_monitor.timer import OVERRUN_POLICIES
+from solar_monitor.timer import OVERRUN_SKIP
 
 
 def init(argv=sys.argv[1:]):
@@ -35,6 +39,12 @@ def init(argv=sys.argv[1:]):
         default="192.168.1.20",
         help="TS-MPPT-60 host address"
     )
+    arg.add_argument(
+        "--port",
+        type=int,
+        default=80,
+        help="TS-MPPT-60 port number like 8080 of the simulator"
+    )
     arg.add_argument(
         "-xa", "--xively-api-key",
         type=str,
@@ -59,6 +69,103 @@ def init(argv=sys.argv[1:]):
         nargs='?', default=None, const=None,
         help="keenio write key"
     )
+    arg.add_argument(
+        "-kb", "--keenio-batch-size",
+        type=int,
+        default=1,
+        help="max number of polled data uploaded to keenio at once"
+    )
+    arg.add_argument(
+        "-kt", "--keenio-flush-interval",
+        type=float,
+        default=60.0,
+        help="max seconds to buffer polled data before uploading to keenio"
+    )
+    arg.add_argument(
+        "--spool-dir",
+        type=str,
+        default=None,
+        help="directory to spool data until uploaded to keenio/xively"
+    )
+    arg.add_argument(
+        "--spool-max-bytes",
+        type=int,
+        default=10 * 1024 * 1024,
+        help="max bytes of spool file for each cloud service"
+    )
+    arg.add_argument(
+        "--sqlite-path",
+        type=str,
+        default=None,
+        help="SQLite database file path to store data locally"
+    )
+    arg.add_argument(
+        "--sqlite-batch-size",
+        type=int,
+        default=1,
+        help="max number of polled data inserted to SQLite at once"
+    )
+    arg.add_argument(
+        "--raw-retention-days",
+        type=float,
+        default=7.0,
+        help="days to keep raw data on SQLite. 0 to keep forever"
+    )
+    arg.add_argument(
+        "--minute-retention-days",
+        type=float,
+        default=90.0,
+        help="days to keep 1 minute rollups on SQLite. 0 to keep forever"
+    )
+    arg.add_argument(
+        "--compact-interval",
+        type=float,
+        default=3600.0,
+        help="interval seconds to compact SQLite"
+    )
+    arg.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="port number to serve /metrics in Prometheus text format"
+    )
+    arg.add_argument(
+        "--metrics-host",
+        type=str,
+        default="127.0.0.1",
+        help="host address to serve /metrics"
+    )
+    arg.add_argument(
+        "--profile-dir",
+        type=str,
+        default=None,
+        help="directory to write profiles toggled by SIGUSR1 and "
+             "tracemalloc snapshots by SIGUSR2"
+    )
+    arg.add_argument(
+        "--profile-top",
+        type=int,
+        default=20,
+        help="number of allocations written to tracemalloc snapshot"
+    )
+    arg.add_argument(
+        "--watchdog-interval",
+        type=float,
+        default=600.0,
+        help="interval seconds to check memory growth. 0 to disable"
+    )
+    arg.add_argument(
+        "--watchdog-trace",
+        action='store_true',
+        default=False,
+        help="trace memory growth by package with tracemalloc"
+    )
+    arg.add_argument(
+        "--archive-dir",
+        type=str,
+        default=None,
+        help="directory path of columnar archive to store data locally"
+    )
     arg.add_argument(
         "-tck", "--twitter-consumer-key",
         type=str,
@@ -116,9 +223,52 @@ def init(argv=sys.argv[1:]):
     )
     arg.add_argument(
         "-i", "--interval",
+        type=float,
+        default=300.0,
+        help="Xively update interval with sec. fraction is available"
+    )
+    arg.add_argument(
+        "--record-file",
+        type=str,
+        default=None,
+        help="file path to record the polled data for replaying later"
+    )
+    arg.add_argument(
+        "--replay-file",
+        type=str,
+        default=None,
+        help="file path of the recorded data to feed triggers instead of polling"
+    )
+    arg.add_argument(
+        "--replay-speed",
+        type=float,
+        default=1.0,
+        help="times faster than the recorded pace. 0 for as fast as possible"
+    )
+    arg.add_argument(
+        "--immediate",
+        action='store_true',
+        default=False,
+        help="poll charge controller at start without waiting interval"
+    )
+    arg.add_argument(
+        "--overrun",
+        type=str,
+        choices=OVERRUN_POLICIES,
+        default=OVERRUN_SKIP,
+        help="what to do if polling takes longer than interval"
+    )
+    arg.add_argument(
+        "--tick-interval",
+        type=float,
+        default=10.0,
+        help="interval seconds to flush batches and retry spooled uploads"
+    )
+    arg.add_argument(
+        "--max-concurrent",
         type=int,
-        default=300,
-        help="Xively update interval with sec"
+        default=2,
+        help="max number of polling running concurrently on concurrent overrun"
     )
     arg.add_argument(
         "-l", "--log-file",
@@ -138,6 +288,38 @@ def init(argv=sys.argv[1:]):
         default=True,
         help="Get all status of charge controller"
     )
+    arg.add_argument(
+        "--non-blocking",
+        action='store_true',
+        default=False,
+        help="Hand off data to event triggers/handlers without waiting for them"
+    )
+    arg.add_argument(
+        "--queue-policy",
+        type=str,
+        choices=Q_POLICIES,
+        default=Q_POLICY_RAISE,
+        help="Policy of event trigger/handler queue if it is full"
+    )
+    arg.add_argument(
+        "--queue-timeout",
+        type=float,
+        default=3.0,
+        help="Timeout with sec to wait for queue with block policy"
+    )
+    arg.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Number of threads shared by event triggers/handlers, 0 means a thread per each"
+    )
+    arg.add_argument(
+        "--engine",
+        type=str,
+        choices=("thread", "asyncio"),
+        default="thread",
+        help="Engine to run event triggers/handlers"
+    )
     arg.add_argument(
         "--debug",
         action='store_true',
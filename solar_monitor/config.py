@@ -15,6 +15,11 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import datetime
+import os
+from solar_monitor.event.aio import AsyncTriggerAdapter
+from solar_monitor.event.base import Q_POLICY_RAISE
+from solar_monitor.event.dispatcher import Dispatcher
 from solar_monitor.event.trigger import DataIsUpdatedTrigger
 from solar_monitor.event.trigger import BatteryLowTrigger
 from solar_monitor.event.trigger import BatteryFullTrigger
@@ -22,7 +27,12 @@ from solar_monitor.event.trigger import ChargeCurrentHighTrigger
 from solar_monitor.event.handler import SystemHaltEventHandler
 from solar_monitor.event.handler import KeenIoEventHandler
 from solar_monitor.event.handler import XivelyEventHandler
+from solar_monitor.event.handler import SqliteStoreEventHandler
+from solar_monitor.event.handler import ArchiveEventHandler
+from solar_monitor.event.handler import RollupEventHandler
+from solar_monitor.event.handler import MetricsEventHandler
 from solar_monitor.event.handler import TweetBotEventHandler
+from solar_monitor.store import Compactor
 
 
 def init_triggers(**kwargs):
@@ -32,8 +42,22 @@ def init_triggers(**kwargs):
         kwargs: see init_args() function to know what option is there.
     Returns:
         list of event triggers which have event hnadlers according to config setting.
+        If "engine" is "asyncio", the triggers are AsyncTriggerAdapter objects
+        to run on asyncio event loop.
     """
-    data_updated_trigger = DataIsUpdatedTrigger()
+    is_blocking = not kwargs.get("non_blocking", False)
+
+    # common settings for all of event triggers and handlers.
+    listener_kwargs = {}
+    listener_kwargs["q_policy"] = kwargs.get("queue_policy", Q_POLICY_RAISE)
+    listener_kwargs["q_timeout"] = kwargs.get("queue_timeout", 3)
+
+    workers = kwargs.get("workers", 0)
+    if workers:
+        listener_kwargs["dispatcher"] = Dispatcher(workers=workers)
+
+    data_updated_trigger = DataIsUpdatedTrigger(
+        is_blocking=is_blocking, **listener_kwargs)
 
     def get_configs(*configs):
         for conf in configs:
@@ -41,28 +65,78 @@ def init_triggers(**kwargs):
                 return []
         return list(configs)
 
+    def get_spool_configs(file_name):
+        spool_dir = kwargs.get("spool_dir")
+        if not spool_dir:
+            return {}
+        return {
+            "spool_path": os.path.join(spool_dir, file_name),
+            "spool_max_bytes": kwargs["spool_max_bytes"]}
+
     configs = get_configs(
         kwargs["keenio_project_id"],
         kwargs["keenio_write_key"])
 
     if configs:
-        data_updated_trigger.append(KeenIoEventHandler(*configs))
+        kwconfigs = dict(listener_kwargs)
+        kwconfigs["batch_size"] = kwargs.get("keenio_batch_size", 1)
+        kwconfigs["batch_timeout"] = kwargs.get("keenio_flush_interval", 60)
+        kwconfigs.update(get_spool_configs("keenio.spool"))
+
+        data_updated_trigger.append(KeenIoEventHandler(*configs, **kwconfigs))
 
     configs = get_configs(
         kwargs["xively_api_key"],
         kwargs["xively_feed_key"])
 
     if configs:
-        data_updated_trigger.append(XivelyEventHandler(*configs))
+        kwconfigs = dict(listener_kwargs)
+        kwconfigs.update(get_spool_configs("xively.spool"))
+
+        data_updated_trigger.append(XivelyEventHandler(*configs, **kwconfigs))
+
+    config = kwargs.get("sqlite_path")
+    if config:
+        kwconfigs = dict(listener_kwargs)
+        kwconfigs["batch_size"] = kwargs.get("sqlite_batch_size", 1)
+
+        raw_days = kwargs.get("raw_retention_days", 7)
+        minute_days = kwargs.get("minute_retention_days", 90)
+        if raw_days > 0:
+            rollup_retentions = {}
+            if minute_days > 0:
+                rollup_retentions[60] = datetime.timedelta(days=minute_days)
+
+            kwconfigs["compactor"] = Compactor(
+                config,
+                raw_retention=datetime.timedelta(days=raw_days),
+                rollup_retentions=rollup_retentions,
+                interval=kwargs.get("compact_interval", 3600))
+
+        data_updated_trigger.append(SqliteStoreEventHandler(config, **kwconfigs))
+        data_updated_trigger.append(
+            RollupEventHandler(config, **listener_kwargs))
+
+    config = kwargs.get("metrics_port")
+    if config:
+        data_updated_trigger.append(MetricsEventHandler(
+            config, host=kwargs.get("metrics_host", "127.0.0.1"),
+            **listener_kwargs))
+
+    config = kwargs.get("archive_dir")
+    if config:
+        data_updated_trigger.append(
+            ArchiveEventHandler(config, **listener_kwargs))
 
     config = kwargs["battery_limit"]
     if config:
-        bat_low_trigger = BatteryLowTrigger(config)
+        bat_low_trigger = BatteryLowTrigger(
+            config, is_blocking=is_blocking, **listener_kwargs)
 
         config = kwargs["battery_limit_hook_script"]
         if config:
             bat_low_trigger.append(
-                SystemHaltEventHandler(config))
+                SystemHaltEventHandler(config, **listener_kwargs))
 
     configs = get_configs(
         kwargs["battery_limit"],
@@ -72,7 +146,7 @@ def init_triggers(**kwargs):
         kwargs["twitter_secret"])
 
     if configs:
-        kwconfigs = {}
+        kwconfigs = dict(listener_kwargs)
         kwconfigs["msgs"] = [
             "バッテリ電圧がかなり低下しています。",
             "現在{VALUE}[{UNIT}]ですので、PCサーバ等の電源を落とします。",
@@ -85,7 +159,8 @@ def init_triggers(**kwargs):
 
     config = kwargs["battery_full_limit"]
     if config:
-        bat_ful_trigger = BatteryFullTrigger(full_voltage=config)
+        bat_ful_trigger = BatteryFullTrigger(
+            full_voltage=config, is_blocking=is_blocking, **listener_kwargs)
 
         configs = get_configs(
             kwargs["twitter_consumer_key"],
@@ -94,7 +169,7 @@ def init_triggers(**kwargs):
             kwargs["twitter_secret"])
 
         if configs:
-            kwconfigs = {}
+            kwconfigs = dict(listener_kwargs)
             kwconfigs["msgs"] = [
                 "バッテリが満充電近くまで回復しました。",
                 "現在{VALUE}[{UNIT}]です。",
@@ -105,7 +180,8 @@ def init_triggers(**kwargs):
 
     config = kwargs["charge_current_high"]
     if config:
-        current_high_trigger = ChargeCurrentHighTrigger(high_current=config)
+        current_high_trigger = ChargeCurrentHighTrigger(
+            high_current=config, is_blocking=is_blocking, **listener_kwargs)
 
         configs = get_configs(
             kwargs["twitter_consumer_key"],
@@ -114,7 +190,7 @@ def init_triggers(**kwargs):
             kwargs["twitter_secret"])
 
         if configs:
-            kwconfigs = {}
+            kwconfigs = dict(listener_kwargs)
             kwconfigs["msgs"] = [
                 "太陽が出てきましたかね。本領発揮です。",
                 "充電流量が{VALUE}[{UNIT}]になりました。",
@@ -133,6 +209,9 @@ def init_triggers(**kwargs):
     if "current_high_trigger" in locals():
         triggers.append(current_high_trigger)
 
+    if kwargs.get("engine") == "asyncio":
+        triggers = [AsyncTriggerAdapter(trigger) for trigger in triggers]
+
     return triggers
 
 
@@ -0,0 +1,549 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+asyncio implementation of the event trigger/handler classes in base module.
+The inheritance tree is same as base module like below, but each listener is an
+asyncio task fed by asyncio.Queue instead of a thread.
+
+AsyncEventListener
+   |- AsyncEventTrigger
+   |    `- AsyncTriggerAdapter      : Run IEventTrigger object on asyncio.
+   |
+   `- AsyncEventHandler
+        `- AsyncHandlerAdapter      : Run IEventHandler object on asyncio.
+
+AsyncEventHandler can implement _run() as coroutine function with "async def".
+If _run() is a normal function like the existing IEventHandler classes, it is
+run on the executor of the event loop not to block the other tasks. The
+adapter classes make the existing threaded triggers/handlers work on the event
+loop without starting their threads. The procedures of the wrapped objects at
+start, stop and tick() are also run on the executor, and the queue policies of
+them are applied to the queues on the event loop.
+"""
+
+import asyncio
+import time
+from solar_monitor import logger
+from solar_monitor.event.base import Q_POLICIES
+from solar_monitor.event.base import Q_POLICY_BLOCK
+from solar_monitor.event.base import Q_POLICY_COALESCE
+from solar_monitor.event.base import Q_POLICY_DROP_OLDEST
+from solar_monitor.event.base import Q_POLICY_RAISE
+from solar_monitor.stats import REGISTRY
+from solar_monitor.stats import Histogram
+
+
+class AsyncEventListener(object):
+    """ Base class to handle some event ex. trigger/handler on asyncio.
+
+    Args:
+        is_condition: callable object to return boolean if trigger condition
+            is true or not. If None or not callable, the condition is treated
+            as always False.
+        run_in_condition: Procedure to run if the condition is_condition()
+            returns True. Coroutine function is awaited, and normal function
+            is run on the executor.
+        q_max: max queue number
+        executor: concurrent.futures.Executor object to run normal function
+            of run_in_condition. Default executor of the event loop if None.
+        q_policy: one of base.Q_POLICIES to be applied if the queue is full.
+        q_timeout: timeout as second to wait for the free space of the queue
+            in put() if q_policy is Q_POLICY_BLOCK.
+    Returns:
+        Instance object
+    Raises:
+        ValueError: if q_policy is unknown.
+    """
+
+    def __init__(
+            self, is_condition=None, run_in_condition=None, q_max=5,
+            executor=None, q_policy=Q_POLICY_RAISE, q_timeout=3):
+        if q_policy not in Q_POLICIES:
+            raise ValueError("{} is unknown queue policy.".format(q_policy))
+
+        self.q_max_ = q_max
+        self.q_policy_ = q_policy
+        self.q_timeout_ = q_timeout
+        self.is_stopping_ = False
+        self.q_ = None
+        self.task_ = None
+        self.lock_ = None
+        self.is_tick_pending_ = False
+        self.executor_ = executor
+        self.is_condition_ = is_condition
+        self.run_in_condition_ = run_in_condition
+
+        self.status_ = {
+            "received": 0, "processed": 0, "failed": 0,
+            "dropped": 0, "coalesced": 0}
+        self.run_ = Histogram()
+
+        self.name_ = REGISTRY.add_source(self)
+
+    async def _call(self, func, data):
+        """ Call func with data. Await it if func is coroutine function,
+            otherwise run it on the executor.
+
+        Args:
+            func: callable object to be called.
+            data: argument to func.
+        Returns:
+            Value returned by func.
+        """
+        if asyncio.iscoroutinefunction(func):
+            return await func(data)
+
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor_, func, data)
+
+    async def _handle(self, got_data):
+        """ Judge the condition of the data got from the queue, and run
+            run_in_condition if the condition is matched.
+
+        Args:
+            got_data: data got from the internal queue.
+        Returns:
+            False if got_data is None which means to stop, otherwise True.
+        """
+        logger.debug("{} got data from queue.".format(type(self).__name__))
+
+        if got_data is None:
+            return False
+
+        self.status_["received"] += 1
+
+        started = time.monotonic()
+        try:
+            await self._judge_and_run(got_data)
+        finally:
+            self.run_.observe(time.monotonic() - started)
+
+        return True
+
+    async def _judge_and_run(self, got_data):
+        """ Run run_in_condition if is_condition returns True for the data.
+
+        Args:
+            got_data: data got from the internal queue.
+        """
+        if not self.is_condition_:
+            return
+        if not hasattr(self.is_condition_, "__call__"):
+            return
+        if not self.is_condition_(got_data):
+            return
+
+        if not self.run_in_condition_:
+            return
+        if not hasattr(self.run_in_condition_, "__call__"):
+            return
+
+        try:
+            await self._call(self.run_in_condition_, got_data)
+        except Exception as e:
+            self.status_["failed"] += 1
+            logger.error("{} failed to run: {}".format(
+                type(self).__name__, e))
+        else:
+            self.status_["processed"] += 1
+
+    async def _task_main(self):
+        """ Event loop task function. This task finishes if the received
+            queue is None.
+        """
+        while True:
+            got_data = await self.q_.get()
+            self.q_.task_done()
+
+            # never run along with _on_tick().
+            async with self.lock_:
+                is_continued = await self._handle(got_data)
+
+            if not is_continued:
+                break
+
+    async def start(self):
+        """ Start the task of event loop on the running event loop.
+
+        Exception:
+            RuntimeError: Raises if starting this task twice.
+        """
+        if self.task_ is not None:
+            raise RuntimeError("{} is already started.".format(
+                type(self).__name__))
+
+        self.q_ = asyncio.Queue(self.q_max_)
+        self.lock_ = asyncio.Lock()
+        self.task_ = asyncio.ensure_future(self._task_main())
+
+    async def stop(self):
+        """ Stop the task of event loop. Need to call join() method to wait
+            for this task finished. The data put after this is dropped, so the
+            request is never discarded by q_policy.
+        """
+        self.is_stopping_ = True
+        await self.q_.put(None)
+
+    async def join(self, timeout=3):
+        """ Wait until this task is finished.
+
+        Args:
+            timeout: Timeout to join as second.
+        Raise:
+            SystemError: If the task is not finished in timeout.
+        """
+        try:
+            await asyncio.wait_for(asyncio.shield(self.task_), timeout)
+        except asyncio.TimeoutError:
+            raise SystemError("{} cannot join the task.".format(
+                type(self).__name__))
+
+    def _drop(self):
+        """ Count the data dropped without putting to the internal queue. """
+        self.status_["dropped"] += 1
+        logger.warning("{} dropped data because the queue is full.".format(
+            type(self).__name__))
+
+    def _discard_oldest(self):
+        """ Discard the oldest data waiting in the internal queue.
+
+        Returns:
+            True if some data is discarded.
+        """
+        try:
+            self.q_.get_nowait()
+        except asyncio.QueueEmpty:
+            return False
+
+        self.q_.task_done()
+        return True
+
+    def put_q(self, data):
+        """ Put data to the internal queue without waiting. If the queue is
+            full, the data is treated according to q_policy like
+            IEventListener.put_q(). Q_POLICY_BLOCK can't wait here and drops
+            the data, so put() should be awaited to wait for the space.
+
+        Args:
+            data: data putting to the internal queue
+        Raises:
+            ValueError: if data is None
+            asyncio.QueueFull: if q_policy is Q_POLICY_RAISE and queue is full
+        """
+        if data is None:
+            raise ValueError("{} cannot put {} in queue.".format(
+                type(self).__name__, data))
+
+        if self.is_stopping_:
+            self._drop()
+            return
+
+        if self.q_policy_ == Q_POLICY_RAISE:
+            self.q_.put_nowait(data)
+            return
+
+        if self.q_policy_ == Q_POLICY_COALESCE:
+            while self._discard_oldest():
+                self.status_["coalesced"] += 1
+
+        if self.q_policy_ == Q_POLICY_DROP_OLDEST:
+            while self.q_.full() and self._discard_oldest():
+                self.status_["dropped"] += 1
+
+        try:
+            self.q_.put_nowait(data)
+        except asyncio.QueueFull:
+            self._drop()
+
+    async def put(self, data):
+        """ Same as put_q() except that the free space of the queue is waited
+            until q_timeout if q_policy is Q_POLICY_BLOCK.
+
+        Args:
+            data: data putting to the internal queue
+        Raises:
+            ValueError: if data is None
+            asyncio.QueueFull: if q_policy is Q_POLICY_RAISE and queue is full
+        """
+        if self.q_policy_ != Q_POLICY_BLOCK or data is None or \
+                self.is_stopping_:
+            self.put_q(data)
+            return
+
+        try:
+            await asyncio.wait_for(self.q_.put(data), self.q_timeout_)
+        except asyncio.TimeoutError:
+            self._drop()
+
+    async def join_q(self):
+        """ Wait for the internal queue received and done. """
+        await self.q_.join()
+
+    def tick(self):
+        """ Request to run _on_tick() on the running event loop, which never
+            runs along with the data handling. The request is ignored if the
+            previous one is still pending.
+
+        Returns:
+            True if requested.
+        """
+        if self.task_ is None or self.is_tick_pending_:
+            return False
+
+        self.is_tick_pending_ = True
+        asyncio.ensure_future(self._tick())
+        return True
+
+    async def _tick(self):
+        try:
+            async with self.lock_:
+                await self._call(lambda x: self._on_tick(), None)
+        except Exception as e:
+            logger.error("{} failed to tick: {}".format(
+                type(self).__name__, e))
+        finally:
+            self.is_tick_pending_ = False
+
+    def _on_tick(self):
+        """ Procedure to run periodically requested by tick(). This is run on
+            the executor. Nothing to do by default.
+        """
+        pass
+
+    def get_status(self):
+        """ Get the delivery status of this listener. See
+            IEventListener.get_status().
+        """
+        status = dict(self.status_)
+        status["queued"] = self.q_.qsize() if self.q_ is not None else 0
+        status["run"] = self.run_.get_snapshot()
+        return status
+
+
+class AsyncEventTrigger(AsyncEventListener):
+    """ Event trigger class on asyncio. Must implement _is_condition() method.
+
+    Args:
+        q_max: max queue number
+        is_blocking: wait for all event handlers to finish the data in
+            _run_in_condition() if True.
+        executor: see AsyncEventListener.
+        kwargs: keyword arguments passed to AsyncEventListener like q_policy.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, q_max=5, is_blocking=True, executor=None, **kwargs):
+        AsyncEventListener.__init__(
+            self, is_condition=self._is_condition,
+            run_in_condition=self._run_in_condition,
+            q_max=q_max, executor=executor, **kwargs)
+
+        self.event_handlers_ = []
+        self.is_blocking_ = is_blocking
+
+    def __len__(self):
+        return len(self.event_handlers_)
+
+    def _is_condition(self, data):
+        """ Trigger condition is matched or not. This method should be
+            implented in inherited class.
+
+        Args:
+            data: To judge the condition.
+        Returns:
+            True if the trigger condition is matched.
+        """
+        raise NotImplementedError
+
+    async def _run_in_condition(self, data):
+        """ Pass the data to the registered event handlers.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        for event_handler in self.event_handlers_:
+            try:
+                await event_handler.put(data)
+            except asyncio.QueueFull:
+                # one busy handler must not keep the others from the data.
+                event_handler._drop()
+
+        if not self.is_blocking_:
+            return
+
+        for event_handler in self.event_handlers_:
+            await event_handler.join_q()
+
+    def append(self, event_handler):
+        """ Register a event handler object should be triggerd if the condition
+            is matched.
+
+        Args:
+            event_handler: AsyncEventHandler object.
+        """
+        self.event_handlers_.append(event_handler)
+
+    async def start(self):
+        """ Start the task of this trigger and registered event handlers. """
+        for handler in self.event_handlers_:
+            await handler.start()
+
+        await super(AsyncEventTrigger, self).start()
+
+    async def join(self, timeout=3):
+        """ Wait until this task is finished, and then stop and wait for the
+            registered event handlers. They are stopped even if this task
+            cannot be joined.
+
+        Args:
+            timeout: Timeout to join as second.
+        Raise:
+            SystemError: If this or any handler task is not finished in
+                timeout.
+        """
+        try:
+            await super(AsyncEventTrigger, self).join(timeout)
+        finally:
+            for handler in self.event_handlers_:
+                await handler.stop()
+
+            for handler in self.event_handlers_:
+                await handler.join(timeout)
+
+    def tick(self):
+        """ Request to run _on_tick() of this trigger and registered event
+            handlers.
+
+        Returns:
+            True if requested to all of them.
+        """
+        ret = super(AsyncEventTrigger, self).tick()
+
+        for handler in self.event_handlers_:
+            ret = handler.tick() and ret
+
+        return ret
+
+    def get_status(self):
+        """ Get the delivery status of this trigger and registered handlers.
+            See IEventTrigger.get_status().
+        """
+        status = super(AsyncEventTrigger, self).get_status()
+        status["handlers"] = [
+            handler.get_status() for handler in self.event_handlers_]
+        return status
+
+
+class AsyncEventHandler(AsyncEventListener):
+    """ Event handler class on asyncio. Must implement _run() method as normal
+        function or coroutine function.
+
+    Args:
+        q_max: max queue number
+        executor: see AsyncEventListener.
+        kwargs: keyword arguments passed to AsyncEventListener like q_policy.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, q_max=5, executor=None, **kwargs):
+        AsyncEventListener.__init__(
+            self, is_condition=lambda x: True,
+            run_in_condition=self._run, q_max=q_max, executor=executor,
+            **kwargs)
+
+    def _run(self, data):
+        """ Procedure to run when data received from trigger task.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        raise NotImplementedError
+
+
+class AsyncHandlerAdapter(AsyncEventHandler):
+    """ Event handler to run the _run() method of IEventHandler object on the
+        executor. The thread of IEventHandler object is never started, but
+        its procedures at start and stop like starting the helper threads,
+        flushing the batch or closing the database, and _on_tick() are run.
+
+    Args:
+        handler: IEventHandler object.
+        executor: see AsyncEventListener.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, handler, executor=None):
+        AsyncEventHandler.__init__(
+            self, q_max=handler.q_.maxsize, executor=executor,
+            q_policy=handler.q_policy_, q_timeout=handler.q_timeout_)
+        self.handler_ = handler
+
+    def _run(self, data):
+        return self.handler_.run_in_condition_(data)
+
+    def _on_tick(self):
+        self.handler_._on_tick()
+
+    async def start(self):
+        await self._call(lambda x: self.handler_._on_start(), None)
+        await super(AsyncHandlerAdapter, self).start()
+
+    async def _handle(self, got_data):
+        # run the procedure of the handler at stop like IBatchEventHandler
+        # handling the collected data.
+        if got_data is None:
+            try:
+                await self._call(self.handler_._handle, None)
+            except Exception as e:
+                self.status_["failed"] += 1
+                logger.error("{} failed to stop: {}".format(
+                    type(self).__name__, e))
+
+        return await super(AsyncHandlerAdapter, self)._handle(got_data)
+
+
+class AsyncTriggerAdapter(AsyncEventTrigger):
+    """ Event trigger to judge the condition by IEventTrigger object. The
+        registered IEventHandler objects are also wrapped by
+        AsyncHandlerAdapter.
+
+    Args:
+        trigger: IEventTrigger object.
+        executor: see AsyncEventListener.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, trigger, executor=None):
+        AsyncEventTrigger.__init__(
+            self, q_max=trigger.q_.maxsize, is_blocking=trigger.is_blocking_,
+            executor=executor, q_policy=trigger.q_policy_,
+            q_timeout=trigger.q_timeout_)
+        self.trigger_ = trigger
+
+        for handler in trigger.event_handlers_:
+            self.append(AsyncHandlerAdapter(handler, executor=executor))
+
+    def _is_condition(self, data):
+        return self.trigger_.is_condition_(data)
+
+    def _on_tick(self):
+        self.trigger_._on_tick()
@@ -29,6 +29,7 @@ IEventListener
    |    `- PanelTempHighTrigger     : Catch the timing of solar panel's temparature getting too high.
    |
    `- IEventHandler
+        |- IBatchEventHandler       : Handle the data collected up to N items or T seconds at once.
         |- SystemHaltEventHandler   : Shutdown some devices consumpting power to save it.
         |- KeenIoEventHandler       : Upload the system status data to KeenIO service.
         |- XivelyEventHandler       : Upload the system status data to Xively service.
@@ -39,11 +40,50 @@ Event trigger class objects can have multiple event handler class objects. For
 example, if you want to tweet the battery voltage and shutdown some consumpting
 devices when battery voltage getting low, you make a BatteryLowTrigger object to
 have TweetEventHandler and SystemHaltEventHandler objects.
+
+Each event listener runs on its own thread by default. If a Dispatcher object
+in dispatcher module is given, the listeners run on the worker threads shared
+by all of them instead.
+
+The periodic work of the listeners like flushing the batch or retrying the
+spooled uploads is done in _on_tick() on the thread of the listener, which is
+requested by calling tick() from a scheduler.
 """
 
-from queue import Queue
+import time
+from queue import Empty
+from queue import Full
+from threading import Event
+from threading import Lock
 from threading import Thread
 from solar_monitor import logger
+from solar_monitor.event.dispatcher import is_worker_thread
+from solar_monitor.profiling import PROFILER
+from solar_monitor.stats import REGISTRY
+from solar_monitor.stats import Histogram
+from solar_monitor.stats import TimedQueue
+from solar_monitor.stats import WAKE
+
+# Policies of put_q() when the internal queue is full.
+#   raise       : raise queue.Full to the caller.
+#   block       : wait for the free space until q_timeout, and drop the data
+#                 if still full. On the worker thread of a dispatcher, which
+#                 may be the only one to drain the queue, drop_oldest instead.
+#   drop_oldest : drop the oldest data in the queue like a ring buffer.
+#   drop_newest : drop the data being put.
+#   coalesce    : keep only the latest data, pending data is replaced.
+Q_POLICY_RAISE = "raise"
+Q_POLICY_BLOCK = "block"
+Q_POLICY_DROP_OLDEST = "drop_oldest"
+Q_POLICY_DROP_NEWEST = "drop_newest"
+Q_POLICY_COALESCE = "coalesce"
+Q_POLICIES = (
+    Q_POLICY_RAISE,
+    Q_POLICY_BLOCK,
+    Q_POLICY_DROP_OLDEST,
+    Q_POLICY_DROP_NEWEST,
+    Q_POLICY_COALESCE,
+)
 
 
 class IEventListener(object):
@@ -56,69 +96,238 @@ class IEventListener(object):
         run_in_condition: Procedure to run if the condition is_condition()
             method returns True.
         q_max: max queue number
+        q_policy: one of Q_POLICIES to be applied if the queue is full.
+        q_timeout: timeout as second to wait for the free space of the queue
+            if q_policy is Q_POLICY_BLOCK.
+        dispatcher: Dispatcher object to run this listener on the shared
+            worker threads. If None, this listener has its own thread.
     Returns:
         Instance object
+    Raises:
+        ValueError: if q_policy is unknown.
     """
 
-    def __init__(self, is_condition=None, run_in_condition=None, q_max=5):
-        self.thread_ = Thread(
+    def __init__(
+            self, is_condition=None, run_in_condition=None, q_max=5,
+            q_policy=Q_POLICY_RAISE, q_timeout=3, dispatcher=None):
+        if q_policy not in Q_POLICIES:
+            raise ValueError("{} is unknown queue policy.".format(q_policy))
+
+        self.thread_ = None if dispatcher else Thread(
             target=self._thread_main, name=type(self).__name__, args=())
-        self.q_ = Queue(q_max)
+        self.dispatcher_ = dispatcher
+        self.drain_lock_ = Lock()
+        self.is_scheduled_ = False
+        self.stop_requested_ = Event()
+        self.event_stopped_ = Event()
+        self.tick_lock_ = Lock()
+        self.is_tick_pending_ = False
+        self.q_ = TimedQueue(q_max)
+        self.q_policy_ = q_policy
+        self.q_timeout_ = q_timeout
         self.is_condition_ = is_condition
         self.run_in_condition_ = run_in_condition
 
-    def _thread_main(self):
-        """ Event trigger loop thread function. The role is to receive queue
-            having raw data sent by main loop to monitor solar system, and pass
-            it to event handlers already registered. This thread is joined if
-            the received queue is None.
+        self.status_lock_ = Lock()
+        self.status_ = {
+            "received": 0, "processed": 0, "failed": 0,
+            "dropped": 0, "coalesced": 0}
+        self.run_ = Histogram()
 
-        Raises:
-            TypeError: If run_in_condition is None when initialize this object.
+        self.name_ = REGISTRY.add_source(self)
+
+    def _count(self, key):
+        """ Increment the delivery status counter specified by key.
+
+        Args:
+            key: One of "received", "processed", "failed", "dropped" or
+                "coalesced".
         """
-        while True:
-            if "got_data" in locals():
-                del got_data
+        with self.status_lock_:
+            self.status_[key] += 1
 
-            got_data = self.q_.get()
-            self.q_.task_done()
+    def _handle(self, got_data):
+        """ Judge the condition of the data got from the queue, and run
+            run_in_condition if the condition is matched.
+
+        Args:
+            got_data: data got from the internal queue.
+        Returns:
+            False if got_data is None which means to stop, otherwise True.
+        """
+        logger.debug("{} got data from queue.".format(type(self).__name__))
+
+        if got_data is None:
+            return False
+
+        self._count("received")
+
+        started = time.monotonic()
+        try:
+            with PROFILER.section():
+                self._judge_and_run(got_data)
+        finally:
+            self.run_.observe(time.monotonic() - started)
 
-            logger.debug("{} got data from queue.".format(type(self).__name__))
+        return True
+
+    def _judge_and_run(self, got_data):
+        """ Run run_in_condition if is_condition returns True for the data.
+
+        Args:
+            got_data: data got from the internal queue.
+        """
+        if not self.is_condition_:
+            return
+        if not hasattr(self.is_condition_, "__call__"):
+            return
+        if not self.is_condition_(got_data):
+            return
+
+        logger.debug("{} is_condition returns true.".format(type(self).__name__))
+
+        if not self.run_in_condition_:
+            return
+        if not hasattr(self.run_in_condition_, "__call__"):
+            return
+
+        logger.debug("{} calls run_in_condition.".format(type(self).__name__))
+
+        try:
+            self.run_in_condition_(got_data)
+        except Exception as e:
+            # keep this listener alive for the next data even if one
+            # delivery failed like network error of cloud service.
+            self._count("failed")
+            logger.error("{} failed to run: {}".format(
+                type(self).__name__, e))
+        else:
+            self._count("processed")
+
+    def _get_wait_timeout(self):
+        """ Get the max seconds for the thread of this listener to wait for the
+            next data. _on_wait_timeout() is called if no data comes.
+
+        Returns:
+            Seconds as float, or None to wait forever.
+        """
+        return None
+
+    def _on_wait_timeout(self):
+        """ Procedure to run if no data comes in _get_wait_timeout(). """
+        pass
+
+    def _run_tick(self):
+        """ Run _on_tick() if requested by tick() since the last run. """
+        with self.tick_lock_:
+            if not self.is_tick_pending_:
+                return
+            self.is_tick_pending_ = False
+
+        try:
+            with PROFILER.section():
+                self._on_tick()
+        except Exception as e:
+            logger.error("{} failed to tick: {}".format(
+                type(self).__name__, e))
+
+    def _is_stop_pending(self):
+        return self.stop_requested_.is_set() and \
+            not self.event_stopped_.is_set()
 
-            if got_data is None:
+    def _thread_main(self):
+        """ Event trigger loop thread function. The role is to receive queue
+            having raw data sent by main loop to monitor solar system, and pass
+            it to event handlers already registered. This thread is joined
+            after stop() is requested and the queue gets empty.
+        """
+        while True:
+            try:
+                got_data = self.q_.get_or_wake(timeout=self._get_wait_timeout())
+            except Empty:
+                self._on_wait_timeout()
+            else:
+                if got_data is not WAKE:
+                    self.q_.task_done()
+                    self._handle(got_data)
+
+            self._run_tick()
+
+            if self._is_stop_pending() and self.q_.empty():
+                self._handle(None)
+                self.event_stopped_.set()
                 break
 
-            if not self.is_condition_:
-                continue
-            if not hasattr(self.is_condition_, "__call__"):
-                continue
-            if not self.is_condition_(got_data):
+    def _drain(self):
+        """ Task run on the dispatcher's worker thread. Process all data in the
+            internal queue, and finish if the queue gets empty. Next _drain()
+            is scheduled by put_q() or stop() again.
+        """
+        while True:
+            self._run_tick()
+
+            try:
+                got_data = self.q_.get_nowait()
+            except Empty:
+                with self.drain_lock_:
+                    # check again with the lock not to miss the data put, the
+                    # tick or the stop requested while unscheduling.
+                    if self.q_.empty() and not self.is_tick_pending_ and \
+                            not self._is_stop_pending():
+                        self.is_scheduled_ = False
+                        return
+
+                if self._is_stop_pending() and self.q_.empty():
+                    self._handle(None)
+                    self.event_stopped_.set()
                 continue
 
-            logger.debug("{} is_condition returns true.".format(type(self).__name__))
+            self.q_.task_done()
+            self._handle(got_data)
 
-            if not self.run_in_condition_:
-                continue
-            if not hasattr(self.run_in_condition_, "__call__"):
-                continue
+    def _schedule(self):
+        """ Schedule _drain() on the dispatcher if not scheduled yet. """
+        if self.dispatcher_ is None:
+            return
 
-            logger.debug("{} calls run_in_condition.".format(type(self).__name__))
+        with self.drain_lock_:
+            if self.is_scheduled_:
+                return
+            self.is_scheduled_ = True
 
-            self.run_in_condition_(got_data)
+        self.dispatcher_.submit(self._drain)
+
+    def _on_start(self):
+        """ Procedure to run when this listener is started like starting the
+            helper threads. Nothing to do by default. The procedure at stop
+            should be done in _handle() with None.
+        """
+        pass
 
     def start(self):
-        """ Start the thread of event loop.
+        """ Start the thread of event loop. If the dispatcher is given, start
+            the dispatcher's worker threads instead.
 
         Exception:
             RuntimeError: Raises if starting this thread twice.
         """
+        self._on_start()
+
+        if self.dispatcher_ is not None:
+            self.dispatcher_.start()
+            return
+
         self.thread_.start()
 
     def stop(self):
-        """ Stop the thread of event loop. Need to call join() method to
-            terminate this thread completely.
+        """ Stop the thread of event loop after the data already put are
+            processed. Need to call join() method to terminate this thread
+            completely. The request is not put to the internal queue, so it's
+            never discarded by q_policy nor blocked by the full queue.
         """
-        self.q_.put(None, timeout=3)
+        self.stop_requested_.set()
+        self.q_.wake()
+        self._schedule()
 
     def join(self, timeout=3):
         """ Wait and block until this thread is teminated completely.
@@ -128,32 +337,152 @@ class IEventListener(object):
         Raise:
             SystemError: If the thread cannot be joined.
         """
+        if self.dispatcher_ is not None:
+            if not self.event_stopped_.wait(timeout):
+                raise SystemError("{} cannot stop on {}.".format(
+                    type(self).__name__, type(self.dispatcher_).__name__))
+            return
+
         self.thread_.join(timeout=timeout)
 
         if self.thread_.is_alive():
             raise SystemError("{} cannot join {} thread.".format(
                 type(self).__name__, self.thread_.name))
 
+    def _discard_oldest(self):
+        """ Discard the oldest data waiting in the internal queue.
+
+        Returns:
+            True if some data is discarded.
+        """
+        try:
+            self.q_.get_nowait()
+        except Empty:
+            return False
+
+        self.q_.task_done()
+        return True
+
     def put_q(self, data):
         """ Put data to the internal queue which is passed to exec() method.
+            If the queue is full, the data is treated according to q_policy
+            and counted as "dropped" or "coalesced" on get_status().
 
         Args:
             data: data putting to the internal queue
         Raises:
             ValueError: if data is None
-            queue.Full: if timeout is set and queue is full in the time
+            queue.Full: if q_policy is Q_POLICY_RAISE and queue is full
         """
 
         if data is None:
             raise ValueError("{} cannot put {} in queue.".format(
                 type(self).__name__, data))
 
-        self.q_.put_nowait(data)
+        try:
+            self._put_by_policy(data)
+        finally:
+            self._schedule()
+
+    def _put_by_policy(self, data):
+        """ Put data to the internal queue according to q_policy.
+
+        Args:
+            data: data putting to the internal queue
+        Raises:
+            queue.Full: if q_policy is Q_POLICY_RAISE and queue is full
+        """
+        q_policy = self.q_policy_
+        if q_policy == Q_POLICY_BLOCK and is_worker_thread():
+            # waiting here may wait for this worker itself to drain the queue.
+            q_policy = Q_POLICY_DROP_OLDEST
+
+        if q_policy == Q_POLICY_RAISE:
+            self.q_.put_nowait(data)
+            return
+
+        if q_policy == Q_POLICY_COALESCE:
+            while self._discard_oldest():
+                self._count("coalesced")
+
+        try:
+            if q_policy == Q_POLICY_BLOCK:
+                self.q_.put(data, timeout=self.q_timeout_)
+            else:
+                self.q_.put_nowait(data)
+            return
+        except Full:
+            pass
+
+        if q_policy == Q_POLICY_DROP_OLDEST:
+            while True:
+                if self._discard_oldest():
+                    self._count("dropped")
+                try:
+                    self.q_.put_nowait(data)
+                    return
+                except Full:
+                    continue
+
+        self._count("dropped")
+        logger.warning("{} dropped data because the queue is full.".format(
+            type(self).__name__))
+
+    def tick(self):
+        """ Request to run _on_tick() on the thread of this listener after the
+            data being processed. Like stop(), the request is not put to the
+            internal queue, so it never takes the space of the data. The
+            request is ignored if the previous one is still pending.
+
+        Returns:
+            True if requested.
+        """
+        with self.tick_lock_:
+            if self.is_tick_pending_:
+                return False
+            self.is_tick_pending_ = True
+
+        self.q_.wake()
+        self._schedule()
+        return True
+
+    def _on_tick(self):
+        """ Procedure to run periodically on the thread of this listener
+            requested by tick(). Nothing to do by default.
+        """
+        pass
 
     def join_q(self):
         """ Wait for the internal queue received and done. """
         self.q_.join()
 
+    def get_status(self):
+        """ Get the delivery status of this listener. The status is tracked
+            apart from put_q()/join_q(), so it can be read without waiting for
+            the queued data to be processed.
+
+        Returns:
+            dict object like below. "received" is the number of data got from
+            the queue, "processed" and "failed" are the results of
+            run_in_condition, "dropped" and "coalesced" are the number of data
+            discarded by q_policy, and "queued" is the number of data waiting
+            in the queue and "max_queued" is the max of it. "wait" and "run"
+            are the snapshots of stats.Histogram of the seconds the data waited
+            in the queue and the seconds to judge and run the data.
+
+            {"received": 3, "processed": 2, "failed": 1,
+             "dropped": 0, "coalesced": 0, "queued": 0, "max_queued": 2,
+             "wait": {"count": 3, ...}, "run": {"count": 3, ...}}
+        """
+        with self.status_lock_:
+            status = dict(self.status_)
+
+        status["queued"] = self.q_.qsize()
+        status["max_queued"] = self.q_.max_queued_
+        status["wait"] = self.q_.wait_.get_snapshot()
+        status["run"] = self.run_.get_snapshot()
+        return status
+
 
 class IEventTrigger(IEventListener):
     """ Event trigger class. Must implement _is_condition() and
@@ -161,17 +490,23 @@ class IEventTrigger(IEventListener):
 
     Args:
         q_max: max queue number
+        is_blocking: wait for all event handlers to finish the data in
+            _run_in_condition() if True. If False, the data is just handed off
+            to the event handlers and the delivery status is tracked by each
+            event handler's get_status().
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance object
     """
 
-    def __init__(self, q_max=5):
+    def __init__(self, q_max=5, is_blocking=True, **kwargs):
         IEventListener.__init__(
             self, is_condition=self._is_condition,
             run_in_condition=self._run_in_condition,
-            q_max=q_max)
+            q_max=q_max, **kwargs)
 
         self.event_handlers_ = []
+        self.is_blocking_ = is_blocking
 
     def __len__(self):
         return len(self.event_handlers_)
@@ -202,7 +537,19 @@ class IEventTrigger(IEventListener):
             data: Pass to the registered event handlers.
         """
         for event_handler in self.event_handlers_:
-            event_handler.put_q(data)
+            try:
+                event_handler.put_q(data)
+            except Full:
+                # one busy handler must not keep the others from the data.
+                event_handler._count("dropped")
+                logger.warning("{} dropped data because the queue is full.".format(
+                    type(event_handler).__name__))
+
+        # never wait on the dispatcher's worker thread because the handlers
+        # may need the same worker thread to drain their queue.
+        if not self.is_blocking_ or self.dispatcher_ is not None:
+            return
+
         for event_handler in self.event_handlers_:
             event_handler.join_q()
 
@@ -230,37 +577,75 @@ class IEventTrigger(IEventListener):
 
     def stop(self):
         """ Stop the thread of event trigger loop. Need to call join() method
-            to terminate this thread completely.
+            to terminate this thread and registered event handlers completely.
         """
 
-        for handler in self.event_handlers_:
-            handler.stop()
-
         # stop trigger event loop thread
         super(IEventTrigger, self).stop()
 
-    def join(self):
-        """ Wait and block until this thread is teminated completely. """
+    def join(self, timeout=3):
+        """ Wait and block until this thread is teminated completely. The
+            registered event handlers are stopped after this trigger finished,
+            so that all data passed by this trigger reach the handlers. They
+            are stopped even if this trigger cannot be joined, not to leave
+            their threads running at exit.
+
+        Args:
+            timeout: Timeout to join each thread as second.
+        Raise:
+            SystemError: If this or any handler thread cannot be joined.
+        """
+        try:
+            # wait for joining trigger event loop thread
+            super(IEventTrigger, self).join(timeout=timeout)
+        finally:
+            for handler in self.event_handlers_:
+                handler.stop()
+
+            for handler in self.event_handlers_:
+                handler.join(timeout=timeout)
+
+    def tick(self):
+        """ Request to run _on_tick() on the threads of this trigger and
+            registered event handlers.
+
+        Returns:
+            True if requested to all of them.
+        """
+        ret = super(IEventTrigger, self).tick()
 
         for handler in self.event_handlers_:
-            handler.join()
+            ret = handler.tick() and ret
 
-        # wait for joining trigger event loop thread
-        super(IEventTrigger, self).join()
+        return ret
+
+    def get_status(self):
+        """ Get the delivery status of this trigger and registered handlers.
+
+        Returns:
+            dict object which has "handlers" member in addition to the status
+            of IEventListener.get_status(). "handlers" is the list of each
+            event handler's status in registered order.
+        """
+        status = super(IEventTrigger, self).get_status()
+        status["handlers"] = [
+            handler.get_status() for handler in self.event_handlers_]
+        return status
 
 
 class IEventHandler(IEventListener):
     """ Event handler class. Must implement _run() method.
     Args:
             q_max: max queue number
+            kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance object
     """
 
-    def __init__(self, q_max=5):
+    def __init__(self, q_max=5, **kwargs):
         IEventListener.__init__(
             self, is_condition=lambda x: True,
-            run_in_condition=self._run, q_max=q_max)
+            run_in_condition=self._run, q_max=q_max, **kwargs)
 
     def _run(self, data):
         """ Procedure to run when data received from trigger thread.
@@ -269,3 +654,145 @@ class IEventHandler(IEventListener):
             data: Pass to the registered event handlers.
         """
         raise NotImplementedError
+
+
+class IBatchEventHandler(IEventHandler):
+    """ Event handler class to handle the data at once after collecting them
+        up to batch_size items or batch_timeout seconds. Must implement
+        _run_batch() method instead of _run(). The collected data is also
+        handled when this handler is stopped.
+
+    Args:
+        batch_size: max number of data handled at once.
+        batch_timeout: max seconds to keep the first data of the batch.
+        q_max: max queue number
+        kwargs: keyword arguments passed to IEventListener like q_policy.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, batch_size=10, batch_timeout=60, q_max=5, **kwargs):
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
+
+        self.batch_size_ = batch_size
+        self.batch_timeout_ = batch_timeout
+        self.batch_ = []
+        self.batch_started_ = None
+
+    def _get_flush_timeout(self):
+        """ Get the seconds until the collected data should be handled.
+
+        Returns:
+            Seconds as float, or None if no data is collected.
+        """
+        if not self.batch_:
+            return None
+
+        elapsed = time.monotonic() - self.batch_started_
+        return max(0, self.batch_timeout_ - elapsed)
+
+    def _run(self, data):
+        """ Collect the data received from trigger thread, and handle them if
+            the batch is full or too old.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        if not self.batch_:
+            self.batch_started_ = time.monotonic()
+
+        self.batch_.append(data)
+        self._trim_batch()
+
+        if len(self.batch_) >= self.batch_size_ or \
+                self._get_flush_timeout() == 0:
+            self.flush()
+
+    def flush(self):
+        """ Handle all collected data by _run_batch() right now. This should
+            be called on the thread of this handler. If _run_batch() raises,
+            the data is kept to be retried at the next flush, but only the
+            latest batch_size data are kept and the others are counted as
+            "dropped".
+        """
+        if not self.batch_:
+            return
+
+        batch = self.batch_
+        self.batch_ = []
+        self.batch_started_ = None
+
+        logger.debug("{} runs batch of {} data.".format(
+            type(self).__name__, len(batch)))
+
+        try:
+            self._run_batch(batch)
+        except Exception:
+            self._keep_batch(batch)
+            raise
+
+    def _keep_batch(self, batch):
+        """ Put back the batch failed to be handled, so that it's retried after
+            batch_timeout or when the next data comes.
+
+        Args:
+            batch: list of data failed to be handled.
+        """
+        self.batch_ = batch + self.batch_
+        self.batch_started_ = time.monotonic()
+        self._trim_batch()
+
+    def _trim_batch(self):
+        """ Drop the oldest data over batch_size kept by _keep_batch(). """
+        overflow = len(self.batch_) - self.batch_size_
+        if overflow <= 0:
+            return
+
+        with self.status_lock_:
+            self.status_["dropped"] += overflow
+        del self.batch_[:overflow]
+
+        logger.warning("{} dropped {} data failed to be handled.".format(
+            type(self).__name__, overflow))
+
+    def _on_tick(self):
+        """ Handle the collected data if batch_timeout passed. """
+        if self._get_flush_timeout() == 0:
+            self.flush()
+
+    def _flush_safely(self):
+        """ flush() without raising exception, which is counted as failed. """
+        try:
+            self.flush()
+        except Exception as e:
+            self._count("failed")
+            logger.error("{} failed to run batch: {}".format(
+                type(self).__name__, e))
+
+    def _handle(self, got_data):
+        if got_data is None:
+            self._flush_safely()
+
+            # the data failed even at the last chance are lost.
+            if self.batch_:
+                with self.status_lock_:
+                    self.status_["dropped"] += len(self.batch_)
+                self.batch_ = []
+
+        return super(IBatchEventHandler, self)._handle(got_data)
+
+    def _get_wait_timeout(self):
+        # the collected data is handled if no data is received until
+        # batch_timeout.
+        return self._get_flush_timeout()
+
+    def _on_wait_timeout(self):
+        self._flush_safely()
+
+    def _run_batch(self, samples):
+        """ Procedure to run with the collected data.
+
+        Args:
+            samples: list of data received from trigger thread in order.
+        """
+        raise NotImplementedError
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Shared worker thread pool for event triggers/handlers. In the default mode,
+each event listener has its own thread which mostly blocks on Queue.get(). If a
+Dispatcher object is given to the event listeners, they don't have any own
+thread and the procedure to drain each queue is scheduled on the bounded number
+of worker threads shared by all listeners. The data of a listener is processed
+one by one in the order put to it because only one drain of the listener is
+scheduled at a time.
+"""
+
+from queue import Queue
+from threading import Lock
+from threading import Thread
+from threading import local
+from solar_monitor import logger
+
+# dispatcher of the current thread if it's a worker thread.
+_WORKER = local()
+
+
+def is_worker_thread():
+    """ Test if the current thread is a worker thread of any dispatcher, which
+        must never block waiting for the listeners drained by the workers.
+
+    Returns:
+        True if called on a worker thread.
+    """
+    return getattr(_WORKER, "dispatcher", None) is not None
+
+
+class Dispatcher(object):
+    """ Bounded worker thread pool shared by event listeners.
+
+    Args:
+        workers: number of worker threads.
+    Returns:
+        Instance object
+    Raises:
+        ValueError: if workers is less than 1.
+    """
+
+    def __init__(self, workers=2):
+        if workers < 1:
+            raise ValueError("{} needs 1 worker at least.".format(
+                type(self).__name__))
+
+        # unbounded because a listener has one task at most scheduled, and
+        # submit() is called on the worker threads which must never block.
+        self.q_ = Queue()
+        self.lock_ = Lock()
+        self.threads_ = [
+            Thread(
+                target=self._worker_main,
+                name="{}-{}".format(type(self).__name__, i),
+                daemon=True)
+            for i in range(workers)]
+        self.is_started_ = False
+
+    def _worker_main(self):
+        """ Worker thread function to run the submitted tasks. This thread is
+            joined if the received task is None.
+        """
+        _WORKER.dispatcher = self
+
+        while True:
+            task = self.q_.get()
+            self.q_.task_done()
+
+            if task is None:
+                break
+
+            try:
+                task()
+            except Exception as e:
+                logger.error("{} failed to run task: {}".format(
+                    type(self).__name__, e))
+
+    def start(self):
+        """ Start all worker threads. This can be called many times by each
+            event listener, and starts the threads only at the first time.
+        """
+        with self.lock_:
+            if self.is_started_:
+                return
+            self.is_started_ = True
+
+        for thread in self.threads_:
+            thread.start()
+
+    def stop(self, timeout=3):
+        """ Stop and join all worker threads after running the tasks already
+            submitted.
+
+        Args:
+            timeout: Timeout to join each thread as second.
+        Raise:
+            SystemError: If some worker thread cannot be joined.
+        """
+        with self.lock_:
+            if not self.is_started_:
+                return
+
+        for thread in self.threads_:
+            self.q_.put(None, timeout=timeout)
+
+        for thread in self.threads_:
+            thread.join(timeout=timeout)
+
+            if thread.is_alive():
+                raise SystemError("{} cannot join {} thread.".format(
+                    type(self).__name__, thread.name))
+
+    def submit(self, task):
+        """ Schedule the task to be run on a worker thread.
+
+        Args:
+            task: callable object without any argument.
+        """
+        self.q_.put(task)
+
+    def __len__(self):
+        return len(self.threads_)
@@ -15,12 +15,22 @@
 #   See the License for the specific language governing permissions and
 #   limitations under the License.
 
+import datetime
 import subprocess
 import xively
 import tweepy
 from keen.client import KeenClient
 from solar_monitor import logger
+from solar_monitor.archive import ColumnarArchive
+from solar_monitor.event.base import IBatchEventHandler
 from solar_monitor.event.base import IEventHandler
+from solar_monitor.rollup import RESOLUTIONS
+from solar_monitor.rollup import Rollup
+from solar_monitor.sample import FieldRef
+from solar_monitor.spool import Spool
+from solar_monitor.spool import parse_isoformat
+from solar_monitor.spool import SpoolSender
+from solar_monitor.store import SqliteStore
 
 
 class SystemHaltEventHandler(IEventHandler):
@@ -31,12 +41,13 @@ class SystemHaltEventHandler(IEventHandler):
     Args:
         cmd: command to be run when the event is triggered.
         q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance of this class.
     """
 
-    def __init__(self, cmd, q_max=5):
-        IEventHandler.__init__(self, q_max=q_max)
+    def __init__(self, cmd, q_max=5, **kwargs):
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
         self.cmd_ = cmd
 
     def _run(self, data):
@@ -58,89 +69,373 @@ class SystemHaltEventHandler(IEventHandler):
         logger.info(stdout_data.decode())
 
 
-class KeenIoEventHandler(IEventHandler):
+class KeenIoEventHandler(IBatchEventHandler):
     """ The instance should be registered to event trigger for data update.
-        This uploads any data to keenio cloud service.
+        This uploads any data to keenio cloud service. The data of many polls
+        can be buffered and uploaded by one add_events() call.
 
     Args:
         project_id: Project ID provided by keenio.
         write_key: Write key ID provided by keenio.
+        batch_size: max number of polled data uploaded at once.
+        batch_timeout: max seconds to buffer the polled data.
+        spool_path: file path to spool the data until uploaded. The data is
+            retried with backoff if keenio is unreachable. No spool if None.
+        spool_max_bytes: max size of the spool file.
         q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance of this class.
     """
 
-    def __init__(self, project_id, write_key, q_max=5):
-        IEventHandler.__init__(self, q_max=q_max)
+    def __init__(
+            self, project_id, write_key, batch_size=1, batch_timeout=60,
+            spool_path=None, spool_max_bytes=10 * 1024 * 1024,
+            q_max=5, **kwargs):
+        IBatchEventHandler.__init__(
+            self, batch_size=batch_size, batch_timeout=batch_timeout,
+            q_max=q_max, **kwargs)
 
         self.client_ = KeenClient(
             project_id=project_id,
             write_key=write_key)
 
-    def _run(self, data):
-        """ Procedure to run when data received from trigger thread.
+        self.sender_ = None
+        if spool_path:
+            self.sender_ = SpoolSender(
+                Spool(spool_path, max_bytes=spool_max_bytes), self._send)
+
+    def _send(self, key, upload_items):
+        """ Upload the events to keenio.
 
         Args:
-            data: Pass to the registered event handlers.
+            key: idempotency key of the events.
+            upload_items: list of events.
         """
-        data_source = data["source"]
-        at = data["at"]
+        self.client_.add_events({"offgrid": upload_items})
+
+    def _run_batch(self, samples):
+        """ Procedure to run with the data buffered from trigger thread.
 
+        Args:
+            samples: list of data passed by trigger thread.
+        """
         upload_items = []
-        for label, datum in data["data"].items():
-            upload_item = datum
-            upload_item["label"] = label
-            upload_item["source"] = data_source
-            upload_item["keen"] = {"timestamp": "{}Z".format(at.isoformat())}
-            upload_items.append(upload_item)
+        for data in samples:
+            data_source = data["source"]
+            at = data["at"]
 
-        self.client_.add_events({"offgrid": upload_items})
+            for label, datum in data["data"].items():
+                upload_item = dict(datum)
+                upload_item["label"] = label
+                upload_item["source"] = data_source
+                upload_item["keen"] = {"timestamp": "{}Z".format(at.isoformat())}
+                upload_items.append(upload_item)
 
-        logger.info("{} sent data to keenio at {}".format(
-            type(self).__name__, at))
+        if self.sender_ is None:
+            self._send(None, upload_items)
+            action = "sent"
+        else:
+            key = "{}/{}".format(
+                samples[0]["at"].isoformat(), samples[-1]["at"].isoformat())
+            self.sender_.put(key, upload_items)
+            action = "spooled" if key in self.sender_.spool_ else "sent"
+
+        logger.info("{} {} {} data to keenio at {}".format(
+            type(self).__name__, action, len(samples), samples[-1]["at"]))
+
+    def _on_tick(self):
+        """ Flush the batch if timed out and retry the spooled events. """
+        super(KeenIoEventHandler, self)._on_tick()
+
+        if self.sender_ is not None:
+            self.sender_.deliver()
 
 
 class XivelyEventHandler(IEventHandler):
     """ The instance should be registered to event trigger for data update.
-        This uploads any data to xively cloud service.
+        This uploads any data to xively cloud service. A datastream object is
+        kept for each label and updated in place, and only the datastreams
+        whose value changed since the last upload are sent.
 
     Args:
         api_key: API key ID provided by xively.
         feed_key: Feed key ID provided by xively.
         q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance of this class.
     """
 
-    def __init__(self, api_key, feed_key, q_max=5):
-        IEventHandler.__init__(self, q_max=q_max)
+    def __init__(
+            self, api_key, feed_key, spool_path=None,
+            spool_max_bytes=10 * 1024 * 1024, q_max=5, **kwargs):
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
 
         api = xively.XivelyAPIClient(api_key)
         self.client_ = api.feeds.get(feed_key)
 
-    def _run(self, data):
-        """ Procedure to run when data received from trigger thread.
+        # label -> xively.Datastream object and the value sent last time.
+        self.datastreams_ = {}
+        self.sent_values_ = {}
+
+        self.sender_ = None
+        if spool_path:
+            self.sender_ = SpoolSender(
+                Spool(spool_path, max_bytes=spool_max_bytes), self._send)
+
+    def _send(self, key, payload):
+        """ Update the datastreams on xively.
 
         Args:
-            data: Pass to the registered event handlers.
+            key: idempotency key of the payload.
+            payload: dict object like {"at": datetime, "values": {label: value}}.
+                "at" can be ISO 8601 string read from the spool.
         """
-        at = data["at"]
+        at = payload["at"]
+        if not isinstance(at, datetime.datetime):
+            at = parse_isoformat(at)
 
         datastreams = []
-        for key, data in data["data"].items():
-            datastreams.append(
-                xively.Datastream(
-                    id="".join(key.split()),
-                    current_value=data["value"],
+        for label, value in payload["values"].items():
+            datastream = self.datastreams_.get(label)
+            if datastream is None:
+                datastream = xively.Datastream(
+                    id="".join(label.split()),
+                    current_value=value,
                     at=at
                 )
-            )
+                self.datastreams_[label] = datastream
+            else:
+                datastream.current_value = value
+                datastream.at = at
+
+            datastreams.append(datastream)
 
         self.client_.datastreams = datastreams
         self.client_.update()
 
-        logger.info("{} sent data to xively at {}".format(
-            type(self).__name__, at))
+    def _run(self, data):
+        """ Procedure to run when data received from trigger thread.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        at = data["at"]
+
+        values = {}
+        for label, datum in data["data"].items():
+            value = datum["value"]
+
+            if label in self.sent_values_ and self.sent_values_[label] == value:
+                continue
+
+            values[label] = value
+
+        if not values:
+            logger.debug("{} has no changed data at {}".format(
+                type(self).__name__, at))
+            return
+
+        if self.sender_ is None:
+            self._send(None, {"at": at, "values": values})
+            action = "sent"
+        else:
+            # the spool takes over the delivery even if failed now.
+            self.sender_.put(at.isoformat(), {"at": at.isoformat(), "values": values})
+            action = "spooled" if at.isoformat() in self.sender_.spool_ else "sent"
+
+        self.sent_values_.update(values)
+
+        logger.info("{} {} data to xively at {}".format(
+            type(self).__name__, action, at))
+
+    def _on_tick(self):
+        """ Retry the spooled data. """
+        if self.sender_ is not None:
+            self.sender_.deliver()
+
+
+class SqliteStoreEventHandler(IBatchEventHandler):
+    """ The instance should be registered to event trigger for data update.
+        This stores any data on the local SQLite database with the batched
+        insertion.
+
+    Args:
+        path: file path of the database.
+        batch_size: max number of polled data inserted at once.
+        batch_timeout: max seconds to buffer the polled data.
+        compactor: Compactor object to run along with this handler, or None.
+        q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
+    Returns:
+        Instance of this class.
+    """
+
+    def __init__(
+            self, path, batch_size=1, batch_timeout=60, compactor=None,
+            q_max=5, **kwargs):
+        IBatchEventHandler.__init__(
+            self, batch_size=batch_size, batch_timeout=batch_timeout,
+            q_max=q_max, **kwargs)
+
+        self.store_ = SqliteStore(path)
+        self.compactor_ = compactor
+
+    def _on_start(self):
+        if self.compactor_ is not None:
+            self.compactor_.start()
+
+    def _run_batch(self, samples):
+        """ Procedure to run with the data buffered from trigger thread.
+
+        Args:
+            samples: list of data passed by trigger thread.
+        """
+        rows = self.store_.insert(samples)
+
+        logger.info("{} stored {} rows at {}".format(
+            type(self).__name__, rows, samples[-1]["at"]))
+
+    def _handle(self, got_data):
+        ret = super(SqliteStoreEventHandler, self)._handle(got_data)
+
+        if got_data is None:
+            if self.compactor_ is not None:
+                self.compactor_.stop()
+                self.compactor_.join()
+            self.store_.close()
+
+        return ret
+
+
+class RollupEventHandler(IEventHandler):
+    """ The instance should be registered to event trigger for data update.
+        This keeps min/max/mean/count/last of any data per resolution, and
+        stores the finished buckets on the local SQLite database.
+
+    Args:
+        path: file path of the database.
+        resolutions: bucket widths in seconds.
+        q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
+    Returns:
+        Instance of this class.
+    """
+
+    def __init__(self, path, resolutions=RESOLUTIONS, q_max=5, **kwargs):
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
+
+        self.rollup_ = Rollup(resolutions)
+        self.store_ = SqliteStore(path)
+
+    def _run(self, data):
+        """ Procedure to run when data received from trigger thread.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        buckets = self.rollup_.update(data)
+        if not buckets:
+            return
+
+        self.store_.insert_rollups(buckets, self.rollup_.get_units())
+
+        logger.info("{} stored {} buckets finished at {}".format(
+            type(self).__name__, len(buckets), data["at"]))
+
+    def _handle(self, got_data):
+        ret = super(RollupEventHandler, self)._handle(got_data)
+
+        if got_data is None:
+            # store the running buckets, merged with the rest after restart
+            try:
+                buckets = self.rollup_.flush()
+                if buckets:
+                    self.store_.insert_rollups(
+                        buckets, self.rollup_.get_units())
+            except Exception as err:
+                logger.error("{} failed to store the running buckets: {}".format(
+                    type(self).__name__, err))
+            finally:
+                self.store_.close()
+
+        return ret
+
+
+class ArchiveEventHandler(IEventHandler):
+    """ The instance should be registered to event trigger for data update.
+        This appends any data to the local columnar archive.
+
+    Args:
+        path: directory path of the archive.
+        q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
+    Returns:
+        Instance of this class.
+    """
+
+    def __init__(self, path, q_max=5, **kwargs):
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
+
+        self.archive_ = ColumnarArchive(path)
+
+    def _run(self, data):
+        """ Procedure to run when data received from trigger thread.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        self.archive_.append(data)
+
+    def _handle(self, got_data):
+        ret = super(ArchiveEventHandler, self)._handle(got_data)
+
+        if got_data is None:
+            self.archive_.close()
+
+        return ret
+
+
+class MetricsEventHandler(IEventHandler):
+    """ The instance should be registered to event trigger for data update.
+        This serves the internals of the monitor and the latest data on
+        "/metrics" of the local HTTP server.
+
+    Args:
+        port: port number to listen.
+        host: host address to listen.
+        q_max: internal queue size to be used from another thread.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
+    Returns:
+        Instance of this class.
+    """
+
+    def __init__(self, port, host="127.0.0.1", q_max=5, **kwargs):
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
+
+        # imported here not to load http.server unless the metrics are served.
+        from solar_monitor.exporter import MetricsExporter
+        self.exporter_ = MetricsExporter(port, host=host)
+
+    def _on_start(self):
+        self.exporter_.start()
+
+    def _run(self, data):
+        """ Procedure to run when data received from trigger thread.
+
+        Args:
+            data: Pass to the registered event handlers.
+        """
+        self.exporter_.update(data)
+
+    def _handle(self, got_data):
+        ret = super(MetricsEventHandler, self)._handle(got_data)
+
+        if got_data is None:
+            self.exporter_.stop()
+
+        return ret
 
 
 class TweetBotEventHandler(IEventHandler):
@@ -154,6 +449,7 @@ class TweetBotEventHandler(IEventHandler):
         msgs: list of messages
         value_label: data's label you want to show on msgs as VALUE label
         q_max: Queue size of internal.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
 
     Returns:
         IEventHandler object.
@@ -166,9 +462,10 @@ class TweetBotEventHandler(IEventHandler):
             secret,
             msgs=["バッテリ電圧は{VALUE}{UNIT}です。", "{YEAR}年{MONTH}月{DAY}日{HOUR}時{MINUTE}分に取得したデータになります。"],
             value_label="Battery Voltage",
-            q_max=5):
+            q_max=5,
+            **kwargs):
 
-        IEventHandler.__init__(self, q_max=q_max)
+        IEventHandler.__init__(self, q_max=q_max, **kwargs)
 
         auth = tweepy.OAuthHandler(
             consumer_key=consumer_key,
@@ -178,13 +475,14 @@ class TweetBotEventHandler(IEventHandler):
         self.api_ = tweepy.API(auth)
         self.msg_ = "\n".join(msgs)
         self.label_ = value_label
+        self.value_ref_ = FieldRef(value_label)
 
     def _run(self, data):
         at = data["at"]
 
         msg = self.msg_.format(
             YEAR=at.year, MONTH=at.month, DAY=at.day, HOUR=at.hour, MINUTE=at.minute, SECOND=at.second,
-            UNIT=data["data"][self.label_]["unit"],
-            VALUE=round(number=data["data"][self.label_]["value"], ndigits=2))
+            UNIT=self.value_ref_.unit(data),
+            VALUE=round(number=self.value_ref_.value(data), ndigits=2))
 
         self.api_.update_status(msg)
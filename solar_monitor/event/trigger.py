@@ -19,6 +19,7 @@
 
 from solar_monitor import logger
 from solar_monitor.event.base import IEventTrigger
+from solar_monitor.sample import FieldRef
 
 
 class DataIsUpdatedTrigger(IEventTrigger):
@@ -44,13 +45,17 @@ class BatteryLowTrigger(IEventTrigger):
 
     Args:
         lowest_voltage: Low limit of battery voltage.
+        is_blocking: Wait for event handlers or not. See IEventTrigger.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance object.
     """
-    def __init__(self, lowest_voltage, q_max=5):
-        IEventTrigger.__init__(self, q_max=q_max)
+    def __init__(self, lowest_voltage, q_max=5, is_blocking=True, **kwargs):
+        IEventTrigger.__init__(
+            self, q_max=q_max, is_blocking=is_blocking, **kwargs)
         self.lowest_voltage_ = lowest_voltage
         self.pre_voltage_ = None
+        self.voltage_ref_ = FieldRef("Battery Voltage")
 
     def _is_condition(self, data):
         """ Returns True if battery voltage getting low and run over the limit
@@ -65,7 +70,7 @@ class BatteryLowTrigger(IEventTrigger):
             KeyError: Some key doesn't exist in received data.
         """
         ret = False
-        current_voltage = data["data"]["Battery Voltage"]["value"]
+        current_voltage = self.voltage_ref_.value(data)
 
         if self.pre_voltage_ is None:
             if self.lowest_voltage_ > current_voltage:
@@ -93,13 +98,17 @@ class BatteryFullTrigger(IEventTrigger):
 
     Args:
         full_voltage: Highet voltage if battery is charged full.
+        is_blocking: Wait for event handlers or not. See IEventTrigger.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance object.
     """
-    def __init__(self, full_voltage, q_max=5):
-        IEventTrigger.__init__(self, q_max=q_max)
+    def __init__(self, full_voltage, q_max=5, is_blocking=True, **kwargs):
+        IEventTrigger.__init__(
+            self, q_max=q_max, is_blocking=is_blocking, **kwargs)
         self.full_voltage_ = full_voltage
         self.pre_voltage_ = None
+        self.voltage_ref_ = FieldRef("Battery Voltage")
 
     def _is_condition(self, data):
         """ Returns True if battery voltage getting high and run over the limit
@@ -114,7 +123,7 @@ class BatteryFullTrigger(IEventTrigger):
             KeyError: Some key doesn't exist in received data.
         """
         ret = False
-        current_voltage = data["data"]["Battery Voltage"]["value"]
+        current_voltage = self.voltage_ref_.value(data)
 
         if self.pre_voltage_ is None:
             if self.full_voltage_ <= current_voltage:
@@ -142,13 +151,17 @@ class ChargeCurrentHighTrigger(IEventTrigger):
 
     Args:
         high_current: Charge current to be input to battery.
+        is_blocking: Wait for event handlers or not. See IEventTrigger.
+        kwargs: keyword arguments passed to IEventListener like q_policy.
     Returns:
         Instance object.
     """
-    def __init__(self, high_current, q_max=5):
-        IEventTrigger.__init__(self, q_max=q_max)
+    def __init__(self, high_current, q_max=5, is_blocking=True, **kwargs):
+        IEventTrigger.__init__(
+            self, q_max=q_max, is_blocking=is_blocking, **kwargs)
         self.high_current_ = high_current
         self.pre_current_ = None
+        self.current_ref_ = FieldRef("Charge Current")
 
     def _is_condition(self, data):
         """ Returns True if charge current getting high and run over the limit
@@ -163,7 +176,7 @@ class ChargeCurrentHighTrigger(IEventTrigger):
             KeyError: Some key doesn't exist in received data.
         """
         ret = False
-        current_charge_value = data["data"]["Charge Current"]["value"]
+        current_charge_value = self.current_ref_.value(data)
 
         if self.pre_current_ is None:
             if self.high_current_ <= current_charge_value:
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+HTTP endpoint exposing the internals of the monitor and the latest data of the
+charge controller on "/metrics" in the text format of Prometheus like below.
+
+    solar_monitor_reading{label="Battery Voltage",group="Battery",unit="V"} 12.5
+    solar_monitor_stage_seconds_bucket{stage="get_rawdata",le="0.001"} 0
+    solar_monitor_received_total{source="KeenIoEventHandler"} 10
+    solar_monitor_threads 8
+
+The statistics are read from stats.REGISTRY on every request. The numbers of
+the registered sources like the event listeners and the scheduler jobs are
+exported by their key names, the histograms by "_seconds" suffix, and the
+dict objects of numbers with "key" label.
+"""
+
+import threading
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+from solar_monitor import logger
+from solar_monitor.stats import REGISTRY
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:
+    # http.server has it since Python 3.7.
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+PREFIX = "solar_monitor_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# keys of the sources which only increase.
+COUNTER_KEYS = (
+    "received", "processed", "failed", "dropped", "coalesced",
+    "executed", "skipped", "late", "timeouts")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(
+        "{}=\"{}\"".format(key, _escape(value)) for key, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Writer(object):
+    """ Collect the samples of the metrics grouped by name. """
+
+    def __init__(self):
+        self.metrics_ = {}
+
+    def add(self, name, metric_type, labels, value, suffix=""):
+        samples = self.metrics_.setdefault(name, (metric_type, []))[1]
+        samples.append((name + suffix, labels, value))
+
+    def add_histogram(self, name, labels, snapshot):
+        cumulative = 0
+        for bound, count in snapshot["buckets"]:
+            cumulative += count
+            self.add(
+                name, "histogram", labels + (("le", _format_value(bound)),),
+                cumulative, "_bucket")
+        self.add(name, "histogram", labels, snapshot["sum"], "_sum")
+        self.add(name, "histogram", labels, snapshot["count"], "_count")
+
+    def to_text(self):
+        lines = []
+        for name, (metric_type, samples) in sorted(self.metrics_.items()):
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for sample_name, labels, value in samples:
+                lines.append("{}{} {}".format(
+                    sample_name, _format_labels(labels), _format_value(value)))
+        return "\n".join(lines) + "\n"
+
+
+def render(snapshot, sample=None, threads=None):
+    """ Render the metrics in the text format.
+
+    Args:
+        snapshot: dict object returned by stats.Registry.get_snapshot().
+        sample: the latest Sample object or None.
+        threads: number of the threads or None.
+    Returns:
+        str object.
+    """
+    writer = _Writer()
+
+    for stage, histogram in sorted(snapshot["stages"].items()):
+        writer.add_histogram(PREFIX + "stage_seconds", (("stage", stage),), histogram)
+
+    for name, value in sorted(snapshot["counters"].items()):
+        writer.add(PREFIX + name + "_total", "counter", (), value)
+
+    for source, status in sorted(snapshot["sources"].items()):
+        labels = (("source", source),)
+
+        for key, value in sorted(status.items()):
+            if isinstance(value, dict) and "buckets" in value:
+                writer.add_histogram(PREFIX + key + "_seconds", labels, value)
+            elif isinstance(value, dict):
+                # numbers by name like {"gen0": 10, "gen1": 2} as a gauge.
+                for name, number in sorted(value.items()):
+                    if isinstance(number, (int, float)) and \
+                            not isinstance(number, bool):
+                        writer.add(
+                            PREFIX + key, "gauge", labels + (("key", name),), number)
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            elif key in COUNTER_KEYS:
+                writer.add(PREFIX + key + "_total", "counter", labels, value)
+            else:
+                writer.add(PREFIX + key, "gauge", labels, value)
+
+    if sample is not None:
+        for label, datum in sorted(sample["data"].items()):
+            value = datum["value"]
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+
+            labels = (
+                ("label", label), ("group", datum["group"]),
+                ("unit", datum["unit"]), ("source", sample["source"]))
+            writer.add(PREFIX + "reading", "gauge", labels, value)
+
+    if threads is not None:
+        writer.add(PREFIX + "threads", "gauge", (), threads)
+
+    return writer.to_text()
+
+
+class MetricsExporter(object):
+    """ Serve "/metrics" on the thread of HTTP server. The port is bound on
+        start(), so that the instance can be made before the monitor starts.
+
+    Args:
+        port: port number to listen. 0 to choose a free port.
+        host: host address to listen. Only local access by default.
+        registry: stats.Registry object to be exported.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, port, host="127.0.0.1", registry=REGISTRY):
+        self.address_ = (host, port)
+        self.registry_ = registry
+        self.sample_ = None
+        self.server_ = None
+        self.thread_ = None
+
+    def _make_handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = exporter.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics: " + format % args)
+
+        return Handler
+
+    def get_port(self):
+        """ Get the port number listened, or None if not started. """
+        if self.server_ is None:
+            return None
+        return self.server_.server_address[1]
+
+    def update(self, sample):
+        """ Set the latest data exported as gauges.
+
+        Args:
+            sample: Sample object.
+        """
+        self.sample_ = sample
+
+    def render(self):
+        """ Render the current metrics in the text format. """
+        return render(
+            self.registry_.get_snapshot(), self.sample_, threading.active_count())
+
+    def start(self):
+        """ Bind the port and start the thread of HTTP server.
+
+        Raises:
+            OSError: if the port cannot be bound.
+        """
+        self.server_ = ThreadingHTTPServer(self.address_, self._make_handler())
+        self.server_.daemon_threads = True
+        self.thread_ = threading.Thread(
+            target=self.server_.serve_forever, name=type(self).__name__,
+            daemon=True)
+        self.thread_.start()
+
+    def stop(self):
+        """ Stop the HTTP server and wait for the thread terminated. Nothing
+            is done if not started.
+        """
+        if self.server_ is None:
+            return
+
+        self.server_.shutdown()
+        self.server_.server_close()
+        self.thread_.join()
+        self.server_ = None
+        self.thread_ = None
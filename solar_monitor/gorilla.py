@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Compressed encoding of time-series block like Gorilla of Facebook. The
+timestamps are encoded by delta-of-delta and the values are encoded by XOR
+with the previous value, so the block of evenly spaced timestamps and slowly
+drifting values like voltages becomes a few bits per sample.
+
+The block is laid out like below.
+
+    header: count (32 bits), first timestamp (64 bits), first value (64 bits)
+    then for each of the following samples:
+        delta-of-delta of timestamp
+            '0'                     if 0
+            '10'    + 7 bits        if in [-63, 64]
+            '110'   + 9 bits        if in [-255, 256]
+            '1110'  + 12 bits       if in [-2047, 2048]
+            '11110' + 32 bits       if in [-2 ** 31 + 1, 2 ** 31]
+            '11111' + 64 bits       otherwise
+        XOR of value with the previous value
+            '0'                     if 0
+            '10' + meaningful bits  if in the window of the previous XOR
+            '11' + leading zeros (5 bits) + length (6 bits) + meaningful bits
+"""
+
+import struct
+
+_DOUBLE = struct.Struct(">d")
+_UINT64 = struct.Struct(">Q")
+
+# (prefix, prefix bits, value bits) of delta-of-delta.
+_DOD_BUCKETS = (
+    (0b10, 2, 7),
+    (0b110, 3, 9),
+    (0b1110, 4, 12),
+    (0b11110, 5, 32),
+)
+
+
+def _to_bits(value):
+    return _UINT64.unpack(_DOUBLE.pack(value))[0]
+
+
+def _from_bits(bits):
+    return _DOUBLE.unpack(_UINT64.pack(bits))[0]
+
+
+class BitWriter(object):
+    """ Write bits to a byte string. The bits are kept in a small int only
+        until a whole 64 bits word is written, and then moved to a bytearray,
+        so the cost of writing doesn't grow with the length.
+
+    Returns:
+        Instance object
+    """
+
+    def __init__(self):
+        self.bytes_ = bytearray()
+        self.bits_ = 0
+        self.nbits_ = 0
+        self.length_ = 0
+
+    def write(self, value, nbits):
+        """ Write the lower bits of the value.
+
+        Args:
+            value: non-negative int value.
+            nbits: number of bits written.
+        """
+        self.bits_ = (self.bits_ << nbits) | (value & ((1 << nbits) - 1))
+        self.nbits_ += nbits
+        self.length_ += nbits
+
+        if self.nbits_ >= 64:
+            left = self.nbits_ % 8
+            self.bytes_ += (self.bits_ >> left).to_bytes(self.nbits_ // 8, "big")
+            self.bits_ &= (1 << left) - 1
+            self.nbits_ = left
+
+    def __len__(self):
+        return self.length_
+
+    def to_bytes(self):
+        """ Get the written bits padded with 0 to bytes.
+
+        Returns:
+            bytes object.
+        """
+        padding = -self.nbits_ % 8
+        return bytes(self.bytes_) + (self.bits_ << padding).to_bytes(
+            (self.nbits_ + padding) // 8, "big")
+
+
+def _read_bits(data, pos, nbits):
+    """ Read the bits at the bit position of the byte string.
+
+    Args:
+        data: bytes object.
+        pos: bit position from the head.
+        nbits: number of bits read.
+    Returns:
+        int value.
+    """
+    start = pos >> 3
+    end = (pos + nbits + 7) >> 3
+    return (int.from_bytes(data[start:end], "big") >> ((end << 3) - pos - nbits)) \
+        & ((1 << nbits) - 1)
+
+
+class BitReader(object):
+    """ Read bits from a byte string written by BitWriter.
+
+    Args:
+        data: bytes object.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, data):
+        self.data_ = bytes(data)
+        self.pos_ = 0
+        self.left_ = len(data) * 8
+
+    def read(self, nbits):
+        """ Read the bits as non-negative int value.
+
+        Args:
+            nbits: number of bits read.
+        Returns:
+            int value.
+        Raises:
+            ValueError if no bits left.
+        """
+        if nbits > self.left_:
+            raise ValueError("no more bits to read.")
+
+        value = _read_bits(self.data_, self.pos_, nbits)
+        self.pos_ += nbits
+        self.left_ -= nbits
+        return value
+
+    def read_bit(self):
+        """ Read a bit.
+
+        Returns:
+            0 or 1.
+        """
+        return self.read(1)
+
+
+def encode_block(timestamps, values):
+    """ Encode the block of a label.
+
+    Args:
+        timestamps: int values of timestamps in ascending order, for example
+            microseconds since 1970-01-01.
+        values: float values of the same length as timestamps.
+    Returns:
+        bytes object.
+    Raises:
+        ValueError if the lengths don't match.
+    """
+    if len(timestamps) != len(values):
+        raise ValueError("lengths of timestamps and values don't match.")
+
+    writer = BitWriter()
+    writer.write(len(timestamps), 32)
+    if not len(timestamps):
+        return writer.to_bytes()
+
+    prev_ts = int(timestamps[0])
+    prev_delta = 0
+    prev_bits = _to_bits(values[0])
+    prev_leading = 65
+    prev_trailing = 0
+
+    writer.write(prev_ts, 64)
+    writer.write(prev_bits, 64)
+
+    for i in range(1, len(timestamps)):
+        ts = int(timestamps[i])
+        delta = ts - prev_ts
+        dod = delta - prev_delta
+        prev_ts = ts
+        prev_delta = delta
+
+        if dod == 0:
+            writer.write(0, 1)
+        else:
+            for prefix, prefix_bits, value_bits in _DOD_BUCKETS:
+                limit = 1 << (value_bits - 1)
+                if -limit < dod <= limit:
+                    writer.write(prefix, prefix_bits)
+                    writer.write(dod - 1 if dod > 0 else dod, value_bits)
+                    break
+            else:
+                writer.write(0b11111, 5)
+                writer.write(dod, 64)
+
+        bits = _to_bits(values[i])
+        xor = bits ^ prev_bits
+        prev_bits = bits
+
+        if xor == 0:
+            writer.write(0, 1)
+            continue
+
+        leading = min(64 - xor.bit_length(), 31)
+        trailing = (xor & -xor).bit_length() - 1
+
+        if leading >= prev_leading and trailing >= prev_trailing:
+            writer.write(0b10, 2)
+            writer.write(xor >> prev_trailing, 64 - prev_leading - prev_trailing)
+        else:
+            length = 64 - leading - trailing
+            writer.write(0b11, 2)
+            writer.write(leading, 5)
+            writer.write(length & 0x3f, 6)
+            writer.write(xor >> trailing, length)
+            prev_leading = leading
+            prev_trailing = trailing
+
+    return writer.to_bytes()
+
+
+def _to_signed(value, nbits):
+    return value - (1 << nbits) if value >> (nbits - 1) else value
+
+
+def decode_block(data):
+    """ Decode the block encoded by encode_block().
+
+    Args:
+        data: bytes object.
+    Returns:
+        (timestamps, values) tuple of lists.
+    """
+    # BitReader is inlined to local variables for the speed of decoding, and
+    # only the bytes under the cursor are read for each field.
+    data = bytes(data)
+    size = len(data) * 8
+    if size < 32:
+        raise ValueError("block is truncated.")
+
+    count = _read_bits(data, 0, 32)
+    timestamps = []
+    values = []
+    if count == 0:
+        return timestamps, values
+
+    if size < 160:
+        raise ValueError("block is truncated.")
+
+    ts = _to_signed(_read_bits(data, 32, 64), 64)
+    bits = _read_bits(data, 96, 64)
+    pos = 160
+    delta = 0
+    leading = 0
+    trailing = 0
+    meaningful = 0
+
+    timestamps.append(ts)
+    values.append(_from_bits(bits))
+
+    try:
+        for _ in range(count - 1):
+            if (data[pos >> 3] >> (7 - (pos & 7))) & 1:
+                pos += 1
+                for _, prefix_bits, value_bits in _DOD_BUCKETS:
+                    bit = (data[pos >> 3] >> (7 - (pos & 7))) & 1
+                    pos += 1
+                    if not bit:
+                        dod = _to_signed(_read_bits(data, pos, value_bits), value_bits)
+                        pos += value_bits
+                        if dod >= 0:
+                            dod += 1
+                        break
+                else:
+                    dod = _to_signed(_read_bits(data, pos, 64), 64)
+                    pos += 64
+                delta += dod
+            else:
+                pos += 1
+            ts += delta
+            timestamps.append(ts)
+
+            if (data[pos >> 3] >> (7 - (pos & 7))) & 1:
+                pos += 1
+                if (data[pos >> 3] >> (7 - (pos & 7))) & 1:
+                    pos += 1
+                    leading = _read_bits(data, pos, 5)
+                    meaningful = _read_bits(data, pos + 5, 6) or 64
+                    trailing = 64 - leading - meaningful
+                    pos += 11
+                else:
+                    pos += 1
+                bits ^= _read_bits(data, pos, meaningful) << trailing
+                pos += meaningful
+                values.append(_from_bits(bits))
+            else:
+                pos += 1
+                values.append(values[-1])
+    except IndexError:
+        raise ValueError("block is truncated.")
+
+    if pos > size:
+        raise ValueError("block is truncated.")
+
+    return timestamps, values
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Profiling of the running monitor toggled by signals without restarting it.
+
+    SIGUSR1: start cProfile, or stop it and write the stats to
+             "profile-YYYYmmdd-HHMMSS.pstats" of the directory.
+    SIGUSR2: start tracemalloc, or write the top N allocations and the
+             difference from the previous snapshot to
+             "tracemalloc-YYYYmmdd-HHMMSS.txt" of the directory.
+
+Until Python 3.12, cProfile only profiles the thread enabling it, so the work
+units on the timer, scheduler, trigger and handler threads run in
+PROFILER.section(), which profiles the unit only while profiling is started
+and merges it to the stats. Since Python 3.12, cProfile profiles all threads
+and only one can be enabled at a time in the process, so a single cProfile is
+enabled for the whole session and the sections do nothing.
+"""
+
+import cProfile
+import datetime
+import os
+import pstats
+import signal
+import sys
+import tracemalloc
+from threading import Lock
+from solar_monitor import logger
+
+
+# cProfile is built on sys.monitoring, which records all threads.
+IS_PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+def _get_path(directory, prefix, ext):
+    return os.path.join(directory, "{}-{}.{}".format(
+        prefix, datetime.datetime.now().strftime("%Y%m%d-%H%M%S"), ext))
+
+
+class _Section(object):
+    """ Context manager profiling a work unit. """
+
+    __slots__ = ("profiler_", "profile_", "session_")
+
+    def __init__(self, profiler):
+        self.profiler_ = profiler
+        self.profile_ = None
+        self.session_ = None
+
+    def __enter__(self):
+        if self.profiler_.is_enabled_ and not self.profiler_.is_process_wide_:
+            self.session_ = self.profiler_.session_
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiling tool is active. Run the section without
+                # profiling.
+                self.profiler_._skip()
+            else:
+                self.profile_ = profile
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profile_ is not None:
+            self.profile_.disable()
+            self.profiler_._add(self.session_, self.profile_)
+        return False
+
+
+class Profiler(object):
+    """ Collect cProfile stats of the sections run on any thread while
+        started, or of the whole process if cProfile profiles all threads.
+
+    Args:
+        is_process_wide: enable a single cProfile for the whole session
+            instead of one per section. IS_PROCESS_WIDE if None.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, is_process_wide=None):
+        self.lock_ = Lock()
+        self.is_process_wide_ = \
+            IS_PROCESS_WIDE if is_process_wide is None else is_process_wide
+        self.is_enabled_ = False
+        self.session_ = 0
+        self.profile_ = None
+        self.stats_ = None
+        self.skipped_ = 0
+
+    def section(self):
+        """ Get the context manager to profile the work unit in it. Nothing is
+            done if profiling is not started or profiles the whole process.
+        """
+        return _Section(self)
+
+    def _add(self, session, profile):
+        with self.lock_:
+            # drop the section started in the previous session.
+            if session != self.session_ or not self.is_enabled_:
+                return
+
+            if self.stats_ is None:
+                self.stats_ = pstats.Stats(profile)
+            else:
+                self.stats_.add(profile)
+
+    def _skip(self):
+        with self.lock_:
+            self.skipped_ += 1
+
+    def is_enabled(self):
+        return self.is_enabled_
+
+    def get_skipped(self):
+        """ Get number of the sections not profiled in the current or last
+            session because another profiler was active.
+        """
+        return self.skipped_
+
+    def start(self):
+        """ Start profiling the sections, or the whole process.
+
+        Raise:
+            ValueError: If another profiling tool is active when profiling
+                the whole process.
+        """
+        with self.lock_:
+            if self.is_process_wide_:
+                profile = cProfile.Profile()
+                profile.enable()
+                self.profile_ = profile
+
+            self.session_ += 1
+            self.stats_ = None
+            self.skipped_ = 0
+            self.is_enabled_ = True
+
+    def stop(self, path=None):
+        """ Stop profiling and write the stats.
+
+        Args:
+            path: file path to write the stats by pstats.Stats.dump_stats().
+                Not written if None.
+        Returns:
+            pstats.Stats object or None if no section is profiled.
+        """
+        with self.lock_:
+            self.is_enabled_ = False
+            if self.profile_ is not None:
+                self.profile_.disable()
+                self.stats_ = pstats.Stats(self.profile_)
+                self.profile_ = None
+
+            stats = self.stats_
+            self.stats_ = None
+
+        if stats is not None and path is not None:
+            stats.dump_stats(path)
+
+        return stats
+
+    def toggle(self, directory):
+        """ Start profiling, or stop it and write the stats to the directory.
+
+        Args:
+            directory: directory path to write the stats.
+        Returns:
+            file path written, or None if started.
+        """
+        if not self.is_enabled_:
+            self.start()
+            logger.info("profiling started.")
+            return None
+
+        path = _get_path(directory, "profile", "pstats")
+        if self.stop(path) is None:
+            logger.info("profiling stopped without any section profiled.")
+            return None
+
+        logger.info("profiling stopped and written to {}, {} sections skipped.".format(
+            path, self.skipped_))
+        return path
+
+
+class MemoryTracer(object):
+    """ Write the top N allocations traced by tracemalloc.
+
+    Args:
+        top: number of the allocations written.
+        frames: number of the frames stored per allocation.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, top=20, frames=1):
+        self.top_ = top
+        self.frames_ = frames
+        self.snapshot_ = None
+
+    def dump(self, directory):
+        """ Start tracing if not started, otherwise write the top N
+            allocations and the difference from the previous dump.
+
+        Args:
+            directory: directory path to write the allocations.
+        Returns:
+            file path written, or None if started.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames_)
+            self.snapshot_ = None
+            logger.info("tracemalloc started.")
+            return None
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),))
+
+        lines = ["top {} allocations:".format(self.top_)]
+        lines.extend(
+            str(stat) for stat in snapshot.statistics("lineno")[:self.top_])
+
+        if self.snapshot_ is not None:
+            lines.append("")
+            lines.append("top {} differences from the previous dump:".format(self.top_))
+            lines.extend(
+                str(stat) for stat in
+                snapshot.compare_to(self.snapshot_, "lineno")[:self.top_])
+
+        self.snapshot_ = snapshot
+
+        path = _get_path(directory, "tracemalloc", "txt")
+        with open(path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        logger.info("tracemalloc snapshot written to {}.".format(path))
+        return path
+
+
+PROFILER = Profiler()
+
+
+def install(directory, top=20):
+    """ Install the signal handlers of SIGUSR1 and SIGUSR2. Must be called on
+        the main thread.
+
+    Args:
+        directory: directory path to write the files.
+        top: number of the allocations written by SIGUSR2.
+    Returns:
+        MemoryTracer object used by SIGUSR2.
+    """
+    os.makedirs(directory, exist_ok=True)
+    tracer = MemoryTracer(top=top)
+
+    def on_usr1(signum, frame):
+        try:
+            PROFILER.toggle(directory)
+        except Exception as e:
+            logger.error("profiling failed: {}".format(e))
+
+    def on_usr2(signum, frame):
+        try:
+            tracer.dump(directory)
+        except Exception as e:
+            logger.error("tracemalloc failed: {}".format(e))
+
+    signal.signal(signal.SIGUSR1, on_usr1)
+    signal.signal(signal.SIGUSR2, on_usr2)
+    return tracer
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Record and replay of the data polled from the charge controller. Recorder
+appends every Sample to a compact binary file, and ReplaySource reads it back
+as Sample objects at the recorded pace, faster, or as fast as possible, so the
+same data can be fed to the triggers again for reproducible benchmarks.
+
+The file starts with MAGIC and has the records below. All numbers are little
+endian. A schema record is written once for each schema and value types, and
+the values of a frame are packed by the struct format of its schema.
+
+    "S" id:uint16 length:uint32 JSON of source, fields and struct format
+    "F" id:uint16 at:int64 values packed by the format of the schema
+    "J" id:uint16 at:int64 length:uint32 JSON of the values
+
+"at" is microseconds since 1970-01-01. "J" frame is used if the values have
+other than int and float like str. MAGIC written again in the middle of the
+file starts a new session appended later, and the schema ids are reset. The
+broken record at the end, ex. written partially at power loss, is ignored on
+reading, and truncated before appending a new session.
+"""
+
+import json
+import os
+import struct
+import time
+from threading import Lock
+from solar_monitor import logger
+from solar_monitor.archive import from_microseconds
+from solar_monitor.archive import to_microseconds
+from solar_monitor.sample import Sample
+from solar_monitor.sample import Schema
+
+MAGIC = b"SMRP\x01"
+
+_SCHEMA = struct.Struct("<cHI")
+_FRAME = struct.Struct("<cHq")
+_LENGTH = struct.Struct("<I")
+
+_TYPECODES = {int: "q", float: "d"}
+
+
+def _get_format(values):
+    """ Get the struct format to pack the values, or None if any of the
+        values can't be packed.
+    """
+    try:
+        return "<" + "".join(_TYPECODES[type(value)] for value in values)
+    except KeyError:
+        return None
+
+
+class Recorder(object):
+    """ Append the samples to the record file.
+
+    Args:
+        path: file path to record. Appended if exists, after the broken
+            record at the end is truncated.
+    Returns:
+        Instance object
+    Raises:
+        ValueError: Raises if the existing file isn't recorded by Recorder.
+    """
+
+    def __init__(self, path):
+        self.path_ = path
+        self.lock_ = Lock()
+        # (source, schema, format) -> schema id
+        self.ids_ = {}
+        self.written_ = 0
+
+        # the record written partially at crash would swallow the records
+        # appended after it, so the file is cut at the last complete one.
+        if os.path.exists(path):
+            size = get_complete_size(path)
+            if size < os.path.getsize(path):
+                logger.warning("broken record at {} of {} is truncated.".format(
+                    size, path))
+                with open(path, "r+b") as f:
+                    f.truncate(size)
+
+        self.file_ = open(path, "ab")
+        self.file_.write(MAGIC)
+        self.file_.flush()
+
+    def __len__(self):
+        return self.written_
+
+    def write(self, sample):
+        """ Append a sample to the file. It's flushed to the file system
+            every time not to lose the data at crash.
+
+        Args:
+            sample: Sample object.
+        """
+        values = sample.values
+        fmt = _get_format(values)
+        key = (sample.source, sample.schema, fmt)
+        at = to_microseconds(sample.at)
+
+        with self.lock_:
+            records = []
+
+            schema_id = self.ids_.get(key)
+            if schema_id is None:
+                schema_id = len(self.ids_)
+                self.ids_[key] = schema_id
+
+                schema = sample.schema
+                body = json.dumps({
+                    "source": sample.source,
+                    "fields": list(zip(schema.labels, schema.units, schema.groups)),
+                    "format": fmt}).encode("utf-8")
+                records.append(_SCHEMA.pack(b"S", schema_id, len(body)) + body)
+
+            if fmt is None:
+                body = json.dumps(values).encode("utf-8")
+                records.append(
+                    _FRAME.pack(b"J", schema_id, at) + _LENGTH.pack(len(body)) + body)
+            else:
+                records.append(
+                    _FRAME.pack(b"F", schema_id, at) + struct.pack(fmt, *values))
+
+            self.file_.write(b"".join(records))
+            self.file_.flush()
+            self.written_ += 1
+
+    def close(self):
+        """ Close the file. """
+        with self.lock_:
+            self.file_.close()
+
+
+def _iter_records(data, path, is_decoding=True):
+    """ Parse the records recorded by Recorder in order.
+
+    Args:
+        data: bytes object of the whole file.
+        path: file path recorded, used in the messages.
+        is_decoding: decode the frames to Sample objects. Only the offsets
+            are yielded for the frames if False.
+    Returns:
+        generator of (offset, sample) tuples. offset is the end of the
+        complete record, and sample is Sample object of the frame, or None
+        for MAGIC and the schema records or if not decoding.
+    Raises:
+        ValueError: Raises if the data isn't recorded by Recorder.
+    """
+    if not data.startswith(MAGIC):
+        raise ValueError("{} is not a record file.".format(path))
+
+    # schema id -> (source, Schema, struct.Struct or None)
+    schemas = {}
+    offset = 0
+    end = len(data)
+
+    try:
+        while offset < end:
+            if data.startswith(MAGIC, offset):
+                schemas = {}
+                offset += len(MAGIC)
+                yield offset, None
+                continue
+
+            kind = data[offset:offset + 1]
+
+            if kind == b"S":
+                _, schema_id, length = _SCHEMA.unpack_from(data, offset)
+                offset += _SCHEMA.size
+                if offset + length > end:
+                    return
+
+                body = json.loads(data[offset:offset + length].decode("utf-8"))
+                offset += length
+
+                fmt = body["format"]
+                schema = Schema.intern(dict(
+                    (label, {"unit": unit, "group": group})
+                    for label, unit, group in body["fields"]))
+                schemas[schema_id] = (
+                    body["source"], schema,
+                    None if fmt is None else struct.Struct(fmt))
+                yield offset, None
+                continue
+
+            if kind not in (b"F", b"J"):
+                raise ValueError("unknown record {!r} at {} of {}.".format(
+                    kind, offset, path))
+
+            _, schema_id, at = _FRAME.unpack_from(data, offset)
+            offset += _FRAME.size
+            source, schema, packer = schemas[schema_id]
+
+            if kind == b"F":
+                if offset + packer.size > end:
+                    return
+                values = packer.unpack_from(data, offset) if is_decoding else None
+                offset += packer.size
+            else:
+                length, = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                if offset + length > end:
+                    return
+                values = json.loads(data[offset:offset + length].decode("utf-8")) \
+                    if is_decoding else None
+                offset += length
+
+            if not is_decoding:
+                yield offset, None
+                continue
+
+            yield offset, Sample.from_values(
+                source, from_microseconds(at), schema, values)
+    except struct.error:
+        # the header of the last record is broken.
+        pass
+
+
+def get_complete_size(path):
+    """ Get the size of the record file up to the end of the last complete
+        record, which excludes the broken record at the end.
+
+    Args:
+        path: file path recorded.
+    Returns:
+        Size in bytes. 0 if the file is empty or has only a part of MAGIC.
+    Raises:
+        ValueError: Raises if the file isn't recorded by Recorder.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if MAGIC.startswith(data):
+        return 0
+
+    size = 0
+    for size, _ in _iter_records(data, path, is_decoding=False):
+        pass
+
+    return size
+
+
+def read_records(path):
+    """ Read the samples recorded by Recorder in order.
+
+    Args:
+        path: file path recorded.
+    Returns:
+        generator of Sample objects.
+    Raises:
+        ValueError: Raises if the file isn't recorded by Recorder.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+
+    offset = 0
+    for offset, sample in _iter_records(data, path):
+        if sample is not None:
+            yield sample
+
+    if offset < len(data):
+        logger.warning("broken record at {} of {} is ignored.".format(offset, path))
+
+
+class ReplaySource(object):
+    """ Iterate the recorded samples at the pace of the recorded timestamps.
+
+    Args:
+        path: file path recorded by Recorder.
+        speed: how many times faster than the recorded pace. 1.0 to replay at
+            the wall-clock speed, 0 to replay as fast as possible.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, path, speed=1.0):
+        if speed < 0:
+            raise ValueError("speed must be 0 or positive.")
+        if not os.path.exists(path):
+            raise FileNotFoundError(path)
+
+        self.path_ = path
+        self.speed_ = speed
+
+    def __iter__(self):
+        started = None
+
+        for sample in read_records(self.path_):
+            if self.speed_:
+                at = to_microseconds(sample.at) / 1e6
+                if started is None:
+                    started = (time.monotonic(), at)
+
+                delay = (at - started[1]) / self.speed_ - \
+                    (time.monotonic() - started[0])
+                if delay > 0:
+                    time.sleep(delay)
+
+            yield sample
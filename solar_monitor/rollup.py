@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Incremental rollup of the polled data. The running aggregates of every label
+are kept per resolution like 1 minute, 1 hour and 1 day, and updated in O(1)
+per sample. Only the finished buckets are returned to be written out, so the
+aggregates are never recomputed from the raw data.
+"""
+
+import datetime
+
+RESOLUTIONS = (60, 3600, 86400)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class Bucket(object):
+    """ Running aggregate of a label in a time bucket.
+
+    Args:
+        start: datetime object of the start of the bucket.
+        value: the first value of the bucket.
+    Returns:
+        Instance object
+    """
+
+    __slots__ = ("start", "min", "max", "sum", "count", "last")
+
+    def __init__(self, start, value):
+        self.start = start
+        self.min = value
+        self.max = value
+        self.sum = value
+        self.count = 1
+        self.last = value
+
+    def update(self, value):
+        """ Add the value to the aggregate. """
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.sum += value
+        self.count += 1
+        self.last = value
+
+    @property
+    def mean(self):
+        return self.sum / self.count
+
+    def __repr__(self):
+        return "Bucket(start={}, min={}, max={}, mean={}, count={}, last={})".format(
+            self.start, self.min, self.max, self.mean, self.count, self.last)
+
+
+class Rollup(object):
+    """ Keep the running aggregates per label and resolution.
+
+    Args:
+        resolutions: bucket widths in seconds.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, resolutions=RESOLUTIONS):
+        for resolution in resolutions:
+            if resolution <= 0 or 86400 % resolution and resolution % 86400:
+                raise ValueError(
+                    "resolution {} is not aligned to a day.".format(resolution))
+
+        self.resolutions_ = tuple(resolutions)
+
+        # (resolution, label) -> Bucket
+        self.buckets_ = {}
+        # label -> unit
+        self.units_ = {}
+        self.late_ = 0
+
+    def _get_start(self, seconds, resolution):
+        return EPOCH + datetime.timedelta(seconds=seconds - seconds % resolution)
+
+    def update(self, sample):
+        """ Add the sample to the running aggregates.
+
+        Args:
+            sample: Sample object or dict object having the same shape.
+        Returns:
+            list of (resolution, label, Bucket) tuples finished by the sample.
+        """
+        seconds = int((sample["at"] - EPOCH).total_seconds())
+        finished = []
+
+        for label, datum in sample["data"].items():
+            value = datum["value"]
+            if not isinstance(value, (int, float)):
+                continue
+
+            self.units_[label] = datum["unit"]
+
+            for resolution in self.resolutions_:
+                key = (resolution, label)
+                bucket = self.buckets_.get(key)
+                start = self._get_start(seconds, resolution)
+
+                if bucket is None:
+                    self.buckets_[key] = Bucket(start, value)
+                elif start == bucket.start:
+                    bucket.update(value)
+                elif start > bucket.start:
+                    finished.append((resolution, label, bucket))
+                    self.buckets_[key] = Bucket(start, value)
+                else:
+                    self.late_ += 1
+
+        return finished
+
+    def flush(self):
+        """ Finish all running buckets.
+
+        Returns:
+            list of (resolution, label, Bucket) tuples.
+        """
+        finished = [
+            (resolution, label, bucket)
+            for (resolution, label), bucket in self.buckets_.items()]
+        self.buckets_.clear()
+        return finished
+
+    def get_unit(self, label):
+        """ Get unit of the label like "V". """
+        return self.units_.get(label)
+
+    def get_units(self):
+        """ Get dict object of label -> unit seen so far. """
+        return dict(self.units_)
+
+    def get_late(self):
+        """ Get number of the values dropped because the bucket was already
+            finished.
+        """
+        return self.late_
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Sample data type passed from main loop to all event triggers and handlers. The
+same Sample object is shared by all threads without copying, so it cannot be
+modified after created. It can be accessed like the dict object got from the
+charge controller driver as below.
+
+    sample["source"]                            # "solar"
+    sample["at"]                                # datetime object
+    sample["data"]["Battery Voltage"]["value"]  # 12.1
+    sample["data"]["Battery Voltage"]["unit"]   # "V"
+
+Handlers which need another shape of the data should build their own payload
+from it like dict(sample["data"]["Battery Voltage"]).
+
+Internally, the labels, units and groups of a charge controller are interned
+once as a Schema object, and a Sample has only the tuple of values and the
+timestamp. Triggers and handlers can use FieldRef to resolve the slot of a
+label once instead of looking up nested dict on every sample.
+
+    ref = FieldRef("Battery Voltage")
+    ref.value(sample)                           # 12.1
+"""
+
+from collections.abc import Mapping
+from threading import Lock
+
+
+class Schema(object):
+    """ Labels, units and groups of the fields polled from a charge
+        controller. Get the instance by Schema.intern() to share the same
+        object among the samples.
+
+    Args:
+        fields: tuple of (label, unit, group) tuples in slot order.
+    Returns:
+        Instance object
+    """
+
+    __slots__ = ("labels", "units", "groups", "index")
+
+    _CACHE = {}
+    _CACHE_LOCK = Lock()
+    # labels in order -> Schema, to skip building the fields on every sample.
+    _CACHE_BY_LABELS = {}
+
+    def __init__(self, fields):
+        object.__setattr__(self, "labels", tuple(f[0] for f in fields))
+        object.__setattr__(self, "units", tuple(f[1] for f in fields))
+        object.__setattr__(self, "groups", tuple(f[2] for f in fields))
+        object.__setattr__(self, "index", dict(
+            (label, slot) for slot, label in enumerate(self.labels)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read-only.".format(type(self).__name__))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, list(self.labels))
+
+    @classmethod
+    def intern(cls, data):
+        """ Get the shared Schema object for the dict got from the driver.
+
+        Args:
+            data: dict object got from the driver like below.
+                {"Battery Voltage": {"group": "Battery", "unit": "V", "value": 12.1}}
+        Returns:
+            Schema object. The same object is returned for the same labels,
+            units and groups. The schema is looked up by the labels first
+            because the unit and group of a label are fixed by the driver.
+        """
+        labels = tuple(data)
+
+        schema = cls._CACHE_BY_LABELS.get(labels)
+        if schema is not None:
+            return schema
+
+        fields = tuple(
+            (label, datum.get("unit", ""), datum.get("group", ""))
+            for label, datum in data.items())
+
+        with cls._CACHE_LOCK:
+            schema = cls._CACHE.setdefault(fields, cls(fields))
+            cls._CACHE_BY_LABELS[labels] = schema
+            return schema
+
+
+class Field(Mapping):
+    """ Read-only view of a field of the sample like battery voltage.
+
+    Args:
+        value: value of the field.
+        unit: unit string like "V".
+        group: group string like "Battery".
+    Returns:
+        Instance object
+    """
+
+    __slots__ = ("value", "unit", "group")
+    _KEYS = ("group", "unit", "value")
+
+    def __init__(self, value, unit="", group=""):
+        object.__setattr__(self, "value", value)
+        object.__setattr__(self, "unit", unit)
+        object.__setattr__(self, "group", group)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read-only.".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is read-only.".format(type(self).__name__))
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return "{}(value={!r}, unit={!r}, group={!r})".format(
+            type(self).__name__, self.value, self.unit, self.group)
+
+
+class FieldsView(Mapping):
+    """ Read-only mapping of label to Field built from the schema and values
+        of a sample on demand.
+
+    Args:
+        schema: Schema object.
+        values: tuple of values in slot order.
+    Returns:
+        Instance object
+    """
+
+    __slots__ = ("schema_", "values_")
+
+    def __init__(self, schema, values):
+        self.schema_ = schema
+        self.values_ = values
+
+    def __getitem__(self, label):
+        slot = self.schema_.index[label]
+        return Field(
+            self.values_[slot], self.schema_.units[slot],
+            self.schema_.groups[slot])
+
+    def __contains__(self, label):
+        return label in self.schema_.index
+
+    def __iter__(self):
+        return iter(self.schema_.labels)
+
+    def __len__(self):
+        return len(self.schema_.labels)
+
+
+class Sample(Mapping):
+    """ Immutable data polled from the charge controller at a time.
+
+    Args:
+        source: source name of the data like "solar".
+        at: datetime object when the data is polled.
+        data: dict object got from the driver like below.
+            {"Battery Voltage": {"group": "Battery", "unit": "V", "value": 12.1}}
+    Returns:
+        Instance object
+    """
+
+    __slots__ = ("source", "at", "schema", "values")
+    _KEYS = ("source", "data", "at")
+
+    def __init__(self, source, at, data):
+        schema = Schema.intern(data)
+        values = tuple(data[label]["value"] for label in schema.labels)
+        self._set(source, at, schema, values)
+
+    def _set(self, source, at, schema, values):
+        object.__setattr__(self, "source", source)
+        object.__setattr__(self, "at", at)
+        object.__setattr__(self, "schema", schema)
+        object.__setattr__(self, "values", values)
+
+    @classmethod
+    def from_values(cls, source, at, schema, values):
+        """ Create a Sample from the schema and values directly without the
+            dict got from the driver, ex. to replay the recorded data.
+
+        Args:
+            source: source name of the data like "solar".
+            at: datetime object when the data is polled.
+            schema: Schema object.
+            values: sequence of values in slot order of the schema.
+        Returns:
+            Sample object.
+        Raises:
+            ValueError: if the number of values doesn't match the schema.
+        """
+        if len(values) != len(schema):
+            raise ValueError("{} values for {} fields.".format(
+                len(values), len(schema)))
+
+        sample = cls.__new__(cls)
+        sample._set(source, at, schema, tuple(values))
+        return sample
+
+    @property
+    def data(self):
+        """ Read-only mapping of label to Field. """
+        return FieldsView(self.schema, self.values)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} is read-only.".format(type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is read-only.".format(type(self).__name__))
+
+    def __getitem__(self, key):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __iter__(self):
+        return iter(self._KEYS)
+
+    def __len__(self):
+        return len(self._KEYS)
+
+    def __repr__(self):
+        return "{}(source={!r}, at={!r}, labels={})".format(
+            type(self).__name__, self.source, self.at, len(self.values))
+
+    def to_dict(self):
+        """ Build a new dict object having the same shape as the driver's.
+
+        Returns:
+            dict object which is safe to be modified.
+        """
+        return {
+            "source": self.source,
+            "at": self.at,
+            "data": dict(
+                (label, dict(field)) for label, field in self.data.items()),
+        }
+
+
+class FieldRef(object):
+    """ Reference to a field of samples by label. The slot of the label is
+        resolved once for each schema, so that looking up the value costs only
+        an index access. The dict object having the same shape as the driver's
+        is also accepted.
+
+    Args:
+        label: label of the field like "Battery Voltage".
+    Returns:
+        Instance object
+    """
+
+    __slots__ = ("label_", "resolved_")
+
+    def __init__(self, label):
+        self.label_ = label
+        self.resolved_ = (None, None)
+
+    def _slot(self, sample):
+        schema, slot = self.resolved_
+        if schema is not sample.schema:
+            schema = sample.schema
+            slot = schema.index[self.label_]
+            self.resolved_ = (schema, slot)
+        return slot
+
+    def value(self, data):
+        """ Get the value of the field.
+
+        Args:
+            data: Sample object or dict object.
+        Returns:
+            Value of the field.
+        Raises:
+            KeyError: if the label doesn't exist in data.
+        """
+        if isinstance(data, Sample):
+            return data.values[self._slot(data)]
+        return data["data"][self.label_]["value"]
+
+    def unit(self, data):
+        """ Get the unit of the field.
+
+        Args:
+            data: Sample object or dict object.
+        Returns:
+            Unit string of the field.
+        Raises:
+            KeyError: if the label doesn't exist in data.
+        """
+        if isinstance(data, Sample):
+            return data.schema.units[self._slot(data)]
+        return data["data"][self.label_]["unit"]
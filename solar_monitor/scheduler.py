@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Scheduler running many periodic and one-shot jobs on a single thread. The jobs
+are kept on a heap ordered by the next deadline on time.monotonic(), and the
+thread sleeps until the earliest one. Since all jobs share the thread, a job
+should finish quickly like putting data to the event listeners, and the job
+taking longer than its timeout is counted and logged.
+"""
+
+import heapq
+import itertools
+import random
+import time
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from solar_monitor import logger
+from solar_monitor.profiling import PROFILER
+from solar_monitor.stats import REGISTRY
+from solar_monitor.stats import Histogram
+
+
+class Job(object):
+    """ Job scheduled by Scheduler. Should be made by Scheduler.add() or
+        Scheduler.add_once().
+
+    Args:
+        func: callable object to run.
+        interval: interval time as second, or None to run once.
+        delay: seconds until the first run.
+        jitter: max seconds added randomly to each deadline.
+        timeout: seconds to count the run as timed out, or None.
+        is_catch_up: run the missed deadlines in a burst if True, otherwise
+            skip them.
+        name: name of the job. func.__name__ if None.
+        kwargs: dict object of keyword arguments passed to func.
+    Returns:
+        Instance object
+    """
+
+    def __init__(
+            self, func, interval, delay, jitter=0.0, timeout=None,
+            is_catch_up=False, name=None, kwargs=None):
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be positive.")
+
+        self.func_ = func
+        self.interval_ = interval
+        self.jitter_ = jitter
+        self.timeout_ = timeout
+        self.is_catch_up_ = is_catch_up
+        self.name_ = name or getattr(func, "__name__", repr(func))
+        self.kwargs_ = kwargs or {}
+
+        self.base_ = time.monotonic() + delay
+        self.ticks_ = 0
+        self.deadline_ = self.base_
+        self.is_cancelled_ = False
+
+        self.status_lock_ = Lock()
+        self.status_ = {
+            "executed": 0, "failed": 0, "skipped": 0, "timeouts": 0}
+        self.lateness_ = Histogram()
+        self.duration_ = Histogram()
+
+        REGISTRY.add_source(self, name=self.name_)
+
+    def _count(self, key, count=1):
+        with self.status_lock_:
+            self.status_[key] += count
+
+    def run(self):
+        """ Run the job and track the status. """
+        started = time.monotonic()
+        self.lateness_.observe(max(0.0, started - self.deadline_))
+
+        try:
+            with PROFILER.section():
+                self.func_(**self.kwargs_)
+        except Exception as e:
+            self._count("failed")
+            logger.error("job {} failed: {}".format(self.name_, e))
+        else:
+            self._count("executed")
+
+        duration = time.monotonic() - started
+        self.duration_.observe(duration)
+
+        if self.timeout_ is not None and duration > self.timeout_:
+            self._count("timeouts")
+            logger.warning("job {} took {:.3f} sec over timeout {} sec.".format(
+                self.name_, duration, self.timeout_))
+
+    def advance(self):
+        """ Set the next deadline after run.
+
+        Returns:
+            False if the job doesn't run any more.
+        """
+        if self.interval_ is None or self.is_cancelled_:
+            return False
+
+        ticks = self.ticks_ + 1
+        if not self.is_catch_up_:
+            # the next deadline after now, skipping the overrun deadlines.
+            elapsed = time.monotonic() - self.base_
+            ticks = max(ticks, int(elapsed // self.interval_) + 1)
+            if ticks > self.ticks_ + 1:
+                self._count("skipped", ticks - self.ticks_ - 1)
+
+        self.ticks_ = ticks
+        self.deadline_ = self.base_ + ticks * self.interval_ + \
+            random.uniform(0, self.jitter_)
+        return True
+
+    def cancel(self):
+        """ Stop running the job. """
+        self.is_cancelled_ = True
+
+    def get_status(self):
+        """ Get the status of the job.
+
+        Returns:
+            dict object like below. "lateness" and "duration" are the
+            snapshots of stats.Histogram in seconds.
+
+            {"name": "event_loop", "executed": 10, "failed": 0,
+             "skipped": 0, "timeouts": 0,
+             "lateness": {"count": 10, ...}, "duration": {"count": 10, ...}}
+        """
+        with self.status_lock_:
+            status = dict(self.status_)
+        status["name"] = self.name_
+        status["lateness"] = self.lateness_.get_snapshot()
+        status["duration"] = self.duration_.get_snapshot()
+        return status
+
+
+class Scheduler(object):
+    """ Run the jobs on a single thread.
+
+    Returns:
+        Instance object
+    """
+
+    def __init__(self):
+        self.heap_ = []
+        self.jobs_ = []
+        self.seq_ = itertools.count()
+        self.cond_ = Condition()
+        self.is_stopped_ = False
+        self.thread_ = Thread(target=self._thread_main, name="Scheduler", daemon=True)
+
+    def _push(self, job):
+        with self.cond_:
+            heapq.heappush(self.heap_, (job.deadline_, next(self.seq_), job))
+            self.cond_.notify()
+
+    def add(
+            self, func, interval, delay=None, jitter=0.0, timeout=None,
+            is_catch_up=False, name=None, kwargs=None):
+        """ Add the periodic job.
+
+        Args:
+            func: callable object to run.
+            interval: interval time as second. fraction is available.
+            delay: seconds until the first run. interval if None.
+            jitter: max seconds added randomly to each deadline.
+            timeout: seconds to count the run as timed out, or None.
+            is_catch_up: run the missed deadlines in a burst if True,
+                otherwise skip them.
+            name: name of the job. func.__name__ if None.
+            kwargs: dict object of keyword arguments passed to func.
+        Returns:
+            Job object.
+        """
+        job = Job(
+            func, interval, interval if delay is None else delay,
+            jitter=jitter, timeout=timeout, is_catch_up=is_catch_up,
+            name=name, kwargs=kwargs)
+
+        with self.cond_:
+            self.jobs_.append(job)
+        self._push(job)
+        return job
+
+    def add_once(self, func, delay=0.0, timeout=None, name=None, kwargs=None):
+        """ Add the job run once.
+
+        Args:
+            func: callable object to run.
+            delay: seconds until the run.
+            timeout: seconds to count the run as timed out, or None.
+            name: name of the job. func.__name__ if None.
+            kwargs: dict object of keyword arguments passed to func.
+        Returns:
+            Job object.
+        """
+        job = Job(func, None, delay, timeout=timeout, name=name, kwargs=kwargs)
+
+        with self.cond_:
+            self.jobs_.append(job)
+        self._push(job)
+        return job
+
+    def cancel(self, job):
+        """ Stop running the job.
+
+        Args:
+            job: Job object returned by add() or add_once().
+        """
+        job.cancel()
+
+        with self.cond_:
+            if job in self.jobs_:
+                self.jobs_.remove(job)
+
+    def _get_next(self):
+        """ Wait for the earliest job to be due.
+
+        Returns:
+            Job object, or None if stopped.
+        """
+        with self.cond_:
+            while not self.is_stopped_:
+                if not self.heap_:
+                    self.cond_.wait()
+                    continue
+
+                deadline, _, job = self.heap_[0]
+                wait = deadline - time.monotonic()
+                if wait > 0:
+                    self.cond_.wait(wait)
+                    continue
+
+                heapq.heappop(self.heap_)
+                if not job.is_cancelled_:
+                    return job
+
+        return None
+
+    def _thread_main(self):
+        while True:
+            job = self._get_next()
+            if job is None:
+                break
+
+            job.run()
+
+            if job.advance():
+                self._push(job)
+            else:
+                with self.cond_:
+                    if job in self.jobs_:
+                        self.jobs_.remove(job)
+
+    def start(self):
+        """ Start the thread of the scheduler.
+
+        Exception:
+            RuntimeError: Raises if starting this thread twice.
+        """
+        self.thread_.start()
+
+    def stop(self):
+        """ Stop the thread of the scheduler. The running job is finished. """
+        with self.cond_:
+            self.is_stopped_ = True
+            self.cond_.notify()
+
+    def join(self, timeout=3):
+        """ Wait and block until the thread is terminated.
+
+        Args:
+            timeout: Timeout to join as second.
+        Raise:
+            SystemError: If the thread cannot be joined.
+        """
+        self.thread_.join(timeout)
+        if self.thread_.is_alive():
+            raise SystemError("{} cannot stop.".format(type(self).__name__))
+
+    def get_status(self):
+        """ Get the status of the scheduled jobs.
+
+        Returns:
+            list of Job.get_status() in added order.
+        """
+        with self.cond_:
+            jobs = list(self.jobs_)
+        return [job.get_status() for job in jobs]
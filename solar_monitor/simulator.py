@@ -0,0 +1,450 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Simulator of TS-MPPT-60 live view serving the same MODBUS CSV endpoint as the
+real charge controller like below, so the monitor can be soak tested without
+the hardware.
+
+    GET /MBCSV.cgi?ID=1&F=4&AHI=0&ALO=38&RHI=0&RLO=1
+    1,4,2,19,32
+
+The response is "MODBUS ID,function,length,byte,byte,..." where the register
+values are split into the high and low bytes. The values follow the diurnal
+curve of the sun compressed into day_length seconds, and the response can be
+delayed, hung up, failed or broken at random.
+
+    python -m solar_monitor.simulator --count 3 --port 8080
+"""
+
+import argparse
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+from solar_monitor import logger
+from tsmppt60_driver.hal import RegisterMap
+
+try:
+    from http.server import ThreadingHTTPServer
+except ImportError:
+    # http.server has it since Python 3.7.
+    class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+        daemon_threads = True
+
+CGI_PATH = "/MBCSV.cgi"
+
+# V_PU and I_PU of the scaling registers, 78.01425 and 79.25034.
+VOLTAGE_SCALING = (78, 934)
+CURRENT_SCALING = (79, 16406)
+
+# values of "Charge State" register written on the data sheet.
+CHARGE_STATE_NIGHT = 3
+CHARGE_STATE_MPPT = 5
+
+# values of "LED State" register written on the data sheet.
+LED_STATE_NIGHT = 1
+LED_STATE_CHARGING = 3
+
+
+def _to_scaling(registers):
+    return registers[0] + registers[1] / float(1 << 16)
+
+
+def _to_short(value):
+    """ Convert the value to 16bit register value as two's complement. """
+    return int(round(value)) & 0xFFFF
+
+
+class ChargeController(object):
+    """ Model of the charge controller whose values change by the sun.
+
+    Args:
+        day_length: seconds of a day. 86400 to follow the real clock.
+        array_voc: open circuit voltage of the solar array.
+        array_isc: short circuit current of the solar array.
+        battery_voltage: nominal voltage of the battery.
+        seed: seed of the random noise.
+    Returns:
+        Instance object
+    """
+
+    def __init__(
+            self, day_length=86400.0, array_voc=60.0, array_isc=4.0,
+            battery_voltage=24.0, seed=None):
+        self.day_length_ = day_length
+        self.array_voc_ = array_voc
+        self.array_isc_ = array_isc
+        self.battery_voltage_ = battery_voltage
+        self.random_ = random.Random(seed)
+        self.lock_ = threading.Lock()
+
+        self.amp_hours_ = 0.0
+        self.kilowatt_hours_ = 0.0
+        self.updated_ = None
+
+    def get_sun(self, now):
+        """ Get the strength of the sun from 0.0 at night to 1.0 at noon.
+
+        Args:
+            now: seconds like time.time().
+        Returns:
+            float value.
+        """
+        phase = (now % self.day_length_) / self.day_length_
+        # the sun rises at 6 and sets at 18 o'clock in UTC.
+        return max(0.0, math.sin((phase - 0.25) * 2 * math.pi))
+
+    def get_status(self, now):
+        """ Get the values of the charge controller at the time. The counters
+            like "Amp Hours" are integrated from the previous call.
+
+        Args:
+            now: seconds like time.time().
+        Returns:
+            dict object of label and value like {"Battery Voltage": 24.5}.
+        """
+        sun = self.get_sun(now)
+
+        def noise(scale):
+            return self.random_.gauss(0.0, scale)
+
+        array_voc = self.array_voc_ * (0.9 + 0.1 * sun) if sun else 0.0
+        array_voltage = array_voc * 0.8 + noise(0.05) if sun else 0.0
+        array_current = self.array_isc_ * sun + noise(0.01) if sun else 0.0
+        array_power = max(0.0, array_voltage * array_current)
+
+        battery_voltage = self.battery_voltage_ * (1.0 + 0.1 * sun) + noise(0.02)
+        output_power = array_power * 0.95
+        charge_current = output_power / battery_voltage
+
+        with self.lock_:
+            if self.updated_ is not None and now > self.updated_:
+                hours = (now - self.updated_) / 3600.0
+                self.amp_hours_ += charge_current * hours
+                self.kilowatt_hours_ += output_power * hours / 1000.0
+            self.updated_ = now
+
+            amp_hours = self.amp_hours_
+            kilowatt_hours = self.kilowatt_hours_
+
+        is_charging = output_power > 1.0
+
+        return {
+            RegisterMap.ARRAY_VOLTAGE.label: array_voltage,
+            RegisterMap.ARRAY_CURRENT.label: array_current,
+            RegisterMap.VMP_LAST_SWEEP.label: array_voc * 0.8,
+            RegisterMap.VOC_LAST_SWEEP.label: array_voc,
+            RegisterMap.POWER_LAST_SWEEP.label: array_power,
+            RegisterMap.BATTERY_VOLTAGE.label: battery_voltage,
+            RegisterMap.TARGET_REGULATION_VOLTAGE.label: self.battery_voltage_ * 1.19,
+            RegisterMap.CHARGING_CURRENT.label: charge_current,
+            RegisterMap.OUTPUT_POWER.label: output_power,
+            RegisterMap.HEATSINK_TEMP.label: 20.0 + 15.0 * sun + noise(0.2),
+            RegisterMap.BATTERY_TEMP.label: 18.0 + 5.0 * sun + noise(0.1),
+            RegisterMap.AH_CHARGE_RESETABLE.label: amp_hours,
+            RegisterMap.KWH_CHARGE_RESETABLE.label: kilowatt_hours,
+            RegisterMap.CHARGE_STATE.label:
+                CHARGE_STATE_MPPT if is_charging else CHARGE_STATE_NIGHT,
+            RegisterMap.LED_STATE.label:
+                LED_STATE_CHARGING if is_charging else LED_STATE_NIGHT,
+        }
+
+    def get_registers(self, now):
+        """ Get the register values scaled as the real charge controller.
+
+        Args:
+            now: seconds like time.time().
+        Returns:
+            dict object of address and 16bit value.
+        """
+        v_scale = _to_scaling(VOLTAGE_SCALING)
+        i_scale = _to_scaling(CURRENT_SCALING)
+
+        registers = {
+            RegisterMap.VOLTAGE_SCALING.address: VOLTAGE_SCALING[0],
+            RegisterMap.VOLTAGE_SCALING.address + 1: VOLTAGE_SCALING[1],
+            RegisterMap.CURRENT_SCALING.address: CURRENT_SCALING[0],
+            RegisterMap.CURRENT_SCALING.address + 1: CURRENT_SCALING[1],
+        }
+        status = self.get_status(now)
+
+        for register in vars(RegisterMap).values():
+            if not hasattr(register, "scale_factor") or register.label not in status:
+                continue
+
+            value = status[register.label]
+
+            if register.scale_factor == "V":
+                raw = value * (1 << 15) / v_scale
+            elif register.scale_factor == "A":
+                raw = value * (1 << 15) / i_scale
+            elif register.scale_factor == "W":
+                raw = value * (1 << 17) / (v_scale * i_scale)
+            elif register.scale_factor == "Ah":
+                raw = value * 10.0
+            else:
+                raw = value
+
+            if register.registers > 1:
+                raw = int(round(raw)) & 0xFFFFFFFF
+                registers[register.address] = raw >> 16
+                registers[register.address + 1] = raw & 0xFFFF
+            else:
+                registers[register.address] = _to_short(raw)
+
+        return registers
+
+
+class Simulator(object):
+    """ Serve the MODBUS CSV endpoint of a charge controller on the thread of
+        HTTP server.
+
+    Args:
+        port: port number to listen. 0 to choose a free port.
+        host: host address to listen. Only local access by default.
+        controller: ChargeController object. A new one if None.
+        latency: seconds to delay every response.
+        jitter: max seconds added to latency at random.
+        timeout_rate: ratio of the requests never answered in hang seconds.
+        error_rate: ratio of the requests answered by 500 error.
+        malformed_rate: ratio of the requests answered by broken CSV.
+        hang: seconds to hold the timed out requests.
+        seed: seed of the random faults.
+    Returns:
+        Instance object
+    """
+
+    def __init__(
+            self, port=0, host="127.0.0.1", controller=None, latency=0.0,
+            jitter=0.0, timeout_rate=0.0, error_rate=0.0, malformed_rate=0.0,
+            hang=10.0, seed=None):
+        self.controller_ = controller if controller else ChargeController(seed=seed)
+        self.latency_ = latency
+        self.jitter_ = jitter
+        self.timeout_rate_ = timeout_rate
+        self.error_rate_ = error_rate
+        self.malformed_rate_ = malformed_rate
+        self.hang_ = hang
+        self.random_ = random.Random(seed)
+        self.stopped_ = threading.Event()
+
+        self.status_lock_ = threading.Lock()
+        self.status_ = {
+            "requests": 0, "timeouts": 0, "errors": 0, "malformed": 0}
+
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep the connection alive as the driver reuses it.
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                simulator._respond(self)
+
+            def log_message(self, format, *args):
+                logger.debug("simulator: " + format % args)
+
+        self.server_ = ThreadingHTTPServer((host, port), Handler)
+        self.server_.daemon_threads = True
+        self.thread_ = threading.Thread(
+            target=self.server_.serve_forever, name=type(self).__name__,
+            daemon=True)
+
+    def get_port(self):
+        """ Get the port number listened. """
+        return self.server_.server_address[1]
+
+    def get_status(self):
+        """ Get the number of the requests and the injected faults.
+
+        Returns:
+            dict object like below.
+
+            {"requests": 10, "timeouts": 1, "errors": 0, "malformed": 2}
+        """
+        with self.status_lock_:
+            return dict(self.status_)
+
+    def _count(self, key):
+        with self.status_lock_:
+            self.status_[key] += 1
+
+    def _get_fault(self):
+        with self.status_lock_:
+            chance = self.random_.random()
+            delay = self.latency_ + self.random_.uniform(0.0, self.jitter_)
+
+        for fault, rate in (
+                ("timeouts", self.timeout_rate_),
+                ("errors", self.error_rate_),
+                ("malformed", self.malformed_rate_)):
+            if chance < rate:
+                return fault, delay
+            chance -= rate
+
+        return None, delay
+
+    def get_response(self, query, now=None):
+        """ Get the CSV text of the registers requested by the query.
+
+        Args:
+            query: dict object of the query parameters like "AHI".
+            now: seconds like time.time(). The current time if None.
+        Returns:
+            str object like "1,4,2,19,32".
+        Raises:
+            KeyError, ValueError: Raises if the query is invalid.
+        """
+        mb_id = int(query["ID"])
+        function = int(query["F"])
+        address = (int(query["AHI"]) << 8) | int(query["ALO"])
+        count = (int(query["RHI"]) << 8) | int(query["RLO"])
+
+        registers = self.controller_.get_registers(
+            time.time() if now is None else now)
+
+        values = []
+        for i in range(count):
+            register = registers.get(address + i, 0)
+            values.extend((register >> 8, register & 0xFF))
+
+        return ",".join(str(v) for v in [mb_id, function, len(values)] + values)
+
+    def _respond(self, request):
+        self._count("requests")
+        fault, delay = self._get_fault()
+
+        if fault == "timeouts":
+            self._count(fault)
+            # hold the request until the client gives up.
+            self.stopped_.wait(self.hang_)
+            request.close_connection = True
+            return
+
+        if delay:
+            time.sleep(delay)
+
+        url = urlparse(request.path)
+        if url.path != CGI_PATH:
+            request.send_error(404)
+            return
+
+        if fault == "errors":
+            self._count(fault)
+            request.send_error(500)
+            return
+
+        try:
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            text = self.get_response(query)
+        except (KeyError, ValueError):
+            request.send_error(400)
+            return
+
+        if fault == "malformed":
+            self._count(fault)
+            # drop the last byte to break the length.
+            text = text.rsplit(",", 1)[0]
+
+        body = text.encode("ascii")
+        request.send_response(200)
+        request.send_header("Content-Type", "text/plain")
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        """ Start the thread of HTTP server. """
+        self.thread_.start()
+
+    def stop(self):
+        """ Stop the HTTP server and wait for the thread terminated. """
+        self.stopped_.set()
+        self.server_.shutdown()
+        self.server_.server_close()
+        self.thread_.join()
+
+
+def start_simulators(count, port=0, day_length=86400.0, seed=None, **kwargs):
+    """ Start the simulators listening on the consecutive ports. Each of them
+        has its own ChargeController object.
+
+    Args:
+        count: number of the simulators.
+        port: port number of the first simulator. Free ports if 0.
+        day_length: seconds of a day passed to ChargeController.
+        seed: seed of the first simulator, incremented for the others.
+        kwargs: keyword arguments passed to Simulator like latency.
+    Returns:
+        list of the started Simulator objects.
+    """
+    simulators = []
+
+    for i in range(count):
+        instance_seed = None if seed is None else seed + i
+        simulator = Simulator(
+            port=port + i if port else 0,
+            controller=ChargeController(day_length=day_length, seed=instance_seed),
+            seed=instance_seed, **kwargs)
+        simulator.start()
+        simulators.append(simulator)
+
+    return simulators
+
+
+def main(argv=None):
+    arg = argparse.ArgumentParser(description="TS-MPPT-60 live view simulator")
+    arg.add_argument("--count", type=int, default=1, help="number of simulators")
+    arg.add_argument("--host", default="127.0.0.1", help="host address to listen")
+    arg.add_argument("--port", type=int, default=8080, help="port of the first simulator")
+    arg.add_argument("--day-length", type=float, default=86400.0, help="seconds of a day")
+    arg.add_argument("--latency", type=float, default=0.0, help="seconds to delay responses")
+    arg.add_argument("--jitter", type=float, default=0.0, help="max seconds added to latency")
+    arg.add_argument("--timeout-rate", type=float, default=0.0, help="ratio of hung requests")
+    arg.add_argument("--error-rate", type=float, default=0.0, help="ratio of 500 error")
+    arg.add_argument("--malformed-rate", type=float, default=0.0, help="ratio of broken CSV")
+    arg.add_argument("--hang", type=float, default=10.0, help="seconds to hold hung requests")
+    arg.add_argument("--seed", type=int, default=None, help="seed of the random values")
+    args = arg.parse_args(argv)
+
+    simulators = start_simulators(
+        args.count, port=args.port, day_length=args.day_length, seed=args.seed,
+        host=args.host, latency=args.latency, jitter=args.jitter,
+        timeout_rate=args.timeout_rate, error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate, hang=args.hang)
+
+    for simulator in simulators:
+        print("simulator listening on {}:{}".format(args.host, simulator.get_port()))
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for simulator in simulators:
+            simulator.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Write-ahead spool for the data uploaded to cloud services. The data is
+appended to a file with an idempotency key before uploading, and removed from
+the spool only after the upload succeeded. If the cloud service is unreachable,
+the data is kept on the file and retried with exponential backoff, and the
+backlog is drained at limited rate after the service recovered.
+
+The spool file has a JSON record per line like below, and the byte offset of
+the first undelivered record is stored in another file with ".offset" suffix.
+
+    {"key": "solar-2016-01-01T00:00:00", "payload": [...]}
+"""
+
+import datetime
+import json
+import os
+import time
+from collections import deque
+from solar_monitor import logger
+
+
+def parse_isoformat(text):
+    """ Parse the string made by datetime.isoformat() of naive datetime
+        object, which is written to the spool as JSON.
+
+    Args:
+        text: string like "2016-01-01T00:00:00.123456".
+    Returns:
+        naive datetime object.
+    """
+    if "." in text:
+        return datetime.datetime.strptime(text, "%Y-%m-%dT%H:%M:%S.%f")
+    return datetime.datetime.strptime(text, "%Y-%m-%dT%H:%M:%S")
+
+
+class Spool(object):
+    """ Bounded append-only file of the payloads waiting for delivery.
+
+    Args:
+        path: file path of the spool.
+        max_bytes: max size of the spool file. The oldest records are dropped
+            if the pending records exceed this size.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024):
+        self.path_ = path
+        self.offset_path_ = path + ".offset"
+        self.max_bytes_ = max_bytes
+
+        # (offset, length, key) of the pending records in order.
+        self.records_ = deque()
+        self.keys_ = set()
+        self.offset_ = 0
+        self.end_ = 0
+        self.dropped_ = 0
+
+        self._load()
+
+    def _load(self):
+        """ Load the pending records from the spool file. The broken record at
+            the end of the file, ex. written partially at power loss, is
+            truncated.
+        """
+        if os.path.exists(self.offset_path_):
+            with open(self.offset_path_, "r") as f:
+                self.offset_ = int(f.read().strip() or 0)
+
+        if not os.path.exists(self.path_):
+            self.offset_ = 0
+            open(self.path_, "ab").close()
+            return
+
+        # the offset beyond the file means the file is lost after delivered.
+        self.offset_ = min(self.offset_, os.path.getsize(self.path_))
+
+        with open(self.path_, "rb") as f:
+            f.seek(self.offset_)
+            offset = self.offset_
+
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    key = json.loads(line.decode("utf-8"))["key"]
+                except ValueError:
+                    logger.warning("{} truncates broken record at {}.".format(
+                        type(self).__name__, offset))
+                    break
+
+                self.records_.append((offset, len(line), key))
+                self.keys_.add(key)
+                offset += len(line)
+
+        self.end_ = offset
+        with open(self.path_, "r+b") as f:
+            f.truncate(self.end_)
+
+    def _save_offset(self):
+        """ Store the offset of the first pending record atomically. """
+        tmp_path = self.offset_path_ + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(str(self.offset_))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.offset_path_)
+
+    def _compact(self):
+        """ Rewrite the spool file with the pending records only. The offset
+            of the compacted file is stored before replacing the file, so
+            that the crash between them only causes the delivered records to
+            be sent again, never the pending records to be skipped.
+        """
+        tmp_path = self.path_ + ".tmp"
+        records = deque()
+
+        with open(self.path_, "rb") as src, open(tmp_path, "wb") as dst:
+            for offset, length, key in self.records_:
+                src.seek(offset)
+                records.append((dst.tell(), length, key))
+                dst.write(src.read(length))
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        self.offset_ = 0
+        self._save_offset()
+
+        os.replace(tmp_path, self.path_)
+        self.records_ = records
+        self.end_ = sum(length for _, length, _ in records)
+
+    def __len__(self):
+        return len(self.records_)
+
+    def __contains__(self, key):
+        return key in self.keys_
+
+    def get_size(self):
+        """ Get the bytes of the pending records. """
+        return self.end_ - self.offset_
+
+    def get_dropped(self):
+        """ Get the number of records dropped because the spool was full. """
+        return self.dropped_
+
+    def append(self, key, payload):
+        """ Append the payload to the spool file.
+
+        Args:
+            key: idempotency key string of the payload.
+            payload: JSON serializable object.
+        Returns:
+            False if the payload having the same key is already pending,
+            otherwise True.
+        """
+        if key in self.keys_:
+            return False
+
+        line = (json.dumps({"key": key, "payload": payload}) + "\n").encode("utf-8")
+
+        with open(self.path_, "ab") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+        self.records_.append((self.end_, len(line), key))
+        self.keys_.add(key)
+        self.end_ += len(line)
+
+        if self.get_size() > self.max_bytes_:
+            while len(self.records_) > 1 and self.get_size() > self.max_bytes_:
+                self.commit(1)
+                self.dropped_ += 1
+                logger.warning("{} dropped the oldest record.".format(
+                    type(self).__name__))
+
+        if self.end_ > self.max_bytes_:
+            self._compact()
+
+        return True
+
+    def peek(self, count):
+        """ Get the pending records from the oldest one.
+
+        Args:
+            count: max number of records.
+        Returns:
+            list of (key, payload) tuples.
+        """
+        got = []
+        with open(self.path_, "rb") as f:
+            for i, (offset, length, key) in enumerate(self.records_):
+                if i >= count:
+                    break
+                f.seek(offset)
+                got.append((key, json.loads(f.read(length).decode("utf-8"))["payload"]))
+        return got
+
+    def commit(self, count):
+        """ Remove the oldest records which are delivered.
+
+        Args:
+            count: number of records delivered.
+        """
+        for _ in range(min(count, len(self.records_))):
+            offset, length, key = self.records_.popleft()
+            self.keys_.discard(key)
+            self.offset_ = offset + length
+
+        if not self.records_:
+            # nothing is pending, so reuse the file from the top.
+            with open(self.path_, "r+b") as f:
+                f.truncate(0)
+            self.offset_ = 0
+            self.end_ = 0
+
+        self._save_offset()
+
+
+class Backoff(object):
+    """ Exponential backoff to retry the failed delivery.
+
+    Args:
+        initial: seconds to wait after the first failure.
+        maximum: max seconds to wait.
+        factor: multiplier of the wait time for each failure.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, initial=1.0, maximum=600.0, factor=2.0):
+        self.initial_ = initial
+        self.maximum_ = maximum
+        self.factor_ = factor
+        self.delay_ = 0
+        self.ready_at_ = 0
+
+    def is_ready(self, now=None):
+        """ Returns True if the next trial is allowed. """
+        now = time.monotonic() if now is None else now
+        return now >= self.ready_at_
+
+    def fail(self, now=None):
+        """ Record a failure and extend the wait time. """
+        now = time.monotonic() if now is None else now
+        self.delay_ = min(
+            self.maximum_,
+            self.delay_ * self.factor_ if self.delay_ else self.initial_)
+        self.ready_at_ = now + self.delay_
+
+    def succeed(self):
+        """ Record a success and reset the wait time. """
+        self.delay_ = 0
+        self.ready_at_ = 0
+
+
+class SpoolSender(object):
+    """ Deliver the payloads in the spool by the send function with backoff
+        and rate limit.
+
+    Args:
+        spool: Spool object.
+        send: callable object to deliver a payload like send(key, payload).
+            It should raise any exception if failed.
+        rate: max number of records delivered per second on average.
+        burst: max number of records delivered at once.
+        backoff: Backoff object. Default Backoff() if None.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, spool, send, rate=1.0, burst=10, backoff=None):
+        self.spool_ = spool
+        self.send_ = send
+        self.rate_ = rate
+        self.burst_ = burst
+        self.backoff_ = Backoff() if backoff is None else backoff
+        self.tokens_ = float(burst)
+        self.updated_at_ = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens_ = min(
+            float(self.burst_),
+            self.tokens_ + (now - self.updated_at_) * self.rate_)
+        self.updated_at_ = now
+
+    def put(self, key, payload):
+        """ Spool the payload and try to deliver the pending records.
+
+        Args:
+            key: idempotency key string of the payload.
+            payload: JSON serializable object.
+        Returns:
+            Number of records delivered.
+        """
+        self.spool_.append(key, payload)
+        return self.deliver()
+
+    def deliver(self, now=None):
+        """ Deliver the pending records from the oldest one as long as the
+            backoff and rate limit allow.
+
+        Returns:
+            Number of records delivered.
+        """
+        now = time.monotonic() if now is None else now
+
+        if not len(self.spool_) or not self.backoff_.is_ready(now):
+            return 0
+
+        self._refill(now)
+
+        delivered = 0
+        for key, payload in self.spool_.peek(int(self.tokens_)):
+            try:
+                self.send_(key, payload)
+            except Exception as e:
+                self.backoff_.fail(now)
+                logger.warning("{} failed to deliver {}, retry after {} sec: {}".format(
+                    type(self).__name__, key, self.backoff_.delay_, e))
+                break
+
+            # commit one by one not to send the delivered record again.
+            self.spool_.commit(1)
+            self.tokens_ -= 1
+            delivered += 1
+        else:
+            self.backoff_.succeed()
+
+        return delivered
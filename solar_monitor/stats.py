@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Statistics to be tracked by the long running loops and threads, like the
+lateness of the timer ticks or the latency of each stage of the pipeline.
+
+The latency of the stages is observed to the histograms on REGISTRY by name
+like below, and REGISTRY.get_snapshot() returns them with the status of the
+registered objects like the event listeners at runtime.
+
+    with REGISTRY.measure("get_rawdata"):
+        ...
+"""
+
+import bisect
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from queue import Empty
+from queue import Queue
+from threading import Lock
+
+# Returned by TimedQueue.get_or_wake() if woken up without any item.
+WAKE = object()
+
+
+def log_bounds(start=0.001, factor=2.0, count=21):
+    """ Make the upper bounds of the histogram buckets growing
+        logarithmically.
+
+    Args:
+        start: upper bound of the first bucket.
+        factor: ratio of the next upper bound.
+        count: number of the bounds.
+    Returns:
+        tuple of the upper bounds like (0.001, 0.002, 0.004, ...).
+    """
+    return tuple(start * factor ** i for i in range(count))
+
+
+class Histogram(object):
+    """ Histogram of the observed values with count, sum and max. The value
+        over the last bound is counted on the overflow bucket.
+
+    Args:
+        bounds: upper bounds of the buckets in ascending order.
+            log_bounds() if None, which covers 1 ms to about 17 minutes.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, bounds=None):
+        self.bounds_ = tuple(bounds) if bounds is not None else log_bounds()
+        self.lock_ = Lock()
+        self.reset()
+
+    def reset(self):
+        """ Clear the observed values. """
+        with self.lock_:
+            self.counts_ = [0] * (len(self.bounds_) + 1)
+            self.count_ = 0
+            self.sum_ = 0.0
+            self.max_ = None
+
+    def observe(self, value):
+        """ Add the value to the histogram.
+
+        Args:
+            value: int or float value.
+        """
+        i = bisect.bisect_left(self.bounds_, value)
+
+        with self.lock_:
+            self.counts_[i] += 1
+            self.count_ += 1
+            self.sum_ += value
+            if self.max_ is None or value > self.max_:
+                self.max_ = value
+
+    def get_snapshot(self):
+        """ Get the snapshot of the histogram.
+
+        Returns:
+            dict object like below. "buckets" is list of (upper bound, count)
+            of the bucket, and the upper bound of the overflow bucket is
+            float("inf").
+
+            {"count": 3, "sum": 0.5, "max": 0.3,
+             "buckets": [(0.001, 0), (0.002, 1), ..., (inf, 0)]}
+        """
+        with self.lock_:
+            return {
+                "count": self.count_,
+                "sum": self.sum_,
+                "max": self.max_,
+                "buckets": list(zip(self.bounds_ + (float("inf"),), self.counts_))}
+
+
+class TimedQueue(Queue):
+    """ Queue which observes the seconds each item waited in the queue, and
+        the max number of the queued items.
+
+    Args:
+        maxsize: max number of items. Infinite if 0.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, maxsize=0):
+        Queue.__init__(self, maxsize)
+
+        self.wait_ = Histogram()
+        self.max_queued_ = 0
+        self.is_woken_ = False
+
+    def _init(self, maxsize):
+        Queue._init(self, maxsize)
+        self.put_times_ = deque()
+
+    # _put() and _get() are called with the mutex of Queue locked.
+    def _put(self, item):
+        Queue._put(self, item)
+        self.put_times_.append(time.monotonic())
+
+        if len(self.queue) > self.max_queued_:
+            self.max_queued_ = len(self.queue)
+
+    def _get(self):
+        self.wait_.observe(time.monotonic() - self.put_times_.popleft())
+        return Queue._get(self)
+
+    def wake(self):
+        """ Make the waiting get_or_wake() return WAKE without putting any
+            item, so it takes no space of the queue.
+        """
+        with self.not_empty:
+            self.is_woken_ = True
+            self.not_empty.notify_all()
+
+    def get_or_wake(self, timeout=None):
+        """ Same as get() except that WAKE is returned if wake() is called
+            while the queue is empty.
+
+        Args:
+            timeout: max seconds to wait. Forever if None.
+        Returns:
+            Item got from the queue or WAKE.
+        Raises:
+            queue.Empty: if neither item nor wake() comes in timeout.
+        """
+        with self.not_empty:
+            deadline = None if timeout is None else time.monotonic() + timeout
+
+            while not self._qsize():
+                if self.is_woken_:
+                    self.is_woken_ = False
+                    return WAKE
+
+                if deadline is None:
+                    self.not_empty.wait()
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Empty
+                self.not_empty.wait(remaining)
+
+            item = self._get()
+            self.not_full.notify()
+            return item
+
+
+class Registry(object):
+    """ Registry of the histograms of the stages and the objects having
+        get_status() method to be read at runtime.
+
+    Returns:
+        Instance object
+    """
+
+    def __init__(self):
+        self.lock_ = Lock()
+        self.histograms_ = {}
+        self.counters_ = {}
+        self.sources_ = weakref.WeakValueDictionary()
+        self.source_counts_ = {}
+
+    def get_histogram(self, name):
+        """ Get the histogram of the stage, which is made if not exists.
+
+        Args:
+            name: name of the stage like "get_rawdata".
+        Returns:
+            Histogram object.
+        """
+        with self.lock_:
+            histogram = self.histograms_.get(name)
+            if histogram is None:
+                histogram = self.histograms_[name] = Histogram()
+            return histogram
+
+    def observe(self, name, seconds):
+        """ Add the latency of the stage.
+
+        Args:
+            name: name of the stage like "get_rawdata".
+            seconds: latency of the stage.
+        """
+        self.get_histogram(name).observe(seconds)
+
+    def count(self, name, count=1):
+        """ Increment the counter like the number of errors.
+
+        Args:
+            name: name of the counter like "poll_errors".
+            count: number to be added.
+        """
+        with self.lock_:
+            self.counters_[name] = self.counters_.get(name, 0) + count
+
+    @contextmanager
+    def measure(self, name):
+        """ Observe the latency of the block on time.monotonic() even if the
+            block raises exception.
+
+        Args:
+            name: name of the stage like "get_rawdata".
+        """
+        histogram = self.get_histogram(name)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            histogram.observe(time.monotonic() - started)
+
+    def add_source(self, obj, name=None):
+        """ Register the object having get_status() method. The object is
+            removed automatically when it is deleted.
+
+        Args:
+            obj: object having get_status() method.
+            name: name of the object. The class name if None, and "-2", "-3"
+                ... are added for the second object and later of the name.
+        Returns:
+            The registered name.
+        """
+        name = name or type(obj).__name__
+
+        with self.lock_:
+            count = self.source_counts_.get(name, 0) + 1
+            self.source_counts_[name] = count
+            if count > 1:
+                name = "{}-{}".format(name, count)
+            self.sources_[name] = obj
+
+        return name
+
+    def get_snapshot(self):
+        """ Get the snapshot of all stages and registered objects.
+
+        Returns:
+            dict object like below.
+
+            {"stages": {"get_rawdata": Histogram.get_snapshot(), ...},
+             "counters": {"poll_errors": 1, ...},
+             "sources": {"KeenIoEventHandler": get_status(), ...}}
+        """
+        with self.lock_:
+            histograms = list(self.histograms_.items())
+            counters = dict(self.counters_)
+            sources = list(self.sources_.items())
+
+        return {
+            "counters": counters,
+            "stages": dict(
+                (name, histogram.get_snapshot()) for name, histogram in histograms),
+            "sources": dict((name, obj.get_status()) for name, obj in sources)}
+
+
+REGISTRY = Registry()
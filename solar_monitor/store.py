@@ -0,0 +1,635 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Local time-series store of the polled data on SQLite. The tables follow
+doc/database.uml like below, and every field of a sample is stored as a row of
+"data" table linked from "record" table with its group and source.
+
+    geo(ix, longitude, latitude)
+    source(ix, name, type)
+    data_group(ix, name)
+    data(ix, label, value, unit, timestamp)
+    record(ix, data_ix, data_group_ix, source_ix, geo_ix, created_at)
+
+The finished buckets of solar_monitor.rollup are stored on "rollup" table
+keyed by the resolution in seconds, the label and the start of the bucket.
+
+    rollup(resolution, label, start, min, max, mean, count, last, unit)
+
+The raw data and the rollups are kept in tiers by Compactor, which runs in
+the background with a budget of the running time and merges the raw data older
+than the retention into the rollups before deleting it.
+
+The database runs in WAL mode so that readers don't block the writer, and the
+rows are inserted by executemany() with the same SQL statements to reuse the
+prepared statements cached by sqlite3 module.
+"""
+
+import datetime
+import sqlite3
+import time
+from threading import Event
+from threading import Lock
+from threading import Thread
+from solar_monitor import logger
+from solar_monitor.rollup import RESOLUTIONS
+from solar_monitor.rollup import Rollup
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS geo ("
+    " ix INTEGER PRIMARY KEY, longitude REAL, latitude REAL)",
+    "CREATE TABLE IF NOT EXISTS source ("
+    " ix INTEGER PRIMARY KEY, name TEXT NOT NULL, type TEXT NOT NULL DEFAULT '',"
+    " UNIQUE (name, type))",
+    "CREATE TABLE IF NOT EXISTS data_group ("
+    " ix INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+    "CREATE TABLE IF NOT EXISTS data ("
+    " ix INTEGER PRIMARY KEY, label TEXT NOT NULL, value REAL,"
+    " unit TEXT, timestamp TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS record ("
+    " ix INTEGER PRIMARY KEY, data_ix INTEGER NOT NULL REFERENCES data (ix),"
+    " data_group_ix INTEGER REFERENCES data_group (ix),"
+    " source_ix INTEGER REFERENCES source (ix),"
+    " geo_ix INTEGER REFERENCES geo (ix), created_at TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS rollup ("
+    " resolution INTEGER NOT NULL, label TEXT NOT NULL, start TEXT NOT NULL,"
+    " min REAL, max REAL, mean REAL, count INTEGER, last REAL, unit TEXT,"
+    " PRIMARY KEY (resolution, label, start))",
+    "CREATE INDEX IF NOT EXISTS data_timestamp ON data (timestamp)",
+    "CREATE INDEX IF NOT EXISTS data_label_timestamp ON data (label, timestamp)",
+    "CREATE INDEX IF NOT EXISTS record_data_ix ON record (data_ix)",
+)
+
+_INSERT_DATA = \
+    "INSERT INTO data (ix, label, value, unit, timestamp) VALUES (?, ?, ?, ?, ?)"
+_INSERT_RECORD = \
+    "INSERT INTO record (data_ix, data_group_ix, source_ix, geo_ix, created_at)" \
+    " VALUES (?, ?, ?, ?, ?)"
+_SELECT_RANGE = \
+    "SELECT timestamp, value FROM data" \
+    " WHERE label = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp"
+
+# the rollups are merged by UPDATE and INSERT in a transaction instead of the
+# upsert syntax not to require SQLite 3.24 or later.
+_INSERT_ROLLUP = \
+    "INSERT INTO rollup" \
+    " (resolution, label, start, min, max, mean, count, last, unit)" \
+    " VALUES (:resolution, :label, :start, :min, :max, :mean, :count, :last, :unit)"
+_INSERT_OR_IGNORE_ROLLUP = \
+    "INSERT OR IGNORE INTO rollup" \
+    " (resolution, label, start, min, max, mean, count, last, unit)" \
+    " VALUES (:resolution, :label, :start, :min, :max, :mean, :count, :last, :unit)"
+_UPDATE_ROLLUP = \
+    "UPDATE rollup SET" \
+    " min = MIN(min, :min), max = MAX(max, :max)," \
+    " mean = (mean * count + :mean * :count) / (count + :count)," \
+    " count = count + :count, last = :last, unit = COALESCE(:unit, unit)" \
+    " WHERE resolution = :resolution AND label = :label AND start = :start"
+_REPLACE_ROLLUP = \
+    "UPDATE rollup SET" \
+    " min = :min, max = :max, mean = :mean, count = :count, last = :last," \
+    " unit = :unit" \
+    " WHERE resolution = :resolution AND label = :label AND start = :start" \
+    " AND count < :count"
+_SELECT_RAW = \
+    "SELECT ix, timestamp, label, value, unit FROM data" \
+    " WHERE timestamp >= ? AND timestamp < ? AND (timestamp > ? OR ix > ?)" \
+    " ORDER BY timestamp, ix LIMIT ?"
+_SELECT_OLD_DATA_IX = \
+    "SELECT ix FROM data WHERE timestamp < ? LIMIT ?"
+_DELETE_RECORD = "DELETE FROM record WHERE data_ix = ?"
+_DELETE_DATA = "DELETE FROM data WHERE ix = ?"
+_DELETE_OLD_ROLLUP = \
+    "DELETE FROM rollup WHERE rowid IN" \
+    " (SELECT rowid FROM rollup WHERE resolution = ? AND start < ? LIMIT ?)"
+_SELECT_ROLLUP = \
+    "SELECT start, min, max, mean, count, last FROM rollup" \
+    " WHERE resolution = ? AND label = ? AND start >= ? AND start < ?" \
+    " ORDER BY start"
+
+
+def format_timestamp(at):
+    """ Format datetime object as the sortable string stored on the database.
+
+    Args:
+        at: datetime object.
+    Returns:
+        String like "2016-01-01T00:00:00.000000".
+    """
+    return at.strftime(TIMESTAMP_FORMAT)
+
+
+def parse_timestamp(text):
+    """ Parse the string formatted by format_timestamp().
+
+    Args:
+        text: String like "2016-01-01T00:00:00.000000".
+    Returns:
+        datetime object.
+    """
+    return datetime.datetime.strptime(text, TIMESTAMP_FORMAT)
+
+
+def _to_rollup_row(resolution, label, bucket, unit):
+    """ Make the named parameters of the rollup statements from the bucket. """
+    return {
+        "resolution": resolution, "label": label,
+        "start": format_timestamp(bucket.start), "min": bucket.min,
+        "max": bucket.max, "mean": bucket.mean, "count": bucket.count,
+        "last": bucket.last, "unit": unit}
+
+
+class SqliteStore(object):
+    """ Store the samples on SQLite database.
+
+    Args:
+        path: file path of the database. ":memory:" for test.
+        geo: (longitude, latitude) tuple of the charge controller or None.
+    Returns:
+        Instance object
+    """
+
+    def __init__(self, path, geo=None):
+        self.path_ = path
+        self.geo_ = geo
+        self.lock_ = Lock()
+        self.conn_ = None
+
+        # name -> ix of source/data_group table.
+        self.source_ixs_ = {}
+        self.group_ixs_ = {}
+        self.geo_ix_ = None
+        self.next_data_ix_ = None
+
+    def _connect(self):
+        """ Open the database and create the tables if not exist. """
+        if self.conn_ is not None:
+            return self.conn_
+
+        conn = sqlite3.connect(self.path_, check_same_thread=False)
+        # effective only for the new database to reclaim the deleted pages.
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+
+        with conn:
+            for sql in _SCHEMA:
+                conn.execute(sql)
+
+            if self.geo_ is not None:
+                row = conn.execute(
+                    "SELECT ix FROM geo WHERE longitude = ? AND latitude = ?",
+                    self.geo_).fetchone()
+                if row is None:
+                    self.geo_ix_ = conn.execute(
+                        "INSERT INTO geo (longitude, latitude) VALUES (?, ?)",
+                        self.geo_).lastrowid
+                else:
+                    self.geo_ix_ = row[0]
+
+        self.next_data_ix_ = conn.execute(
+            "SELECT COALESCE(MAX(ix), 0) + 1 FROM data").fetchone()[0]
+        self.conn_ = conn
+        return conn
+
+    def _get_ix(self, conn, cache, table, name):
+        """ Get ix of the name on source/data_group table, and insert it if
+            not exists.
+        """
+        ix = cache.get(name)
+        if ix is not None:
+            return ix
+
+        conn.execute(
+            "INSERT OR IGNORE INTO {} (name) VALUES (?)".format(table), (name,))
+        ix = conn.execute(
+            "SELECT ix FROM {} WHERE name = ?".format(table), (name,)).fetchone()[0]
+        cache[name] = ix
+        return ix
+
+    def insert(self, samples):
+        """ Insert the samples in a transaction.
+
+        Args:
+            samples: list of Sample objects or dict objects having the same
+                shape.
+        Returns:
+            Number of data rows inserted.
+        """
+        with self.lock_:
+            conn = self._connect()
+            data_rows = []
+            record_rows = []
+
+            with conn:
+                ix = self.next_data_ix_
+                for sample in samples:
+                    source_ix = self._get_ix(
+                        conn, self.source_ixs_, "source", sample["source"])
+                    timestamp = format_timestamp(sample["at"])
+
+                    for label, datum in sample["data"].items():
+                        group_ix = self._get_ix(
+                            conn, self.group_ixs_, "data_group", datum["group"])
+                        data_rows.append(
+                            (ix, label, datum["value"], datum["unit"], timestamp))
+                        record_rows.append(
+                            (ix, group_ix, source_ix, self.geo_ix_, timestamp))
+                        ix += 1
+
+                conn.executemany(_INSERT_DATA, data_rows)
+                conn.executemany(_INSERT_RECORD, record_rows)
+
+            self.next_data_ix_ = ix
+
+        return len(data_rows)
+
+    def query(self, label, start, end):
+        """ Get the values of the label in the time range.
+
+        Args:
+            label: label of the data like "Battery Voltage".
+            start: datetime object of the start (inclusive).
+            end: datetime object of the end (exclusive).
+        Returns:
+            list of (datetime, value) tuples in time order.
+        """
+        with self.lock_:
+            conn = self._connect()
+            rows = conn.execute(
+                _SELECT_RANGE,
+                (label, format_timestamp(start), format_timestamp(end))).fetchall()
+
+        return [(parse_timestamp(timestamp), value) for timestamp, value in rows]
+
+    def insert_rollups(self, buckets, units=None):
+        """ Insert the finished rollup buckets in a transaction. The bucket
+            already stored like the partial one flushed before a restart is
+            merged with the new one, which is taken as the later one.
+
+        Args:
+            buckets: list of (resolution, label, Bucket) tuples returned by
+                Rollup.update().
+            units: dict object of label -> unit.
+        Returns:
+            Number of rows inserted.
+        """
+        units = units or {}
+        rows = [
+            _to_rollup_row(resolution, label, bucket, units.get(label))
+            for resolution, label, bucket in buckets]
+
+        with self.lock_:
+            conn = self._connect()
+            with conn:
+                for row in rows:
+                    if conn.execute(_UPDATE_ROLLUP, row).rowcount == 0:
+                        conn.execute(_INSERT_ROLLUP, row)
+
+        return len(rows)
+
+    def query_rollups(self, resolution, label, start, end):
+        """ Get the rollup buckets of the label in the time range.
+
+        Args:
+            resolution: bucket width in seconds.
+            label: label of the data like "Battery Voltage".
+            start: datetime object of the start (inclusive).
+            end: datetime object of the end (exclusive).
+        Returns:
+            list of (start, min, max, mean, count, last) tuples in time order.
+        """
+        with self.lock_:
+            conn = self._connect()
+            rows = conn.execute(
+                _SELECT_ROLLUP,
+                (resolution, label,
+                 format_timestamp(start), format_timestamp(end))).fetchall()
+
+        return [(parse_timestamp(row[0]),) + tuple(row[1:]) for row in rows]
+
+    def get_oldest(self):
+        """ Get timestamp of the oldest raw data.
+
+        Returns:
+            datetime object or None if no data.
+        """
+        with self.lock_:
+            conn = self._connect()
+            row = conn.execute("SELECT MIN(timestamp) FROM data").fetchone()
+
+        return None if row[0] is None else parse_timestamp(row[0])
+
+    def _iter_raw(self, start, end, chunk_size, rest=None):
+        """ Iterate the raw data in the time range by chunks of rows. The
+            lock is released between the chunks, which are paged by the
+            timestamp and ix of the last row.
+
+        Args:
+            start: datetime object of the start (inclusive).
+            end: datetime object of the end (exclusive).
+            chunk_size: max number of rows read at once.
+            rest: callable called with the seconds spent on a chunk.
+        Returns:
+            Generator of (timestamp, label, value, unit) tuples in time order.
+        """
+        timestamp, ix = format_timestamp(start), -1
+        end = format_timestamp(end)
+
+        while True:
+            started = time.monotonic()
+            with self.lock_:
+                conn = self._connect()
+                rows = conn.execute(
+                    _SELECT_RAW,
+                    (timestamp, end, timestamp, ix, chunk_size)).fetchall()
+
+            for row in rows:
+                yield row[1:]
+
+            if len(rows) < chunk_size:
+                return
+
+            ix, timestamp = rows[-1][:2]
+            if rest is not None:
+                rest(time.monotonic() - started)
+
+    def merge_rollups(
+            self, start, end, resolutions=RESOLUTIONS, chunk_size=500,
+            rest=None):
+        """ Aggregate the raw data in the time range into the rollups. The
+            bucket already stored is replaced only if the raw data has more
+            samples, so the bucket aggregated from the complete raw data wins.
+            The raw data is read by chunks, and only the running buckets are
+            kept on memory.
+
+        Args:
+            start: datetime object of the start aligned to the resolutions.
+            end: datetime object of the end aligned to the resolutions.
+            resolutions: bucket widths in seconds.
+            chunk_size: max number of raw data rows read at once.
+            rest: callable called with the seconds spent on a chunk to keep
+                the budget like Compactor.
+        Returns:
+            Number of buckets merged.
+        """
+        rollup = Rollup(resolutions)
+        buckets = []
+
+        sample = None
+        for timestamp, label, value, unit in self._iter_raw(
+                start, end, chunk_size, rest):
+            if sample is None or sample["timestamp"] != timestamp:
+                if sample is not None:
+                    buckets.extend(rollup.update(sample))
+                sample = {
+                    "timestamp": timestamp,
+                    "at": parse_timestamp(timestamp),
+                    "data": {}}
+            sample["data"][label] = {"value": value, "unit": unit}
+
+        if sample is not None:
+            buckets.extend(rollup.update(sample))
+        buckets.extend(rollup.flush())
+
+        rows = [
+            _to_rollup_row(resolution, label, bucket, rollup.get_unit(label))
+            for resolution, label, bucket in buckets]
+
+        with self.lock_:
+            conn = self._connect()
+            with conn:
+                for row in rows:
+                    if conn.execute(_REPLACE_ROLLUP, row).rowcount == 0:
+                        conn.execute(_INSERT_OR_IGNORE_ROLLUP, row)
+
+        return len(rows)
+
+    def delete_raw(self, before, limit):
+        """ Delete the raw data older than the time up to the limit.
+
+        Args:
+            before: datetime object. The data before this is deleted.
+            limit: max number of data rows deleted.
+        Returns:
+            Number of data rows deleted.
+        """
+        with self.lock_:
+            conn = self._connect()
+            with conn:
+                ixs = conn.execute(
+                    _SELECT_OLD_DATA_IX,
+                    (format_timestamp(before), limit)).fetchall()
+                conn.executemany(_DELETE_RECORD, ixs)
+                conn.executemany(_DELETE_DATA, ixs)
+
+        return len(ixs)
+
+    def delete_rollups(self, resolution, before, limit):
+        """ Delete the rollups of the resolution older than the time up to
+            the limit.
+
+        Args:
+            resolution: bucket width in seconds.
+            before: datetime object. The buckets before this are deleted.
+            limit: max number of rows deleted.
+        Returns:
+            Number of rows deleted.
+        """
+        with self.lock_:
+            conn = self._connect()
+            with conn:
+                cursor = conn.execute(
+                    _DELETE_OLD_ROLLUP,
+                    (resolution, format_timestamp(before), limit))
+
+        return cursor.rowcount
+
+    def vacuum(self, pages):
+        """ Reclaim the free pages of the database file incrementally.
+
+        Args:
+            pages: max number of pages reclaimed. Only counted if 0.
+        Returns:
+            Number of free pages left.
+        """
+        with self.lock_:
+            conn = self._connect()
+            if pages > 0:
+                conn.execute(
+                    "PRAGMA incremental_vacuum({:d})".format(pages)).fetchall()
+            return conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    def close(self):
+        """ Close the database. """
+        with self.lock_:
+            if self.conn_ is not None:
+                self.conn_.close()
+                self.conn_ = None
+
+
+class Compactor(object):
+    """ Keep the data on the database in tiers of retention. The raw data older
+        than the retention is merged into the rollups by day and deleted, the
+        rollups older than their retention are deleted, and then the free pages
+        are reclaimed.
+
+        Every step handles a chunk of rows and sleeps after it, so that the
+        compaction uses the database and CPU only for the ratio of "duty" and
+        never blocks the handlers storing the polled data for long.
+
+    Args:
+        path: file path of the database.
+        raw_retention: timedelta object to keep the raw data.
+        rollup_retentions: dict object of resolution -> timedelta object to
+            keep the rollups. The resolutions not in it are kept forever.
+            1 minute rollups are kept for 90 days if None.
+        resolutions: bucket widths in seconds to merge the raw data into.
+        interval: seconds between the compactions on the thread.
+        chunk_size: max number of rows handled by a step.
+        duty: max ratio of time running the steps.
+    Returns:
+        Instance object
+    """
+
+    def __init__(
+            self, path,
+            raw_retention=datetime.timedelta(days=7),
+            rollup_retentions=None,
+            resolutions=RESOLUTIONS, interval=3600, chunk_size=500, duty=0.1):
+        if not 0 < duty <= 1:
+            raise ValueError("duty must be in (0, 1].")
+
+        self.store_ = SqliteStore(path)
+        self.raw_retention_ = raw_retention
+        if rollup_retentions is None:
+            rollup_retentions = {60: datetime.timedelta(days=90)}
+
+        self.rollup_retentions_ = dict(rollup_retentions)
+        self.resolutions_ = tuple(resolutions)
+        self.interval_ = interval
+        self.chunk_size_ = chunk_size
+        self.duty_ = duty
+
+        self.event_stop_ = Event()
+        self.thread_ = Thread(target=self._thread_main, daemon=True)
+
+    def _step(self, func, *args):
+        """ Run a step and sleep to keep the duty.
+
+        Returns:
+            Result of the step.
+        """
+        started = time.monotonic()
+        ret = func(*args)
+
+        self._rest(time.monotonic() - started)
+        return ret
+
+    def _rest(self, elapsed):
+        """ Sleep after running for the seconds to keep the duty. """
+        self.event_stop_.wait(elapsed * (1 - self.duty_) / self.duty_)
+
+    def _floor_day(self, at):
+        return datetime.datetime(at.year, at.month, at.day)
+
+    def run_once(self, now=None):
+        """ Compact the database once.
+
+        Args:
+            now: datetime object in UTC. datetime.utcnow() if None.
+        Returns:
+            dict object like {"merged": 10, "deleted": 100, "free": 0}.
+        """
+        now = now or datetime.datetime.utcnow()
+        ret = {"merged": 0, "deleted": 0, "free": 0}
+
+        cutoff = self._floor_day(now - self.raw_retention_)
+        oldest = self.store_.get_oldest()
+        day = None if oldest is None else self._floor_day(oldest)
+        one_day = datetime.timedelta(days=1)
+
+        while day is not None and day < cutoff and not self.event_stop_.is_set():
+            # rests between the chunks of the raw data by itself
+            ret["merged"] += self.store_.merge_rollups(
+                day, day + one_day, self.resolutions_, self.chunk_size_,
+                self._rest)
+
+            while not self.event_stop_.is_set():
+                deleted = self._step(
+                    self.store_.delete_raw, day + one_day, self.chunk_size_)
+                ret["deleted"] += deleted
+                if deleted < self.chunk_size_:
+                    break
+
+            day += one_day
+
+        for resolution, retention in sorted(self.rollup_retentions_.items()):
+            while not self.event_stop_.is_set():
+                deleted = self._step(
+                    self.store_.delete_rollups,
+                    resolution, now - retention, self.chunk_size_)
+                ret["deleted"] += deleted
+                if deleted < self.chunk_size_:
+                    break
+
+        free = self.store_.vacuum(0) if ret["deleted"] else 0
+        while free and not self.event_stop_.is_set():
+            left = self._step(self.store_.vacuum, self.chunk_size_)
+            if left >= free:
+                break
+            free = left
+        ret["free"] = free
+
+        logger.info("{} merged {} buckets and deleted {} rows.".format(
+            type(self).__name__, ret["merged"], ret["deleted"]))
+        return ret
+
+    def _thread_main(self):
+        while not self.event_stop_.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error("{} failed: {}".format(type(self).__name__, e))
+
+            self.event_stop_.wait(self.interval_)
+
+        self.store_.close()
+
+    def start(self):
+        """ Start the thread compacting the database periodically. """
+        self.thread_.start()
+
+    def stop(self):
+        """ Stop the thread. Need to call join() method to terminate it. """
+        self.event_stop_.set()
+
+    def join(self, timeout=3):
+        """ Wait and block until the thread is terminated.
+
+        Args:
+            timeout: Timeout to join as second.
+        Raise:
+            SystemError: If the thread cannot be joined.
+        """
+        self.thread_.join(timeout)
+        if self.thread_.is_alive():
+            raise SystemError("{} cannot stop.".format(type(self).__name__))
@@ -21,6 +21,8 @@ import threading
 import time
 
 from solar_monitor import logger
+from solar_monitor.profiling import PROFILER
+from solar_monitor.stats import Histogram
 from datetime import datetime
 
 
@@ -77,14 +79,14 @@ class RecursiveTimer(object):
         while True:
             time.sleep(0.5)
 
-            if self.event_stop_timer.isSet():
+            if self.event_stop_timer.is_set():
                 break
 
             if 'now_time' in locals():
                 del now_time
             now_time = datetime.now()
 
-            if (now_time - start_time).seconds >= self.interval:
+            if (now_time - start_time).total_seconds() >= self.interval:
                 if 'start_time' in locals():
                     del start_time
                 start_time = now_time
@@ -106,7 +108,7 @@ class RecursiveTimer(object):
             event_tick.wait()
             event_tick.clear()
 
-            if self.event_stop_timer.isSet():
+            if self.event_stop_timer.is_set():
                 break
 
             try:
@@ -124,7 +126,7 @@ class RecursiveTimer(object):
         Raises:
             timer.AlreadyRunningError if timer already started.
         """
-        if not self.thread_timer.isAlive():
+        if not self.thread_timer.is_alive():
             self.event_stop_timer.clear()
             self.thread_timer.start()
         else:
@@ -140,7 +142,7 @@ class RecursiveTimer(object):
         Raises:
             timer.NotStartedYetError if timer is canceled even though it's not started yet.
         """
-        if self.thread_timer.isAlive():
+        if self.thread_timer.is_alive():
             self.event_stop_timer.set()
             self.thread_timer.join()
         else:
@@ -160,7 +162,199 @@ class RecursiveTimer(object):
         >>> rt.is_alive()
         False
         """
-        return self.thread_timer.isAlive()
+        return self.thread_timer.is_alive()
+
+
+OVERRUN_SKIP = "skip"
+OVERRUN_CATCH_UP = "catch_up"
+OVERRUN_CONCURRENT = "concurrent"
+OVERRUN_POLICIES = (OVERRUN_SKIP, OVERRUN_CATCH_UP, OVERRUN_CONCURRENT)
+
+
+class MonotonicTimer(object):
+    """Class of timer for recursively running function at fixed rate.
+
+    The deadlines are scheduled on time.monotonic() as start + n * interval,
+    and the timer thread sleeps exactly until the next deadline. So the timer
+    doesn't drift even if the function takes time, and isn't affected by the
+    change of the system clock.
+
+    If the function overruns the next deadlines, the overrun policy decides
+    what to do with them like below.
+
+        skip:       skip the missed deadlines to keep the phase.
+        catch_up:   run the function for every missed deadline in a burst.
+        concurrent: run the function on its own thread at every deadline, and
+                    skip the deadline if max_concurrent functions are running.
+
+    Keyword arguments:
+        interval: interval time as second. fraction is available.
+        target_func: callable object to run by timer event.
+                     this function should have keyword arguments but NOT arguments.
+        is_immediate: run target_func at start if True, otherwise after interval.
+        overrun: one of OVERRUN_POLICIES.
+        max_concurrent: max number of target_func running on concurrent policy.
+        late_tolerance: seconds after the deadline to count the run as late.
+        kwargs: object to be passed to the specified target_func
+
+    Returns:
+        timer object
+    """
+
+    def __init__(
+            self, interval, target_func, is_immediate=False,
+            overrun=OVERRUN_SKIP, max_concurrent=2, late_tolerance=0.1,
+            **target_kwargs):
+        if interval <= 0:
+            raise ValueError("interval must be positive.")
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError("overrun must be one of {}.".format(OVERRUN_POLICIES))
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be positive.")
+
+        self.interval = interval
+        self.target_func = target_func
+        self.target_kwargs = target_kwargs
+        self.is_immediate = is_immediate
+        self.overrun = overrun
+        self.late_tolerance = late_tolerance
+
+        self.event_stop_timer = threading.Event()
+        self.thread_timer = threading.Thread(target=self._tick)
+
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.running_threads = set()
+
+        self.status_lock = threading.Lock()
+        self.status = {"executed": 0, "skipped": 0, "late": 0}
+        self.lateness = Histogram()
+
+    def _count(self, key, count=1):
+        with self.status_lock:
+            self.status[key] += count
+
+    def _run(self, lateness):
+        """Call the target function started late by lateness seconds."""
+        self.lateness.observe(max(0.0, lateness))
+        if lateness > self.late_tolerance:
+            self._count("late")
+
+        try:
+            with PROFILER.section():
+                self.target_func(**self.target_kwargs)
+        except Exception as e:
+            logger.debug(str(e) + ' error!!!')
+
+        self._count("executed")
+
+    def _run_concurrently(self, lateness):
+        """Call the target function on the thread of concurrent policy."""
+        try:
+            self._run(lateness)
+        finally:
+            with self.status_lock:
+                self.running_threads.discard(threading.current_thread())
+            self.slots.release()
+
+    def _tick(self):
+        """Sleep until the deadline and call the target function."""
+        start = time.monotonic()
+        ticks = 0 if self.is_immediate else 1
+
+        while not self.event_stop_timer.wait(
+                max(0.0, start + ticks * self.interval - time.monotonic())):
+            lateness = time.monotonic() - (start + ticks * self.interval)
+
+            if self.overrun != OVERRUN_CONCURRENT:
+                self._run(lateness)
+            elif self.slots.acquire(blocking=False):
+                thread = threading.Thread(
+                    target=self._run_concurrently, args=(lateness,))
+                with self.status_lock:
+                    self.running_threads.add(thread)
+                thread.start()
+            else:
+                self._count("skipped")
+
+            if self.overrun == OVERRUN_CATCH_UP:
+                ticks += 1
+                continue
+
+            # the next deadline after now, skipping the overrun deadlines.
+            next_ticks = max(
+                ticks + 1, int((time.monotonic() - start) // self.interval) + 1)
+            if next_ticks > ticks + 1:
+                self._count("skipped", next_ticks - ticks - 1)
+            ticks = next_ticks
+
+        with self.status_lock:
+            threads = list(self.running_threads)
+        for thread in threads:
+            thread.join()
+
+    def get_status(self):
+        """Get the counters of the ticks.
+
+        Args:
+            None
+        Returns:
+            dict object like below. "executed" is the number of target_func
+            called, "skipped" is the number of deadlines not run, "late" is
+            the number of runs started later than late_tolerance, "running"
+            is the number of target_func running on concurrent policy, and
+            "lateness" is the snapshot of stats.Histogram of the seconds late.
+
+            {"executed": 10, "skipped": 1, "late": 2, "running": 0,
+             "lateness": {"count": 10, ...}}
+        """
+        with self.status_lock:
+            status = dict(self.status)
+            status["running"] = len(self.running_threads)
+        status["lateness"] = self.lateness.get_snapshot()
+        return status
+
+    def start(self):
+        """Start the timer thread.
+
+        Args:
+            None
+        Returns:
+            None
+        Raises:
+            timer.AlreadyRunningError if timer already started.
+        """
+        if not self.thread_timer.is_alive():
+            self.event_stop_timer.clear()
+            self.thread_timer.start()
+        else:
+            raise AlreadyRunningError("timer thread is already run")
+
+    def cancel(self):
+        """Stop the timer thread if alive.
+
+        Args:
+            None
+        Returns:
+            None
+        Raises:
+            timer.NotStartedYetError if timer is canceled even though it's not started yet.
+        """
+        if self.thread_timer.is_alive():
+            self.event_stop_timer.set()
+            self.thread_timer.join()
+        else:
+            raise NotStartedYetError("timer is not running")
+
+    def is_alive(self):
+        """Test if the timer thread is alive.
+
+        Args:
+            None
+        Returns:
+            True if alive
+        """
+        return self.thread_timer.is_alive()
+
 
 if __name__ == '__main__':
     import doctest
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+#   Copyright 2016 Takashi Ando - http://blog.rinka-blossom.com/
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+
+"""
+Watchdog of the memory growth of the long running monitor. It samples the RSS
+of the process and the counts of gc generations periodically, and the traced
+sizes by the package allocating them if tracemalloc is enabled. The growth is
+logged and exported by get_status(), and the leak is suspected if the RSS
+keeps growing over the window or the traced size of a package grows at every
+sample like below.
+
+    rss             : RSS grows faster than rss_threshold bytes per hour.
+    tweepy, xively, : traced size of the package grows at every sample over
+    keen, ...         the window and more than package_threshold bytes.
+
+The allocation is attributed to the cloud clients like tweepy, xively and keen
+if any frame of its traceback is in them, even if it's allocated by the
+standard library called from them. The top N lines growing most from the
+previous check are also logged and exported to find where it grows. Grouping
+the traced allocations by their tracebacks takes a while, so the watchdog
+checks on its own thread started by start() not to delay the polling.
+
+The current RSS is read from /proc. Where it's not available, only the peak
+RSS by getrusage() is exported, and the growth of RSS is not judged.
+"""
+
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from threading import Event
+from threading import Lock
+from threading import Thread
+from solar_monitor import logger
+
+# packages to attribute the allocations to, in order of the priority.
+PACKAGES = (
+    "tweepy", "xively", "keen", "requests", "urllib3", "tsmppt60_driver",
+    "solar_monitor")
+
+
+def get_rss():
+    """ Get the current RSS of this process.
+
+    Returns:
+        RSS in bytes, or None if unknown.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def get_peak_rss():
+    """ Get the peak RSS of this process, which never decreases.
+
+    Returns:
+        peak RSS in bytes, or None if unknown.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS, and in KiB on the others.
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def get_package(traceback, packages=PACKAGES):
+    """ Get the package which allocated the memory.
+
+    Args:
+        traceback: tracemalloc.Traceback object.
+        packages: package names in order of the priority.
+    Returns:
+        package name or "other".
+    """
+    filenames = [frame.filename for frame in traceback]
+
+    for package in packages:
+        marker = os.sep + package + os.sep
+        for filename in filenames:
+            if marker in filename:
+                return package
+
+    return "other"
+
+
+def get_slope(points):
+    """ Get the slope of the points by least squares.
+
+    Args:
+        points: list of (x, y) tuples.
+    Returns:
+        slope as float, or 0.0 if less than 2 points.
+    """
+    n = len(points)
+    if n < 2:
+        return 0.0
+
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var = sum((x - mean_x) ** 2 for x, _ in points)
+    if var == 0:
+        return 0.0
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var
+
+
+class MemoryWatchdog(object):
+    """ Sample the memory usage periodically by check() and flag the
+        suspected leaks.
+
+    Args:
+        window: number of the samples to judge the growth.
+        rss_threshold: bytes per hour of RSS growth to suspect leak.
+        package_threshold: bytes of growth of a package over the window to
+            suspect leak.
+        is_tracing: start tracemalloc to sample the sizes by package.
+        frames: number of the frames stored per allocation by tracemalloc.
+        packages: package names to attribute the allocations to.
+        interval: seconds between the checks on the thread.
+        top: number of the lines growing most logged and exported.
+    Returns:
+        Instance object
+    """
+
+    def __init__(
+            self, window=12, rss_threshold=1024 * 1024,
+            package_threshold=256 * 1024, is_tracing=False, frames=16,
+            packages=PACKAGES, interval=600, top=5):
+        if window < 2:
+            raise ValueError("window must be 2 or more.")
+        if interval <= 0:
+            raise ValueError("interval must be positive.")
+
+        self.window_ = window
+        self.rss_threshold_ = rss_threshold
+        self.package_threshold_ = package_threshold
+        self.is_tracing_ = is_tracing
+        self.frames_ = frames
+        self.packages_ = tuple(packages)
+        self.top_ = top
+        # snapshot of the previous check to get the growth by line.
+        self.snapshot_ = None
+
+        self.lock_ = Lock()
+        self.rss_history_ = deque(maxlen=window)
+        # package -> deque of traced sizes.
+        self.package_history_ = {}
+        self.suspected_ = set()
+        self.checks_ = 0
+        self.status_ = {}
+
+        self.interval_ = interval
+        self.event_stop_ = Event()
+        self.thread_ = Thread(
+            target=self._thread_main, name=type(self).__name__, daemon=True)
+
+    def _sample_packages(self):
+        """ Get the traced sizes by package and the top N lines growing most
+            from the previous sample.
+
+        Returns:
+            tuple of dict object of package -> bytes and list of
+            tracemalloc.StatisticDiff objects, or (None, None) if not tracing.
+        """
+        if not tracemalloc.is_tracing():
+            if not self.is_tracing_:
+                return None, None
+            tracemalloc.start(self.frames_)
+
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),))
+
+        sizes = dict((package, 0) for package in self.packages_ + ("other",))
+        for stat in snapshot.statistics("traceback"):
+            sizes[get_package(stat.traceback, self.packages_)] += stat.size
+
+        growth = []
+        if self.snapshot_ is not None:
+            growth = [
+                stat for stat in
+                snapshot.compare_to(self.snapshot_, "lineno")[:self.top_]
+                if stat.size_diff > 0]
+        self.snapshot_ = snapshot
+
+        return sizes, growth
+
+    def _is_growing(self, history):
+        """ Check if the size grows at every sample over the full window. """
+        if len(history) < self.window_:
+            return False
+
+        values = list(history)
+        return all(a < b for a, b in zip(values, values[1:])) and \
+            values[-1] - values[0] > self.package_threshold_
+
+    def check(self, now=None, rss=None, sizes=None):
+        """ Sample the memory usage and judge the leaks.
+
+        Args:
+            now: time.monotonic() value of the sample. Current if None.
+            rss: RSS in bytes. Sampled if None.
+            sizes: dict object of package -> traced bytes. Sampled if None.
+        Returns:
+            set of the names suspected to leak like {"rss", "tweepy"}.
+        """
+        now = time.monotonic() if now is None else now
+        rss = get_rss() if rss is None else rss
+        peak_rss = get_peak_rss()
+
+        lines = None
+        if sizes is None:
+            sizes, lines = self._sample_packages()
+
+        with self.lock_:
+            self.checks_ += 1
+            suspected = set()
+
+            growth = 0.0
+            if rss is not None:
+                self.rss_history_.append((now, rss))
+                growth = get_slope(self.rss_history_) * 3600
+                if len(self.rss_history_) == self.window_ and \
+                        growth > self.rss_threshold_:
+                    suspected.add("rss")
+
+            for package, size in (sizes or {}).items():
+                history = self.package_history_.setdefault(
+                    package, deque(maxlen=self.window_))
+                history.append(size)
+                if package != "other" and self._is_growing(history):
+                    suspected.add(package)
+
+            newly = suspected - self.suspected_
+            self.suspected_ = suspected
+
+            counts = gc.get_count()
+            self.status_ = {
+                "rss_bytes": rss or 0,
+                "rss_peak_bytes": peak_rss or 0,
+                "rss_growth_bytes_per_hour": growth,
+                "gc_count": dict(
+                    ("gen{}".format(i), count) for i, count in enumerate(counts)),
+                "gc_collections": dict(
+                    ("gen{}".format(i), stat["collections"])
+                    for i, stat in enumerate(gc.get_stats())),
+                "suspected_leaks": len(suspected),
+                "checks": self.checks_,
+            }
+            if sizes is not None:
+                self.status_["traced_bytes"] = dict(sizes)
+            if lines is not None:
+                self.status_["traced_growth_bytes"] = dict(
+                    (str(stat.traceback[0]), stat.size_diff) for stat in lines)
+
+        logger.debug("memory: rss {} bytes, peak {} bytes, growth {:.0f} bytes/hour, "
+                     "gc {}".format(rss, peak_rss, growth, counts))
+
+        for stat in lines or []:
+            logger.debug("memory: {}".format(stat))
+
+        for name in sorted(newly):
+            if name == "rss":
+                logger.warning(
+                    "memory leak suspected: RSS grows {:.0f} bytes/hour.".format(growth))
+            else:
+                logger.warning(
+                    "memory leak suspected in {}: traced {} bytes grows at every "
+                    "check.".format(name, sizes[name]))
+
+        return suspected
+
+    def get_suspected(self):
+        """ Get the names suspected to leak on the last check.
+
+        Returns:
+            set like {"rss", "tweepy"}.
+        """
+        with self.lock_:
+            return set(self.suspected_)
+
+    def get_status(self):
+        """ Get the status of the last check.
+
+        Returns:
+            dict object like below. "rss_bytes" is 0 if the current RSS is
+            unknown. "traced_bytes" and "traced_growth_bytes", the top N lines
+            growing most from the previous check, exist only if tracing.
+
+            {"rss_bytes": 30000000, "rss_peak_bytes": 32000000,
+             "rss_growth_bytes_per_hour": 0.0,
+             "gc_count": {"gen0": 100, "gen1": 2, "gen2": 0},
+             "gc_collections": {"gen0": 10, "gen1": 1, "gen2": 0},
+             "suspected_leaks": 0, "checks": 10,
+             "traced_bytes": {"tweepy": 1000, ..., "other": 10000},
+             "traced_growth_bytes": {"/usr/lib/python3.5/ssl.py:100": 512}}
+        """
+        with self.lock_:
+            return dict(self.status_)
+
+    def _thread_main(self):
+        while not self.event_stop_.wait(self.interval_):
+            try:
+                self.check()
+            except Exception as e:
+                logger.error("{} failed: {}".format(type(self).__name__, e))
+
+    def start(self):
+        """ Start the thread checking the memory usage periodically. """
+        self.thread_.start()
+
+    def stop(self):
+        """ Stop the thread. Need to call join() method to terminate it. """
+        self.event_stop_.set()
+
+    def join(self, timeout=3):
+        """ Wait and block until the thread is terminated.
+
+        Args:
+            timeout: Timeout to join as second.
+        Raise:
+            SystemError: If the thread cannot be joined.
+        """
+        self.thread_.join(timeout)
+        if self.thread_.is_alive():
+            raise SystemError("{} cannot stop.".format(type(self).__name__))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from solar_monitor.archive import ColumnarArchive
+from solar_monitor.archive import TIMESTAMP_FILE
+from solar_monitor.archive import from_microseconds
+from solar_monitor.event.handler import ArchiveEventHandler
+from solar_monitor.sample import Sample
+
+
+def make_sample(i, start=datetime(2016, 1, 1), labels=("Battery Voltage",)):
+    data = {}
+    for label in labels:
+        data[label] = {"group": "Battery", "unit": "V", "value": 12.0 + i}
+    return Sample("solar", start + timedelta(minutes=5 * i), data)
+
+
+class TestColumnarArchive(unittest.TestCase):
+    """test ColumnarArchive class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.path_ = os.path.join(self.dir_, "archive")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_read_range(self):
+        """ 時間範囲のcolumnをparseなしで読める """
+        archive = ColumnarArchive(self.path_)
+        for i in range(10):
+            archive.append(make_sample(i))
+
+        timestamps, values = archive.read(
+            "Battery Voltage", datetime(2016, 1, 1, 0, 10), datetime(2016, 1, 1, 0, 20))
+        self.assertEqual([14.0, 15.0], list(values))
+        self.assertEqual(datetime(2016, 1, 1, 0, 10), from_microseconds(timestamps[0]))
+
+        timestamps, values = archive.read("Battery Voltage")
+        self.assertEqual(10, len(values))
+        self.assertEqual("V", archive.get_unit("Battery Voltage"))
+        archive.close()
+
+    def test_new_label(self):
+        """ 途中で増えたlabelは以前の行がNaNになる """
+        archive = ColumnarArchive(self.path_)
+        archive.append(make_sample(0))
+        archive.append(make_sample(1, labels=("Battery Voltage", "Array Voltage")))
+        archive.append(make_sample(2, labels=("Array Voltage",)))
+        archive.close()
+
+        archive = ColumnarArchive(self.path_)
+        self.assertEqual(3, len(archive))
+        self.assertEqual(
+            ["Array Voltage", "Battery Voltage"], sorted(archive.get_labels()))
+
+        _, values = archive.read("Array Voltage")
+        self.assertTrue(math.isnan(values[0]))
+        self.assertEqual([13.0, 14.0], list(values[1:]))
+
+        _, values = archive.read("Battery Voltage")
+        self.assertEqual([12.0, 13.0], list(values[:2]))
+        self.assertTrue(math.isnan(values[2]))
+        archive.close()
+
+    def test_broken_tail(self):
+        """ 書き込み途中の行は再度開いた時に捨てられる """
+        archive = ColumnarArchive(self.path_)
+        for i in range(3):
+            archive.append(make_sample(i))
+        archive.close()
+
+        with open(os.path.join(self.path_, TIMESTAMP_FILE), "ab") as f:
+            f.write(b"\x00" * 5)
+
+        archive = ColumnarArchive(self.path_)
+        self.assertEqual(3, len(archive))
+        archive.append(make_sample(3))
+        _, values = archive.read("Battery Voltage")
+        self.assertEqual([12.0, 13.0, 14.0, 15.0], list(values))
+        archive.close()
+
+    def test_older_timestamp(self):
+        """ 最終行より古いtimestampは追記できない """
+        archive = ColumnarArchive(self.path_)
+        archive.append(make_sample(1))
+        self.assertRaises(ValueError, archive.append, make_sample(0))
+        archive.close()
+
+    def test_event_handler(self):
+        """ event handlerとして追記する """
+        handler = ArchiveEventHandler(self.path_, q_max=10)
+        handler.start()
+        for i in range(5):
+            handler.put_q(make_sample(i))
+        handler.stop()
+        handler.join()
+
+        archive = ColumnarArchive(self.path_)
+        _, values = archive.read("Battery Voltage")
+        self.assertEqual([12.0, 13.0, 14.0, 15.0, 16.0], list(values))
+        archive.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -38,10 +38,30 @@ class TestArgParser(unittest.TestCase):
         parsed = argparser.init([])
 
         self.assertEqual("192.168.1.20", parsed.host_name)
+        self.assertEqual(80, parsed.port)
+        self.assertEqual(None, parsed.record_file)
+        self.assertEqual(None, parsed.replay_file)
+        self.assertEqual(1.0, parsed.replay_speed)
         self.assertEqual(None, parsed.xively_api_key)
         self.assertEqual(None, parsed.xively_feed_key)
         self.assertEqual(None, parsed.keenio_project_id)
         self.assertEqual(None, parsed.keenio_write_key)
+        self.assertEqual(1, parsed.keenio_batch_size)
+        self.assertEqual(60.0, parsed.keenio_flush_interval)
+        self.assertEqual(None, parsed.spool_dir)
+        self.assertEqual(10 * 1024 * 1024, parsed.spool_max_bytes)
+        self.assertEqual(None, parsed.sqlite_path)
+        self.assertEqual(1, parsed.sqlite_batch_size)
+        self.assertEqual(None, parsed.archive_dir)
+        self.assertEqual(None, parsed.metrics_port)
+        self.assertEqual("127.0.0.1", parsed.metrics_host)
+        self.assertEqual(None, parsed.profile_dir)
+        self.assertEqual(20, parsed.profile_top)
+        self.assertEqual(600.0, parsed.watchdog_interval)
+        self.assertFalse(parsed.watchdog_trace)
+        self.assertEqual(7.0, parsed.raw_retention_days)
+        self.assertEqual(90.0, parsed.minute_retention_days)
+        self.assertEqual(3600.0, parsed.compact_interval)
         self.assertEqual(None, parsed.twitter_consumer_key)
         self.assertEqual(None, parsed.twitter_consumer_secret)
         self.assertEqual(None, parsed.twitter_key)
@@ -52,9 +72,18 @@ class TestArgParser(unittest.TestCase):
         self.assertEqual(30.0, parsed.charge_current_high)
         self.assertEqual(14.0, parsed.battery_full_limit)
         self.assertEqual(300, parsed.interval)
+        self.assertFalse(parsed.immediate)
+        self.assertEqual("skip", parsed.overrun)
+        self.assertEqual(2, parsed.max_concurrent)
+        self.assertEqual(10.0, parsed.tick_interval)
         self.assertEqual(None, parsed.log_file)
         self.assertEqual(False, parsed.just_get_status)
         self.assertEqual(True, parsed.status_all)
+        self.assertEqual(False, parsed.non_blocking)
+        self.assertEqual("raise", parsed.queue_policy)
+        self.assertEqual(3.0, parsed.queue_timeout)
+        self.assertEqual(0, parsed.workers)
+        self.assertEqual("thread", parsed.engine)
         self.assertEqual(False, parsed.debug)
 
     def test_battery_limit(self):
@@ -87,6 +116,13 @@ class TestArgParser(unittest.TestCase):
         parsed = argparser.init(["--battery-full-limit", "20.0"])
         self.assertEqual(20.0, parsed.battery_full_limit)
 
+    def test_queue_policy(self):
+        parsed = argparser.init(["--queue-policy", "drop_oldest"])
+        self.assertEqual("drop_oldest", parsed.queue_policy)
+
+        with self.assertRaises(SystemExit):
+            argparser.init(["--queue-policy", "unknown"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -18,6 +18,7 @@
 import unittest
 from solar_monitor import argparser
 from solar_monitor import config
+from solar_monitor.event.aio import AsyncTriggerAdapter
 
 
 class TestConfig(unittest.TestCase):
@@ -41,6 +42,15 @@ class TestConfig(unittest.TestCase):
 
         triggers = config.init_triggers(**kwargs)
 
+    def test_asyncio_engine(self):
+        args = argparser.init(["--engine", "asyncio"])
+        kwargs = dict(args._get_kwargs())
+
+        triggers = config.init_triggers(**kwargs)
+
+        for trigger in triggers:
+            self.assertIsInstance(trigger, AsyncTriggerAdapter)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import asyncio
+import unittest
+from solar_monitor.event.aio import AsyncEventHandler
+from solar_monitor.event.aio import AsyncEventTrigger
+from solar_monitor.event.aio import AsyncTriggerAdapter
+from solar_monitor.event import base
+from solar_monitor.event.base import IBatchEventHandler
+from solar_monitor.event.base import IEventHandler
+from solar_monitor.event.base import IEventTrigger
+
+
+class CoroutineEventHandler(AsyncEventHandler):
+    def __init__(self, **kwargs):
+        AsyncEventHandler.__init__(self, **kwargs)
+        self.got_ = []
+
+    async def _run(self, data):
+        await asyncio.sleep(0)
+        self.got_.append(data)
+
+
+class FunctionEventHandler(AsyncEventHandler):
+    def __init__(self, **kwargs):
+        AsyncEventHandler.__init__(self, **kwargs)
+        self.got_ = []
+
+    def _run(self, data):
+        if data < 0:
+            raise IOError("dummy error")
+        self.got_.append(data)
+
+
+class EvenTrigger(AsyncEventTrigger):
+    def _is_condition(self, data):
+        return data % 2 == 0
+
+
+class TestAsyncEvent(unittest.TestCase):
+    """ asyncio版のevent trigger/handlerをテストする """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.loop_ = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop_.close()
+
+    def test_trigger_and_handlers(self):
+        """ 条件に一致したデータがcoroutine/通常関数の両handlerに渡される """
+        trigger = EvenTrigger(q_max=10)
+        handler1 = CoroutineEventHandler(q_max=10)
+        handler2 = FunctionEventHandler(q_max=10)
+        trigger.append(handler1)
+        trigger.append(handler2)
+
+        async def run():
+            await trigger.start()
+            for i in range(6):
+                trigger.put_q(i)
+            await trigger.join_q()
+            await trigger.stop()
+            await trigger.join()
+
+        self.loop_.run_until_complete(run())
+
+        self.assertEqual([0, 2, 4], handler1.got_)
+        self.assertEqual([0, 2, 4], handler2.got_)
+        self.assertEqual(6, trigger.get_status()["received"])
+        self.assertEqual(3, trigger.get_status()["handlers"][0]["processed"])
+
+    def test_handler_failed(self):
+        """ handlerで例外が発生してもtaskは継続する """
+        handler = FunctionEventHandler()
+
+        async def run():
+            await handler.start()
+            handler.put_q(-1)
+            handler.put_q(1)
+            await handler.stop()
+            await handler.join()
+
+        self.loop_.run_until_complete(run())
+
+        self.assertEqual([1], handler.got_)
+        self.assertEqual(1, handler.get_status()["failed"])
+        self.assertEqual(1, handler.get_status()["processed"])
+
+    def test_put_q_none(self):
+        """ 外部IFを使用してqueueにNoneをputするのは禁止 """
+        handler = FunctionEventHandler()
+
+        async def run():
+            await handler.start()
+            self.assertRaises(ValueError, handler.put_q, None)
+            await handler.stop()
+            await handler.join()
+
+        self.loop_.run_until_complete(run())
+
+    def test_adapter(self):
+        """ 既存のIEventTrigger/IEventHandlerをasyncio上で動作させる """
+        got = []
+
+        class TestTrigger(IEventTrigger):
+            def _is_condition(self, data):
+                return data > 0
+
+        class TestHandler(IEventHandler):
+            def _run(self, data):
+                got.append(data)
+
+        trigger = TestTrigger()
+        trigger.append(TestHandler())
+        adapter = AsyncTriggerAdapter(trigger)
+
+        async def run():
+            await adapter.start()
+            adapter.put_q(0)
+            adapter.put_q(1)
+            await adapter.stop()
+            await adapter.join()
+
+        self.loop_.run_until_complete(run())
+
+        self.assertEqual([1], got)
+        self.assertFalse(trigger.thread_.is_alive())
+
+    def test_adapter_lifecycle(self):
+        """ wrapしたhandlerの開始・停止・tick処理をasyncio上で実行する """
+        calls = []
+
+        class TestTrigger(IEventTrigger):
+            def _is_condition(self, data):
+                return True
+
+        class TestHandler(IBatchEventHandler):
+            def _on_start(self):
+                calls.append("start")
+
+            def _on_tick(self):
+                calls.append("tick")
+
+            def _run_batch(self, samples):
+                calls.append(list(samples))
+
+        trigger = TestTrigger()
+        trigger.append(TestHandler(batch_size=10))
+        adapter = AsyncTriggerAdapter(trigger)
+
+        async def run():
+            await adapter.start()
+            adapter.put_q(1)
+            await adapter.join_q()
+            self.assertTrue(adapter.tick())
+            await asyncio.sleep(0.1)
+            await adapter.stop()
+            await adapter.join()
+
+        self.loop_.run_until_complete(run())
+
+        self.assertEqual(["start", "tick", [1]], calls)
+
+    def test_handler_full(self):
+        """ 1つのhandlerのqueueが満杯でも、残りのhandlerにはデータを渡す """
+        class SlowEventHandler(AsyncEventHandler):
+            async def _run(self, data):
+                await asyncio.sleep(0.05)
+
+        trigger = EvenTrigger(q_max=10, is_blocking=False)
+        slow = SlowEventHandler(q_max=1)
+        handler = CoroutineEventHandler(q_max=10)
+        trigger.append(slow)
+        trigger.append(handler)
+
+        async def run():
+            await trigger.start()
+            for i in range(5):
+                trigger.put_q(i * 2)
+            await trigger.join_q()
+            await trigger.stop()
+            await trigger.join()
+
+        self.loop_.run_until_complete(run())
+
+        self.assertEqual([0, 2, 4, 6, 8], handler.got_)
+        self.assertEqual(0, trigger.get_status()["failed"])
+        self.assertLess(0, slow.get_status()["dropped"])
+
+    def test_q_policy(self):
+        """ queue policyをasyncio上でも適用し、adapterはwrapしたlistenerのpolicyを使う """
+        handler = CoroutineEventHandler(q_max=5, q_policy=base.Q_POLICY_COALESCE)
+        self.assertRaises(ValueError, CoroutineEventHandler, q_policy="unknown")
+
+        async def run():
+            await handler.start()
+            for i in range(3):
+                handler.put_q(i)
+            await handler.stop()
+            handler.put_q(3)
+            await handler.join()
+
+        self.loop_.run_until_complete(run())
+
+        self.assertEqual([2], handler.got_)
+        self.assertEqual(2, handler.get_status()["coalesced"])
+        self.assertEqual(1, handler.get_status()["dropped"])
+
+        class TestTrigger(IEventTrigger):
+            def _is_condition(self, data):
+                return True
+
+        trigger = TestTrigger(q_policy=base.Q_POLICY_BLOCK, q_timeout=0.1)
+        trigger.append(IEventHandler(q_max=2, q_policy=base.Q_POLICY_DROP_OLDEST))
+        adapter = AsyncTriggerAdapter(trigger)
+        self.assertEqual(base.Q_POLICY_BLOCK, adapter.q_policy_)
+        self.assertEqual(0.1, adapter.q_timeout_)
+        self.assertEqual(base.Q_POLICY_DROP_OLDEST, adapter.event_handlers_[0].q_policy_)
+
+        async def run_adapter():
+            await adapter.start()
+            for i in range(4):
+                adapter.event_handlers_[0].put_q(i)
+            self.assertEqual(2, adapter.event_handlers_[0].q_.qsize())
+            await adapter.stop()
+            await adapter.join()
+
+        self.loop_.run_until_complete(run_adapter())
+        self.assertEqual(2, adapter.event_handlers_[0].get_status()["dropped"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import threading
+import time
+import unittest
+from solar_monitor.event import base
+from solar_monitor.event.base import IEventHandler
+from solar_monitor.event.base import IEventTrigger
+from solar_monitor.event.dispatcher import Dispatcher
+from solar_monitor.event.dispatcher import is_worker_thread
+
+
+class RecordEventHandler(IEventHandler):
+    def __init__(self, **kwargs):
+        IEventHandler.__init__(self, **kwargs)
+        self.got_ = []
+        self.threads_ = set()
+
+    def _run(self, data):
+        self.got_.append(data)
+        self.threads_.add(threading.current_thread().name)
+
+
+class AlwaysTrigger(IEventTrigger):
+    def _is_condition(self, data):
+        return True
+
+
+class TestDispatcher(unittest.TestCase):
+    """ Dispatcherを使用したevent listenerの動作をテストする """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dispatcher_ = Dispatcher(workers=2)
+
+    def tearDown(self):
+        self.dispatcher_.stop()
+
+    def test_workers_zero(self):
+        """ workerが0の場合はValueError """
+        self.assertRaises(ValueError, Dispatcher, workers=0)
+
+    def test_no_own_thread(self):
+        """ Dispatcherを渡したlistenerは自身のthreadを持たない """
+        handler = RecordEventHandler(dispatcher=self.dispatcher_)
+        self.assertIsNone(handler.thread_)
+
+    def test_ordering(self):
+        """ 1つのlistenerに対するデータはputした順に処理される """
+        handler = RecordEventHandler(q_max=200, dispatcher=self.dispatcher_)
+        handler.start()
+
+        for i in range(100):
+            handler.put_q(i)
+
+        handler.stop()
+        handler.join()
+
+        self.assertEqual(list(range(100)), handler.got_)
+
+    def test_shared_threads(self):
+        """ 複数のtrigger/handlerが共有のworker threadで動作する """
+        threads_before = threading.active_count()
+
+        triggers = []
+        handlers = []
+        for _ in range(5):
+            trigger = AlwaysTrigger(q_max=20, dispatcher=self.dispatcher_)
+            for _ in range(3):
+                handler = RecordEventHandler(
+                    q_max=20, dispatcher=self.dispatcher_)
+                trigger.append(handler)
+                handlers.append(handler)
+            triggers.append(trigger)
+
+        for trigger in triggers:
+            trigger.start()
+
+        self.assertLessEqual(
+            threading.active_count() - threads_before, len(self.dispatcher_))
+
+        for i in range(10):
+            for trigger in triggers:
+                trigger.put_q(i)
+
+        for trigger in triggers:
+            trigger.stop()
+        for trigger in triggers:
+            trigger.join()
+
+        for handler in handlers:
+            self.assertEqual(list(range(10)), handler.got_)
+            for name in handler.threads_:
+                self.assertTrue(name.startswith("Dispatcher-"))
+
+    def test_many_handlers_one_worker(self):
+        """ 1つのworkerでも、worker上のtriggerから多数のhandlerへ配信できる """
+        dispatcher = Dispatcher(workers=1)
+        trigger = AlwaysTrigger(dispatcher=dispatcher)
+        handlers = [RecordEventHandler(dispatcher=dispatcher) for _ in range(100)]
+        for handler in handlers:
+            trigger.append(handler)
+
+        trigger.start()
+        for i in range(3):
+            trigger.put_q(i)
+            trigger.join_q()
+
+        trigger.stop()
+        trigger.join()
+        dispatcher.stop()
+
+        for handler in handlers:
+            self.assertEqual([0, 1, 2], handler.got_)
+
+    def test_block_on_worker(self):
+        """ worker上ではblock policyでも待たずに古いデータを捨てる """
+        dispatcher = Dispatcher(workers=1)
+        kwargs = {"q_policy": base.Q_POLICY_BLOCK, "q_timeout": 2, "dispatcher": dispatcher}
+        trigger = AlwaysTrigger(q_max=10, is_blocking=False, **kwargs)
+        handler = RecordEventHandler(q_max=1, **kwargs)
+        trigger.append(handler)
+        trigger.start()
+
+        started = time.monotonic()
+        for i in range(6):
+            trigger.put_q(i)
+        trigger.join_q()
+        elapsed = time.monotonic() - started
+
+        trigger.stop()
+        trigger.join()
+        dispatcher.stop()
+
+        self.assertLess(elapsed, 1)
+        self.assertEqual(5, handler.got_[-1])
+        self.assertEqual(6, len(handler.got_) + handler.get_status()["dropped"])
+        self.assertFalse(is_worker_thread())
+
+
+if __name__ == "__main__":
+    unittest.main()
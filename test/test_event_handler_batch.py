@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import threading
+import unittest
+from solar_monitor.event.base import IBatchEventHandler
+from solar_monitor.event.dispatcher import Dispatcher
+
+
+class RecordBatchEventHandler(IBatchEventHandler):
+    def __init__(self, **kwargs):
+        IBatchEventHandler.__init__(self, **kwargs)
+        self.batches_ = []
+        self.event_ = threading.Event()
+
+    def _run_batch(self, samples):
+        self.batches_.append(samples)
+        self.event_.set()
+
+
+class TestIBatchEventHandler(unittest.TestCase):
+    """ 親クラスのIEventHandlerで実施済みテスト以外をテストする """
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_batch_size(self):
+        """ batch_size個のデータが溜まったら_run_batchを1回コールする """
+        handler = RecordBatchEventHandler(
+            batch_size=3, batch_timeout=60, q_max=10)
+        handler.start()
+
+        for i in range(7):
+            handler.put_q(i)
+
+        handler.join_q()
+        handler.stop()
+        handler.join()
+
+        # 残りの1個はstop時に処理される
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], handler.batches_)
+        self.assertEqual(7, handler.get_status()["processed"])
+
+    def test_batch_failed(self):
+        """ _run_batchが失敗したデータは次回に再送し、batch_sizeを超えた分は破棄する """
+        failures = [IOError("dummy error")] * 3
+        batches = []
+
+        class FailingBatchEventHandler(IBatchEventHandler):
+            def _run_batch(self, samples):
+                if failures:
+                    raise failures.pop()
+                batches.append(samples)
+
+        handler = FailingBatchEventHandler(batch_size=2, batch_timeout=60, q_max=10)
+        handler.start()
+
+        for i in range(5):
+            handler.put_q(i)
+
+        handler.join_q()
+        handler.stop()
+        handler.join()
+
+        status = handler.get_status()
+        self.assertEqual([[3, 4]], batches)
+        self.assertEqual(3, status["failed"])
+        self.assertEqual(3, status["dropped"])
+        self.assertEqual(5, status["received"])
+
+    def test_tick_on_dispatcher(self):
+        """ dispatcher上ではtick()でbatch_timeout経過したデータを処理する """
+        dispatcher = Dispatcher(workers=1)
+        handler = RecordBatchEventHandler(
+            batch_size=10, batch_timeout=0.1, dispatcher=dispatcher)
+        handler.start()
+
+        handler.put_q(1)
+        handler.tick()
+        handler.join_q()
+        self.assertEqual([], handler.batches_)
+
+        threading.Event().wait(0.15)
+        self.assertTrue(handler.tick())
+        self.assertTrue(handler.event_.wait(1))
+        self.assertEqual([[1]], handler.batches_)
+        self.assertEqual(1, handler.get_status()["received"])
+
+        handler.stop()
+        handler.join()
+        dispatcher.stop()
+
+    def test_batch_timeout(self):
+        """ batch_timeout秒経過したら溜まったデータを処理する """
+        handler = RecordBatchEventHandler(batch_size=10, batch_timeout=0.1)
+        handler.start()
+
+        handler.put_q(1)
+        handler.put_q(2)
+
+        self.assertTrue(handler.event_.wait(1))
+        self.assertEqual([[1, 2]], handler.batches_)
+
+        handler.stop()
+        handler.join()
+
+        self.assertEqual([[1, 2]], handler.batches_)
+
+    def test_dispatcher(self):
+        """ Dispatcher上でもbatch_sizeと停止時の処理が行われる """
+        dispatcher = Dispatcher(workers=1)
+        handler = RecordBatchEventHandler(
+            batch_size=2, q_max=10, dispatcher=dispatcher)
+        handler.start()
+
+        for i in range(5):
+            handler.put_q(i)
+
+        handler.stop()
+        handler.join()
+        dispatcher.stop()
+
+        self.assertEqual([[0, 1], [2, 3], [4]], handler.batches_)
+
+
+if __name__ == "__main__":
+    unittest.main()
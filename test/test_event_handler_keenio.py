@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
 
+import os
+import shutil
+import tempfile
 import unittest
 from datetime import datetime
 from solar_monitor.event.handler import KeenIoEventHandler
+from solar_monitor.sample import Sample
 from unittest.mock import patch
 from unittest.mock import MagicMock
 
@@ -60,6 +64,98 @@ class TestKeenioEventHandler(unittest.TestCase):
             label = items.pop('label')
             self.assertEqual(set(data['data'][label].items()), set(items.items()))
 
+    @patch("solar_monitor.event.handler.KeenClient", autospec=True)
+    def test_post_batch_to_keenio(self, mocked_client):
+        """ batch_size分のデータを1回のadd_eventsで送信する """
+        client = MagicMock()
+        client.add_events = MagicMock(return_value=None)
+        mocked_client.return_value = client
+
+        keen_handler = KeenIoEventHandler(
+            project_id='dummy_project_id',
+            write_key='dummy_write_key',
+            batch_size=3,
+            q_max=10)
+
+        samples = []
+        for i in range(4):
+            data = {}
+            data['source'] = 'solar'
+            data['at'] = datetime(2016, 1, 1, 0, i)
+            data['data'] = {
+                'Array Current': {'group': 'Array', 'unit': 'A', 'value': float(i)},
+                'Array Voltage': {'group': 'Array', 'unit': 'V', 'value': 50.0}}
+            samples.append(data)
+
+        keen_handler.start()
+        for data in samples:
+            keen_handler.put_q(data)
+        keen_handler.join_q()
+        keen_handler.stop()
+        keen_handler.join()
+
+        # 3個で1回、残りの1個は停止時に送信される
+        self.assertEqual(2, client.add_events.call_count)
+
+        first, second = client.add_events.call_args_list
+        self.assertEqual(6, len(first[0][0]['offgrid']))
+        self.assertEqual(2, len(second[0][0]['offgrid']))
+        self.assertEqual(
+            {'2016-01-01T00:03:00Z'},
+            set(item['keen']['timestamp'] for item in second[0][0]['offgrid']))
+
+        # 共有されるデータは変更されない
+        for data in samples:
+            for datum in data['data'].values():
+                self.assertNotIn('keen', datum)
+
+    @patch("solar_monitor.event.handler.KeenClient", autospec=True)
+    def test_post_sample_to_keenio(self, mocked_client):
+        """ 読み取り専用のSampleからも送信データを作成できる """
+        client = MagicMock()
+        client.add_events = MagicMock(return_value=None)
+        mocked_client.return_value = client
+
+        keen_handler = KeenIoEventHandler(
+            project_id='dummy_project_id',
+            write_key='dummy_write_key')
+
+        sample = Sample('solar', datetime(2016, 1, 1), {
+            'Array Current': {'group': 'Array', 'unit': 'A', 'value': 1.0}})
+
+        keen_handler._run(sample)
+
+        self.assertEqual(
+            [{'group': 'Array', 'unit': 'A', 'value': 1.0,
+              'label': 'Array Current', 'source': 'solar',
+              'keen': {'timestamp': '2016-01-01T00:00:00Z'}}],
+            client.add_events.call_args[0][0]['offgrid'])
+
+    @patch("solar_monitor.event.handler.KeenClient", autospec=True)
+    def test_spool_while_unreachable(self, mocked_client):
+        """ 送信に失敗したデータはspoolに残り、次回まとめて送信する """
+        client = MagicMock()
+        client.add_events = MagicMock(side_effect=[IOError("dummy"), None, None])
+        mocked_client.return_value = client
+
+        spool_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, spool_dir)
+
+        keen_handler = KeenIoEventHandler(
+            project_id='dummy_project_id',
+            write_key='dummy_write_key',
+            spool_path=os.path.join(spool_dir, 'keenio.spool'))
+        keen_handler.sender_.backoff_.initial_ = 0
+
+        for i in range(2):
+            keen_handler._run(Sample('solar', datetime(2016, 1, 1, 0, i), {
+                'Array Current': {'group': 'Array', 'unit': 'A', 'value': float(i)}}))
+
+        self.assertEqual(3, client.add_events.call_count)
+        sent = [c[0][0]['offgrid'][0]['value'] for c in client.add_events.call_args_list]
+        self.assertEqual([0.0, 0.0, 1.0], sent)
+        self.assertEqual(0, len(keen_handler.sender_.spool_))
+
 
 if __name__ == "__main__":
     unittest.main()
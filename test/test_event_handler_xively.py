@@ -64,6 +64,77 @@ class TestXivelyEventHandler(unittest.TestCase):
         self.assertEqual(2, len(client.datastreams))
         client.update.assert_called_once_with()
 
+    @patch("solar_monitor.event.handler.xively.Datastream", autospec=True)
+    @patch("solar_monitor.event.handler.xively.XivelyAPIClient", autospec=True)
+    def test_post_changed_data_only(self, mocked_api_client, mocked_datastream):
+        """ datastreamは使い回され、値が変化したものだけ送信する """
+        client = MagicMock()
+        client.update = MagicMock(return_value=None)
+        api = MagicMock()
+        api.feeds.get = MagicMock(return_value=client)
+        mocked_api_client.return_value = api
+        mocked_datastream.side_effect = lambda **kwargs: MagicMock(**kwargs)
+
+        xively_handler = XivelyEventHandler(
+            api_key="dummy",
+            feed_key="dummy")
+
+        def make_data(current, voltage):
+            data = {}
+            data['source'] = 'solar'
+            data['at'] = datetime.now()
+            data['data'] = {
+                'Array Current': {'group': 'Array', 'unit': 'A', 'value': current},
+                'Array Voltage': {'group': 'Array', 'unit': 'V', 'value': voltage}}
+            return data
+
+        first = make_data(1.4, 53.41)
+        second = make_data(1.4, 53.41)
+        third = make_data(1.5, 53.41)
+
+        xively_handler._run(first)
+        self.assertEqual(2, mocked_datastream.call_count)
+        self.assertEqual(1, client.update.call_count)
+
+        # 値が変化していないため送信しない
+        xively_handler._run(second)
+        self.assertEqual(1, client.update.call_count)
+
+        # 変化したdatastreamのみ、既存objectを更新して送信する
+        xively_handler._run(third)
+        self.assertEqual(2, mocked_datastream.call_count)
+        self.assertEqual(2, client.update.call_count)
+        self.assertEqual(1, len(client.datastreams))
+        self.assertEqual(1.5, client.datastreams[0].current_value)
+        self.assertEqual(third["at"], client.datastreams[0].at)
+
+    @patch("solar_monitor.event.handler.xively.Datastream", autospec=True)
+    @patch("solar_monitor.event.handler.xively.XivelyAPIClient", autospec=True)
+    def test_resend_after_failure(self, mocked_api_client, mocked_datastream):
+        """ 送信に失敗した値は次回も送信対象になる """
+        client = MagicMock()
+        client.update = MagicMock(side_effect=[IOError("dummy"), None])
+        api = MagicMock()
+        api.feeds.get = MagicMock(return_value=client)
+        mocked_api_client.return_value = api
+        mocked_datastream.side_effect = lambda **kwargs: MagicMock(**kwargs)
+
+        xively_handler = XivelyEventHandler(
+            api_key="dummy",
+            feed_key="dummy")
+
+        data = {}
+        data['source'] = 'solar'
+        data['at'] = datetime.now()
+        data['data'] = {
+            'Array Current': {'group': 'Array', 'unit': 'A', 'value': 1.4}}
+
+        self.assertRaises(IOError, xively_handler._run, data)
+        xively_handler._run(data)
+
+        self.assertEqual(2, client.update.call_count)
+        self.assertEqual(1, len(client.datastreams))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
 
+import queue
 import unittest
+from solar_monitor.event import base
 from solar_monitor.event.base import IEventListener
 from threading import Event
 
@@ -157,6 +159,123 @@ class TestEventListener(unittest.TestCase):
         el.stop()
         el.join()
 
+    def test_get_status(self):
+        """ run_in_conditionの成功・失敗回数がget_statusで取得できる """
+        def run(x):
+            if x == 2:
+                raise IOError("dummy error")
+
+        el = IEventListener(is_condition=lambda x: True, run_in_condition=run)
+        el.start()
+        el.put_q(1)
+        el.put_q(2)
+        el.put_q(3)
+        el.join_q()
+        el.stop()
+        el.join()
+
+        status = el.get_status()
+        self.assertEqual(status["received"], 3)
+        self.assertEqual(status["processed"], 2)
+        self.assertEqual(status["failed"], 1)
+        self.assertEqual(status["queued"], 0)
+        self.assertEqual(status["wait"]["count"], 3)
+        self.assertEqual(status["run"]["count"], 3)
+        self.assertLessEqual(1, status["max_queued"])
+
+    def test_q_policy_unknown(self):
+        """ 未知のqueue policyはValueErrorとなる """
+        self.assertRaises(ValueError, IEventListener, q_policy="unknown")
+
+    def test_q_policy_raise(self):
+        """ raise policyではqueueが満杯の場合にqueue.Fullをraiseする """
+        el = IEventListener(q_max=1)
+        el.put_q(1)
+
+        self.assertRaises(queue.Full, el.put_q, 2)
+
+    def test_q_policy_block(self):
+        """ block policyではtimeoutまで待ち、満杯のままならdropする """
+        el = IEventListener(q_max=1, q_policy=base.Q_POLICY_BLOCK, q_timeout=0.1)
+        el.put_q(1)
+        el.put_q(2)
+
+        self.assertEqual(list(el.q_.queue), [1])
+        self.assertEqual(el.get_status()["dropped"], 1)
+
+    def test_q_policy_drop_oldest(self):
+        """ drop_oldest policyでは古いデータから捨てる """
+        el = IEventListener(q_max=2, q_policy=base.Q_POLICY_DROP_OLDEST)
+        for i in range(1, 5):
+            el.put_q(i)
+
+        self.assertEqual(list(el.q_.queue), [3, 4])
+        self.assertEqual(el.q_.unfinished_tasks, 2)
+        self.assertEqual(el.get_status()["dropped"], 2)
+
+    def test_q_policy_drop_newest(self):
+        """ drop_newest policyでは新しいデータを捨てる """
+        el = IEventListener(q_max=2, q_policy=base.Q_POLICY_DROP_NEWEST)
+        for i in range(1, 5):
+            el.put_q(i)
+
+        self.assertEqual(list(el.q_.queue), [1, 2])
+        self.assertEqual(el.get_status()["dropped"], 2)
+
+    def test_q_policy_coalesce(self):
+        """ coalesce policyでは最新のデータのみ残す """
+        el = IEventListener(q_max=5, q_policy=base.Q_POLICY_COALESCE)
+        for i in range(1, 5):
+            el.put_q(i)
+
+        self.assertEqual(list(el.q_.queue), [4])
+        self.assertEqual(el.q_.unfinished_tasks, 1)
+        self.assertEqual(el.get_status()["coalesced"], 3)
+        self.assertEqual(el.get_status()["dropped"], 0)
+
+    def test_stop_with_full_queue(self):
+        """ queueが満杯でもstopは捨てられず、put済みのデータを処理して停止する """
+        got = []
+        for policy in (base.Q_POLICY_COALESCE, base.Q_POLICY_DROP_OLDEST, base.Q_POLICY_RAISE):
+            el = IEventListener(
+                is_condition=lambda x: True, run_in_condition=got.append,
+                q_max=1, q_policy=policy)
+            el.put_q(1)
+            el.stop()
+            if policy != base.Q_POLICY_RAISE:
+                el.put_q(2)
+            el.start()
+            el.join()
+
+            self.assertFalse(el.thread_.is_alive())
+
+        self.assertEqual([2, 2, 1], got)
+
+    def test_tick_with_full_queue(self):
+        """ tickはqueueを使わず、データをdropもcoalesceもせずに実行される """
+        ticked = Event()
+        got = []
+        for policy in (base.Q_POLICY_COALESCE, base.Q_POLICY_DROP_OLDEST, base.Q_POLICY_RAISE):
+            el = IEventListener(
+                is_condition=lambda x: True, run_in_condition=got.append,
+                q_max=1, q_policy=policy)
+            el._on_tick = ticked.set
+            self.assertTrue(el.tick())
+            self.assertFalse(el.tick())
+            el.put_q(1)
+
+            self.assertEqual(list(el.q_.queue), [1])
+            self.assertEqual(el.get_status()["dropped"], 0)
+            self.assertEqual(el.get_status()["coalesced"], 0)
+
+            ticked.clear()
+            el.start()
+            self.assertTrue(ticked.wait(1))
+            el.stop()
+            el.join()
+
+        self.assertEqual([1, 1, 1], got)
+
 
 if __name__ == "__main__":
     unittest.main()
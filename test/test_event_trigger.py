@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding:utf-8 -*-
 
+import threading
 import unittest
 from solar_monitor.event.base import IEventTrigger
 from solar_monitor.event.base import IEventListener
+from solar_monitor.event.base import IEventHandler
 from unittest.mock import MagicMock
 
 
@@ -61,6 +63,69 @@ class TestEventTrigger(unittest.TestCase):
         self.assertEqual(handler2.stop.call_count, 1)
         self.assertEqual(handler2.join.call_count, 1)
 
+    def test_non_blocking(self):
+        """ is_blocking=Falseの場合、event handlerの処理完了を待たない """
+        handler = MagicMock(spec=IEventListener)
+
+        class TestTrigger(IEventTrigger):
+            def _is_condition(self, data):
+                return True
+
+        et = TestTrigger(is_blocking=False)
+        et.append(handler)
+        et._run_in_condition(1)
+
+        handler.put_q.assert_called_once_with(1)
+        self.assertEqual(handler.join_q.call_count, 0)
+
+        et = TestTrigger()
+        et.append(handler)
+        et._run_in_condition(1)
+
+        self.assertEqual(handler.join_q.call_count, 1)
+
+    def test_handler_full(self):
+        """ 最初のevent handlerのqueueが満杯でも、残りのevent handlerにはデータを渡す """
+        class TestTrigger(IEventTrigger):
+            def _is_condition(self, data):
+                return True
+
+        full = IEventHandler(q_max=1)
+        full.put_q(0)
+        handler = IEventHandler(q_max=1)
+
+        et = TestTrigger(is_blocking=False)
+        et.append(full)
+        et.append(handler)
+        et._run_in_condition(1)
+
+        self.assertEqual(1, full.get_status()["dropped"])
+        self.assertEqual(1, handler.get_status()["queued"])
+        self.assertEqual(0, handler.get_status()["dropped"])
+
+    def test_join_timeout(self):
+        """ triggerのjoinがtimeoutしてもevent handlerは停止される """
+        release = threading.Event()
+        handler = MagicMock(spec=IEventListener)
+
+        class TestTrigger(IEventTrigger):
+            def _is_condition(self, data):
+                release.wait(3)
+                return False
+
+        et = TestTrigger()
+        et.append(handler)
+        et.start()
+        et.put_q(1)
+        et.stop()
+        try:
+            self.assertRaises(SystemError, et.join, timeout=0.1)
+            self.assertEqual(handler.stop.call_count, 1)
+            self.assertEqual(handler.join.call_count, 1)
+        finally:
+            release.set()
+            et.thread_.join()
+
 
 if __name__ == "__main__":
     unittest.main()
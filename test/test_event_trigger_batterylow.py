@@ -5,6 +5,7 @@ import sys
 import unittest
 import datetime
 from solar_monitor.event.trigger import BatteryLowTrigger
+from solar_monitor.sample import Sample
 from unittest.mock import MagicMock
 
 
@@ -122,5 +123,18 @@ class TestBatteryLowTrigger(unittest.TestCase):
         self.assertEqual(second_data["at"], got_data["at"])
         self.assertEqual(second_data["data"]["Battery Voltage"]["value"], got_data["data"]["Battery Voltage"]["value"])
 
+    def test_low_voltage_with_sample(self):
+        """ Sampleを受け取った場合も同様に判定する """
+        batlow_trigger = BatteryLowTrigger(lowest_voltage=12.0)
+
+        def make_sample(voltage):
+            return Sample("solar", datetime.datetime.now(), {
+                "Charge Current": {"group": "Battery", "value": 1.0, "unit": "A"},
+                "Battery Voltage": {"group": "Battery", "value": voltage, "unit": "V"}})
+
+        self.assertFalse(batlow_trigger._is_condition(make_sample(12.5)))
+        self.assertTrue(batlow_trigger._is_condition(make_sample(11.9)))
+        self.assertFalse(batlow_trigger._is_condition(make_sample(11.8)))
+
 if __name__ == "__main__":
     unittest.main()
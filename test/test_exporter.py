@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import unittest
+import urllib.error
+import urllib.request
+from datetime import datetime
+from solar_monitor.event.handler import MetricsEventHandler
+from solar_monitor.exporter import MetricsExporter
+from solar_monitor.exporter import render
+from solar_monitor.sample import Sample
+from solar_monitor.stats import Histogram
+from solar_monitor.stats import Registry
+
+
+class Source(object):
+    def __init__(self):
+        self.run_ = Histogram((0.1,))
+        self.run_.observe(0.05)
+
+    def get_status(self):
+        return {
+            "received": 3, "queued": 1, "run": self.run_.get_snapshot(),
+            "name": "text", "handlers": []}
+
+
+def make_sample():
+    return Sample("solar", datetime(2016, 1, 1), {
+        "Battery Voltage": {"group": "Battery", "unit": "V", "value": 12.5},
+        "Load State": {"group": "Status", "unit": "", "value": "ON"}})
+
+
+class TestExporter(unittest.TestCase):
+    """test exporter module."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_render(self):
+        """ text形式でstage、source、最新データを出力する """
+        registry = Registry()
+        registry.observe("get_rawdata", 0.5)
+        registry.count("poll_errors")
+        source = Source()
+        registry.add_source(source, name="Handler \"1\"")
+
+        lines = render(registry.get_snapshot(), make_sample(), 5).splitlines()
+
+        self.assertIn("# TYPE solar_monitor_stage_seconds histogram", lines)
+        self.assertIn(
+            "solar_monitor_stage_seconds_bucket{stage=\"get_rawdata\",le=\"+Inf\"} 1", lines)
+        self.assertIn("solar_monitor_stage_seconds_sum{stage=\"get_rawdata\"} 0.5", lines)
+        self.assertIn("solar_monitor_stage_seconds_count{stage=\"get_rawdata\"} 1", lines)
+        self.assertIn("solar_monitor_poll_errors_total 1", lines)
+        self.assertIn(
+            "solar_monitor_received_total{source=\"Handler \\\"1\\\"\"} 3", lines)
+        self.assertIn("# TYPE solar_monitor_queued gauge", lines)
+        self.assertIn(
+            "solar_monitor_run_seconds_bucket{source=\"Handler \\\"1\\\"\",le=\"0.1\"} 1",
+            lines)
+        self.assertIn(
+            "solar_monitor_reading{label=\"Battery Voltage\",group=\"Battery\","
+            "unit=\"V\",source=\"solar\"} 12.5", lines)
+        self.assertIn("solar_monitor_threads 5", lines)
+        self.assertFalse([line for line in lines if "Load State" in line or "name" in line])
+
+    def test_event_handler(self):
+        """ event handlerとして最新データを/metricsで公開する """
+        handler = MetricsEventHandler(0)
+        handler.start()
+        handler.put_q(make_sample())
+        handler.join_q()
+
+        url = "http://127.0.0.1:{}".format(handler.exporter_.get_port())
+        try:
+            with urllib.request.urlopen(url + "/metrics") as res:
+                self.assertTrue(res.headers["Content-Type"].startswith("text/plain"))
+                body = res.read().decode()
+
+            with self.assertRaises(urllib.error.HTTPError):
+                urllib.request.urlopen(url + "/")
+        finally:
+            handler.stop()
+            handler.join()
+
+        self.assertIn("solar_monitor_reading{label=\"Battery Voltage\"", body)
+        self.assertIn("source=\"MetricsEventHandler", body)
+        self.assertIn("solar_monitor_threads ", body)
+
+    def test_bind_on_start(self):
+        """ portは作成時ではなくstart時にbindする """
+        exporter = MetricsExporter(0)
+        self.assertIsNone(exporter.get_port())
+        exporter.stop()
+
+        exporter.start()
+        try:
+            port = exporter.get_port()
+            self.assertLess(0, port)
+
+            # the same port can be given until started.
+            other = MetricsExporter(port)
+            self.assertRaises(OSError, other.start)
+        finally:
+            exporter.stop()
+        self.assertIsNone(exporter.get_port())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import math
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from solar_monitor.archive import ColumnarArchive
+from solar_monitor.archive import to_microseconds
+from solar_monitor.gorilla import BitReader
+from solar_monitor.gorilla import BitWriter
+from solar_monitor.gorilla import decode_block
+from solar_monitor.gorilla import encode_block
+from solar_monitor.sample import Sample
+
+
+class TestGorilla(unittest.TestCase):
+    """test gorilla encoding."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.random_ = random.Random(0)
+
+    def tearDown(self):
+        pass
+
+    def test_bits(self):
+        """ 書いたbitをそのまま読める """
+        writer = BitWriter()
+        writer.write(0b101, 3)
+        writer.write(0x1ff, 9)
+        writer.write(1, 1)
+        self.assertEqual(13, len(writer))
+
+        reader = BitReader(writer.to_bytes())
+        self.assertEqual(0b101, reader.read(3))
+        self.assertEqual(0x1ff, reader.read(9))
+        self.assertEqual(1, reader.read_bit())
+        self.assertEqual(0, reader.read(3))
+        self.assertRaises(ValueError, reader.read, 1)
+
+    def test_round_trip(self):
+        """ timestampと値を損失なく復元できる """
+        start = 1451606400 * 1000000
+        timestamps = []
+        values = []
+        for i in range(1000):
+            jitter = self.random_.choice((0, 0, 0, 1, -70, 300, -3000, 10 ** 6, 10 ** 12))
+            timestamps.append(start + 300000000 * i + jitter)
+            values.append(round(12.0 + self.random_.random(), 2))
+        timestamps.sort()
+        values[10:20] = [12.5] * 10
+        values[30] = float("nan")
+        values[31] = -0.0
+        values[32] = 1e300
+
+        got_timestamps, got_values = decode_block(encode_block(timestamps, values))
+        self.assertEqual(timestamps, got_timestamps)
+        self.assertTrue(math.isnan(got_values[30]))
+        got_values[30] = values[30] = 0.0
+        self.assertEqual(values, got_values)
+        self.assertEqual("-0.0", str(got_values[31]))
+
+    def test_compression(self):
+        """ 等間隔でゆっくり変化する値は小さくなる """
+        timestamps = [1451606400 * 1000000 + 300000000 * i for i in range(288)]
+        values = [12.0 + (i // 10) * 0.01 for i in range(288)]
+
+        data = encode_block(timestamps, values)
+        self.assertLess(len(data), 288 * 16 / 10)
+        self.assertEqual((timestamps, values), decode_block(data))
+
+    def test_long_block(self):
+        """ 長いblockも先頭から順に書いて読める """
+        timestamps = [300000000 * i for i in range(5000)]
+        values = [float(i % 7) for i in range(5000)]
+        self.assertEqual((timestamps, values), decode_block(encode_block(timestamps, values)))
+
+    def test_truncated(self):
+        """ 途中で切れたblockはエラー """
+        data = encode_block([1, 2, 3], [1.0, 2.0, 3.0])
+        self.assertRaises(ValueError, decode_block, data[:10])
+        self.assertRaises(ValueError, decode_block, data[:2])
+
+    def test_empty(self):
+        """ 空のblockも扱える """
+        self.assertEqual(([], []), decode_block(encode_block([], [])))
+        self.assertRaises(ValueError, encode_block, [1], [])
+
+    def test_archive(self):
+        """ archiveのcolumnを圧縮blockとして取り出せる """
+        path = tempfile.mkdtemp()
+        try:
+            archive = ColumnarArchive(os.path.join(path, "archive"))
+            start = datetime(2016, 1, 1)
+            for i in range(10):
+                archive.append(Sample("solar", start + timedelta(minutes=5 * i), {
+                    "Battery Voltage": {"group": "Battery", "unit": "V", "value": 12.0 + i}}))
+
+            blocks = archive.encode(
+                "Battery Voltage", start + timedelta(minutes=10), start + timedelta(minutes=20))
+            self.assertEqual(1, len(blocks))
+            timestamps, values = decode_block(blocks[0])
+            self.assertEqual([14.0, 15.0], values)
+            self.assertEqual(to_microseconds(start + timedelta(minutes=10)), timestamps[0])
+
+            blocks = archive.encode("Battery Voltage", block_size=4)
+            self.assertEqual([4, 4, 2], [len(decode_block(b)[1]) for b in blocks])
+            self.assertEqual([20.0, 21.0], decode_block(blocks[2])[1])
+            archive.close()
+        finally:
+            shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import os
+import pstats
+import shutil
+import signal
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from unittest import mock
+from solar_monitor import profiling
+from solar_monitor.event.base import IEventListener
+
+
+def busy_function():
+    return sum(range(1000))
+
+
+class TestProfiling(unittest.TestCase):
+    """test profiling module."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_sections_on_threads(self):
+        """ 複数threadのsectionをまとめてprofileする """
+        profiler = profiling.Profiler(is_process_wide=False)
+
+        def run():
+            with profiler.section():
+                busy_function()
+
+        run()
+        profiler.start()
+        # one by one, since only one cProfile can be enabled since Python 3.12.
+        for _ in range(3):
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+
+        stats = profiler.stop()
+        calls = [
+            value[1] for key, value in stats.stats.items()
+            if key[2] == "busy_function"]
+        self.assertEqual([3], calls)
+        self.assertIsNone(profiler.stop())
+
+    def test_another_profiler(self):
+        """ 他のprofilerが有効な場合はsectionをprofileせずに実行する """
+        class ActiveProfile(object):
+            def enable(self):
+                raise ValueError("Another profiling tool is already active")
+
+        profiler = profiling.Profiler(is_process_wide=False)
+        profiler.start()
+        with mock.patch("cProfile.Profile", ActiveProfile):
+            with profiler.section():
+                got = busy_function()
+
+        self.assertEqual(sum(range(1000)), got)
+        self.assertEqual(1, profiler.get_skipped())
+        self.assertIsNone(profiler.stop())
+
+    def test_process_wide(self):
+        """ process全体をprofileする場合は1つのprofilerだけを有効にする """
+        profiler = profiling.Profiler(is_process_wide=True)
+        profiler.start()
+        try:
+            busy_function()
+            with profiler.section():
+                busy_function()
+        finally:
+            stats = profiler.stop()
+
+        calls = [
+            value[1] for key, value in stats.stats.items()
+            if key[2] == "busy_function"]
+        self.assertEqual([2], calls)
+        self.assertIsNone(profiler.stop())
+
+    def test_toggle(self):
+        """ toggleで開始し、停止時にファイルへ書き出す """
+        profiler = profiling.Profiler()
+        self.assertIsNone(profiler.toggle(self.dir_))
+        self.assertTrue(profiler.is_enabled())
+
+        with profiler.section():
+            busy_function()
+
+        path = profiler.toggle(self.dir_)
+        self.assertFalse(profiler.is_enabled())
+        self.assertTrue(os.path.basename(path).startswith("profile-"))
+        pstats.Stats(path)
+
+    def test_listener_section(self):
+        """ listenerのthreadでの処理がprofileされる """
+        el = IEventListener(
+            is_condition=lambda x: True, run_in_condition=lambda x: busy_function())
+        el.start()
+        profiling.PROFILER.start()
+        try:
+            el.put_q(1)
+            el.join_q()
+        finally:
+            stats = profiling.PROFILER.stop()
+            el.stop()
+            el.join()
+
+        self.assertTrue(
+            [key for key in stats.stats if key[2] == "busy_function"])
+
+    def test_memory_tracer(self):
+        """ 1回目でtracemallocを開始し、2回目以降でtop Nを書き出す """
+        tracer = profiling.MemoryTracer(top=5)
+        is_tracing = tracemalloc.is_tracing()
+        try:
+            if not is_tracing:
+                self.assertIsNone(tracer.dump(self.dir_))
+
+            data = [bytearray(1000) for _ in range(100)]
+            path = tracer.dump(self.dir_)
+            data.append(bytearray(1000))
+            path2 = tracer.dump(self.dir_)
+        finally:
+            if not is_tracing:
+                tracemalloc.stop()
+
+        with open(path) as f:
+            self.assertTrue(f.readline().startswith("top 5 allocations"))
+        with open(path2) as f:
+            self.assertIn("differences from the previous dump", f.read())
+        del data
+
+    @unittest.skipUnless(hasattr(signal, "SIGUSR1"), "SIGUSR1 is not supported")
+    def test_install(self):
+        """ SIGUSR1でprofileを切り替える """
+        handlers = (signal.getsignal(signal.SIGUSR1), signal.getsignal(signal.SIGUSR2))
+        try:
+            profiling.install(self.dir_)
+            os.kill(os.getpid(), signal.SIGUSR1)
+            self.assertTrue(profiling.PROFILER.is_enabled())
+
+            with profiling.PROFILER.section():
+                busy_function()
+
+            os.kill(os.getpid(), signal.SIGUSR1)
+            self.assertFalse(profiling.PROFILER.is_enabled())
+            self.assertEqual(1, len(os.listdir(self.dir_)))
+        finally:
+            profiling.PROFILER.stop()
+            signal.signal(signal.SIGUSR1, handlers[0])
+            signal.signal(signal.SIGUSR2, handlers[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from solar_monitor.__main__ import replay_loop
+from solar_monitor.replay import Recorder
+from solar_monitor.replay import ReplaySource
+from solar_monitor.replay import read_records
+from solar_monitor.sample import Sample
+
+
+def make_sample(at, voltage, state="MPPT"):
+    data = {
+        "Battery Voltage": {"group": "Battery", "unit": "V", "value": voltage},
+        "Charge State": {"group": "Condition", "unit": "Numbers", "value": 5}}
+    if state is not None:
+        data["State"] = {"group": "Condition", "unit": "", "value": state}
+    return Sample("solar", at, data)
+
+
+class Trigger(object):
+    def __init__(self):
+        self.data = []
+
+    def put_q(self, data):
+        self.data.append(data)
+
+    def join_q(self):
+        pass
+
+
+class TestReplay(unittest.TestCase):
+    """test replay module."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "record.bin")
+        self.at = datetime(2016, 1, 1)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_record_and_read(self):
+        """ 記録したSampleを同じ値で読み出す """
+        recorder = Recorder(self.path)
+        for i in range(3):
+            recorder.write(make_sample(
+                self.at + timedelta(seconds=i), 12.5 + i, state=None))
+        recorder.write(make_sample(self.at + timedelta(seconds=3), 13.0))
+        recorder.close()
+
+        samples = list(read_records(self.path))
+
+        self.assertEqual(4, len(samples))
+        self.assertEqual(self.at, samples[0]["at"])
+        self.assertEqual("solar", samples[0]["source"])
+        self.assertEqual(14.5, samples[2]["data"]["Battery Voltage"]["value"])
+        self.assertEqual("V", samples[2]["data"]["Battery Voltage"]["unit"])
+        self.assertIs(int, type(samples[2]["data"]["Charge State"]["value"]))
+        self.assertEqual("MPPT", samples[3]["data"]["State"]["value"])
+        self.assertIs(samples[0].schema, samples[2].schema)
+        self.assertIs(make_sample(self.at, 1.0, state=None).schema, samples[0].schema)
+
+    def test_compact(self):
+        """ 数値だけのSampleはpackして記録する """
+        recorder = Recorder(self.path)
+        recorder.write(make_sample(self.at, 12.5, state=None))
+        size = os.path.getsize(self.path)
+        recorder.write(make_sample(self.at + timedelta(seconds=1), 12.6, state=None))
+        recorder.close()
+
+        # type, schema id, timestamp and 2 values
+        self.assertEqual(1 + 2 + 8 + 8 * 2, os.path.getsize(self.path) - size)
+
+    def test_append(self):
+        """ 追記したファイルも続けて読み出す """
+        for i in range(2):
+            recorder = Recorder(self.path)
+            recorder.write(make_sample(self.at + timedelta(seconds=i), 12.0 + i))
+            recorder.close()
+
+        samples = list(read_records(self.path))
+
+        self.assertEqual([12.0, 13.0], [
+            sample["data"]["Battery Voltage"]["value"] for sample in samples])
+
+    def test_broken(self):
+        """ 末尾の壊れたレコードは無視し、記録ファイル以外はエラー """
+        recorder = Recorder(self.path)
+        for i in range(2):
+            recorder.write(make_sample(self.at + timedelta(seconds=i), 12.0, state=None))
+        recorder.close()
+
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+
+        self.assertEqual(1, len(list(read_records(self.path))))
+
+        with open(self.path, "wb") as f:
+            f.write(b"not recorded")
+
+        with self.assertRaises(ValueError):
+            list(read_records(self.path))
+
+    def test_append_after_broken(self):
+        """ 末尾の壊れたレコードは追記前に切り詰め、追記したデータを読み出す """
+        for state in (None, "MPPT"):
+            recorder = Recorder(self.path)
+            for i in range(2):
+                recorder.write(make_sample(self.at + timedelta(seconds=i), 12.0 + i, state))
+            recorder.close()
+
+            size = os.path.getsize(self.path)
+            with open(self.path, "r+b") as f:
+                f.truncate(size - 3)
+
+            recorder = Recorder(self.path)
+            recorder.write(make_sample(self.at + timedelta(seconds=2), 14.0, state))
+            recorder.close()
+
+            samples = list(read_records(self.path))
+            self.assertEqual([12.0, 14.0], [
+                sample["data"]["Battery Voltage"]["value"] for sample in samples])
+            self.assertEqual(state, samples[-1]["data"].get("State", {}).get("value"))
+            os.remove(self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(b"not recorded")
+        self.assertRaises(ValueError, Recorder, self.path)
+
+    def test_replay_speed(self):
+        """ 記録時の間隔をspeed倍で再生し、0なら待たない """
+        recorder = Recorder(self.path)
+        for i in range(3):
+            recorder.write(make_sample(self.at + timedelta(seconds=i), 12.0))
+        recorder.close()
+
+        started = time.monotonic()
+        self.assertEqual(3, len(list(ReplaySource(self.path, speed=10.0))))
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+        started = time.monotonic()
+        self.assertEqual(3, len(list(ReplaySource(self.path, speed=0))))
+        self.assertLess(time.monotonic() - started, 0.1)
+
+        with self.assertRaises(ValueError):
+            ReplaySource(self.path, speed=-1)
+
+    def test_replay_loop(self):
+        """ 記録したデータをtriggerに渡す """
+        recorder = Recorder(self.path)
+        for i in range(5):
+            recorder.write(make_sample(self.at + timedelta(seconds=i), 12.0 + i))
+        recorder.close()
+
+        trigger = Trigger()
+        replayed = replay_loop(
+            ReplaySource(self.path, speed=0), triggers=[trigger])
+
+        self.assertEqual(5, replayed)
+        self.assertEqual(
+            [self.at + timedelta(seconds=i) for i in range(5)],
+            [data["at"] for data in trigger.data])
+
+
+if __name__ == "__main__":
+    unittest.main()
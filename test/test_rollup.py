@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from solar_monitor.event.handler import RollupEventHandler
+from solar_monitor.rollup import Rollup
+from solar_monitor.sample import Sample
+from solar_monitor.store import SqliteStore
+
+
+def make_sample(at, value):
+    return Sample("solar", at, {
+        "Battery Voltage": {"group": "Battery", "unit": "V", "value": value}})
+
+
+class TestRollup(unittest.TestCase):
+    """test Rollup class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_finished_bucket(self):
+        """ 次のbucketのsampleが来た時に終了したbucketのみ返す """
+        rollup = Rollup((60, 3600))
+        start = datetime(2016, 1, 1)
+
+        for i, value in enumerate((12.0, 14.0, 10.0)):
+            self.assertEqual(
+                [], rollup.update(make_sample(start + timedelta(seconds=20 * i), value)))
+
+        finished = rollup.update(make_sample(start + timedelta(minutes=1), 11.0))
+        self.assertEqual(1, len(finished))
+
+        resolution, label, bucket = finished[0]
+        self.assertEqual((60, "Battery Voltage"), (resolution, label))
+        self.assertEqual(start, bucket.start)
+        self.assertEqual((10.0, 14.0, 12.0, 3, 10.0),
+                         (bucket.min, bucket.max, bucket.mean, bucket.count, bucket.last))
+
+        finished = rollup.update(make_sample(start + timedelta(hours=1), 13.0))
+        self.assertEqual([(60, start + timedelta(minutes=1)), (3600, start)],
+                         sorted((r, b.start) for r, _, b in finished))
+        self.assertEqual(4, [b for r, _, b in finished if r == 3600][0].count)
+
+    def test_late_sample(self):
+        """ 終了したbucketのsampleは数えて捨てる """
+        rollup = Rollup((60,))
+        rollup.update(make_sample(datetime(2016, 1, 1, 0, 1), 12.0))
+        self.assertEqual([], rollup.update(make_sample(datetime(2016, 1, 1), 11.0)))
+        self.assertEqual(1, rollup.get_late())
+
+    def test_resolution(self):
+        """ 1日に揃わない幅はエラー """
+        self.assertRaises(ValueError, Rollup, (7,))
+        self.assertRaises(ValueError, Rollup, (0,))
+        Rollup((300, 86400 * 7))
+
+    def test_event_handler(self):
+        """ event handlerとしてbucketをSQLiteに保存し、停止時に途中のbucketも保存する """
+        path = os.path.join(self.dir_, "solar.db")
+        handler = RollupEventHandler(path, resolutions=(60,), q_max=10)
+        handler.start()
+        for i in range(6):
+            handler.put_q(make_sample(datetime(2016, 1, 1) + timedelta(seconds=30 * i), i))
+        handler.stop()
+        handler.join()
+
+        store = SqliteStore(path)
+        got = store.query_rollups(
+            60, "Battery Voltage", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual(
+            [(datetime(2016, 1, 1, 0, 0), 0, 1, 0.5, 2, 1),
+             (datetime(2016, 1, 1, 0, 1), 2, 3, 2.5, 2, 3),
+             (datetime(2016, 1, 1, 0, 2), 4, 5, 4.5, 2, 5)],
+            got)
+        store.close()
+
+    def test_event_handler_restart(self):
+        """ 再起動の前後に分かれたbucketは上書きせずにマージする """
+        path = os.path.join(self.dir_, "solar.db")
+        start = datetime(2016, 1, 1)
+
+        for values in ((4.0, 6.0), (2.0, 3.0)):
+            handler = RollupEventHandler(path, resolutions=(60,), q_max=10)
+            handler.start()
+            for value in values:
+                start += timedelta(seconds=10)
+                handler.put_q(make_sample(start, value))
+            handler.stop()
+            handler.join()
+
+        store = SqliteStore(path)
+        got = store.query_rollups(
+            60, "Battery Voltage", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual(
+            [(datetime(2016, 1, 1, 0, 0), 2.0, 6.0, 3.75, 4, 3.0)], got)
+        store.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import unittest
+from datetime import datetime
+from solar_monitor.sample import FieldRef
+from solar_monitor.sample import Sample
+from solar_monitor.sample import Schema
+
+
+class TestSample(unittest.TestCase):
+    """test Sample class."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.got_data_ = {
+            'Array Current': {'group': 'Array', 'unit': 'A', 'value': 1.4},
+            'Battery Voltage': {'group': 'Battery', 'unit': 'V', 'value': 12.1}}
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_access_like_dict(self):
+        """ driverのdictと同じ形でアクセスできる """
+        at = datetime(2016, 1, 1)
+        sample = Sample("solar", at, self.got_data_)
+
+        self.assertEqual("solar", sample["source"])
+        self.assertEqual(at, sample["at"])
+        self.assertEqual(12.1, sample["data"]["Battery Voltage"]["value"])
+        self.assertEqual("V", sample["data"]["Battery Voltage"]["unit"])
+        self.assertEqual("Battery", sample["data"]["Battery Voltage"]["group"])
+        self.assertEqual(self.got_data_, dict(
+            (label, dict(field)) for label, field in sample["data"].items()))
+        self.assertRaises(KeyError, sample.__getitem__, "unknown")
+
+    def test_read_only(self):
+        """ 作成後は変更できない """
+        sample = Sample("solar", datetime(2016, 1, 1), self.got_data_)
+        field = sample["data"]["Battery Voltage"]
+
+        self.assertRaises(AttributeError, setattr, sample, "source", "wind")
+        self.assertRaises(AttributeError, setattr, field, "value", 0.0)
+        self.assertRaises(AttributeError, setattr, sample, "other", 0)
+
+        def assign():
+            sample["data"]["label"] = None
+
+        self.assertRaises(TypeError, assign)
+
+    def test_independent_of_source_dict(self):
+        """ 元のdictを変更してもSampleは影響を受けない """
+        got_data = {'Battery Voltage': {'group': 'Battery', 'unit': 'V', 'value': 12.1}}
+        sample = Sample("solar", datetime(2016, 1, 1), got_data)
+
+        got_data['Battery Voltage']['value'] = 0.0
+        got_data['Array Current'] = {'group': 'Array', 'unit': 'A', 'value': 1.4}
+
+        self.assertEqual(12.1, sample["data"]["Battery Voltage"]["value"])
+        self.assertNotIn('Array Current', sample["data"])
+
+    def test_to_dict(self):
+        """ to_dict()は変更可能な新しいdictを返す """
+        at = datetime(2016, 1, 1)
+        sample = Sample("solar", at, self.got_data_)
+
+        data = sample.to_dict()
+        data["data"]["Battery Voltage"]["label"] = "Battery Voltage"
+
+        self.assertEqual("solar", data["source"])
+        self.assertEqual(at, data["at"])
+        self.assertNotIn("label", sample["data"]["Battery Voltage"])
+
+    def test_schema_interned(self):
+        """ 同じlabel/unit/groupのSampleはSchemaを共有し、値のみ保持する """
+        first = Sample("solar", datetime(2016, 1, 1), self.got_data_)
+        second = Sample("solar", datetime(2016, 1, 2), {
+            'Array Current': {'group': 'Array', 'unit': 'A', 'value': 2.0},
+            'Battery Voltage': {'group': 'Battery', 'unit': 'V', 'value': 13.0}})
+
+        self.assertIs(first.schema, second.schema)
+        self.assertEqual((2.0, 13.0), second.values)
+        self.assertFalse(hasattr(second, "__dict__"))
+
+        other = Sample("solar", datetime(2016, 1, 1), {
+            'Battery Voltage': {'group': 'Battery', 'unit': 'mV', 'value': 12100}})
+        self.assertIsNot(first.schema, other.schema)
+
+    def test_from_values(self):
+        """ Schemaと値のtupleからSampleを作成できる """
+        schema = Schema.intern(self.got_data_)
+        sample = Sample.from_values("solar", datetime(2016, 1, 1), schema, [3.0, 14.0])
+
+        self.assertEqual(14.0, sample["data"]["Battery Voltage"]["value"])
+        self.assertEqual("A", sample["data"]["Array Current"]["unit"])
+        self.assertRaises(
+            ValueError, Sample.from_values, "solar", datetime(2016, 1, 1), schema, [1.0])
+
+    def test_field_ref(self):
+        """ FieldRefはSampleとdictのどちらからも値を取得できる """
+        ref = FieldRef("Battery Voltage")
+        sample = Sample("solar", datetime(2016, 1, 1), self.got_data_)
+        data = {"data": self.got_data_}
+
+        self.assertEqual(12.1, ref.value(sample))
+        self.assertEqual("V", ref.unit(sample))
+        self.assertEqual(12.1, ref.value(data))
+        self.assertEqual("V", ref.unit(data))
+
+        # Schemaが変わった場合はslotを解決し直す
+        other = Sample("solar", datetime(2016, 1, 1), {
+            'Battery Voltage': {'group': 'Battery', 'unit': 'V', 'value': 11.0}})
+        self.assertEqual(11.0, ref.value(other))
+        self.assertEqual(12.1, ref.value(sample))
+
+        self.assertRaises(KeyError, FieldRef("unknown").value, sample)
+
+
+if __name__ == "__main__":
+    unittest.main()
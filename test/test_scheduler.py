@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import threading
+import time
+import unittest
+from solar_monitor.scheduler import Scheduler
+
+
+def wait_until(predicate, timeout=3):
+    """ Wait until the predicate is true instead of sleeping exact time. """
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+class TestScheduler(unittest.TestCase):
+    """test Scheduler class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.scheduler_ = Scheduler()
+        self.scheduler_.start()
+
+    def tearDown(self):
+        self.scheduler_.stop()
+        self.scheduler_.join()
+
+    def test_periodic_jobs(self):
+        """ 複数のjobを1つのthreadでそれぞれの間隔で実行する """
+        calls = {"fast": [], "slow": []}
+        threads = set()
+
+        def record(name):
+            calls[name].append(time.monotonic())
+            threads.add(threading.current_thread())
+
+        time_start = time.monotonic()
+        self.scheduler_.add(record, 0.05, delay=0, kwargs={"name": "fast"})
+        self.scheduler_.add(record, 0.2, kwargs={"name": "slow"})
+        self.assertTrue(wait_until(lambda: len(calls["slow"]) >= 2))
+
+        # fast runs at 0.0, 0.05, ..., 0.4 unless the runner is loaded.
+        self.assertLessEqual(5, len(calls["fast"]))
+        self.assertGreaterEqual(calls["slow"][0] - time_start, 0.2 - 0.01)
+        self.assertGreaterEqual(calls["slow"][1] - time_start, 0.4 - 0.01)
+        self.assertLess(calls["slow"][0] - time_start, 0.4)
+        self.assertEqual(1, len(threads))
+
+    def test_once(self):
+        """ 1回だけのjobは実行後に外れる """
+        event = threading.Event()
+        job = self.scheduler_.add_once(event.set, delay=0.05)
+        self.assertEqual(1, len(self.scheduler_.get_status()))
+
+        self.assertTrue(event.wait(1))
+        self.assertTrue(wait_until(lambda: not self.scheduler_.get_status()))
+        self.assertEqual(1, job.get_status()["executed"])
+
+    def test_cancel(self):
+        """ cancelしたjobは実行されない """
+        event = threading.Event()
+        job = self.scheduler_.add(event.set, 0.05)
+        self.scheduler_.cancel(job)
+
+        self.assertFalse(event.wait(0.15))
+        self.assertEqual([], self.scheduler_.get_status())
+
+    def test_jitter(self):
+        """ jitterの範囲で実行時刻がずれる """
+        calls = []
+        time_start = time.monotonic()
+        self.scheduler_.add(lambda: calls.append(time.monotonic()), 0.1, jitter=0.05)
+        self.assertTrue(wait_until(lambda: len(calls) >= 3))
+
+        # never before the deadline, and the jitter doesn't add up.
+        for i, t in enumerate(calls[:3]):
+            self.assertGreaterEqual(t - time_start, (i + 1) * 0.1)
+            self.assertLess(t - time_start, (i + 1) * 0.1 + 0.05 + 0.09)
+
+    def test_timeout_and_skip(self):
+        """ timeoutを超えた実行を数え、逃した周期は飛ばす """
+        def slow():
+            time.sleep(0.25)
+
+        # run at 0.0 and 0.3, skip 0.1, 0.2, 0.4 and 0.5.
+        job = self.scheduler_.add(slow, 0.1, delay=0, timeout=0.2, name="slow")
+        self.assertTrue(wait_until(lambda: job.get_status()["timeouts"] >= 2))
+        self.scheduler_.cancel(job)
+
+        # every run is over the timeout, and at least 0.1 and 0.2 are skipped.
+        status = job.get_status()
+        self.assertEqual("slow", status["name"])
+        self.assertLessEqual(2, status["executed"])
+        self.assertEqual(status["executed"], status["timeouts"])
+        self.assertLessEqual(2, status["skipped"])
+        self.assertLess(0.2, status["duration"]["max"])
+
+    def test_failed(self):
+        """ 例外を出すjobも実行を続ける """
+        def fail():
+            raise RuntimeError("test")
+
+        job = self.scheduler_.add(fail, 0.05, delay=0)
+        self.assertTrue(wait_until(lambda: job.get_status()["failed"] >= 3))
+
+        self.assertEqual(0, job.get_status()["executed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
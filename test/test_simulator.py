@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import socket
+import unittest
+import urllib.error
+import urllib.request
+from solar_monitor.simulator import ChargeController
+from solar_monitor.simulator import Simulator
+from solar_monitor.simulator import start_simulators
+from tsmppt60_driver import SystemStatus
+from tsmppt60_driver.hal import RegisterValue
+
+NOON = 86400 * 100 + 43200
+MIDNIGHT = 86400 * 100
+
+
+class TestSimulator(unittest.TestCase):
+    """test simulator module."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.simulators = []
+
+    def tearDown(self):
+        for simulator in self.simulators:
+            simulator.stop()
+
+    def test_controller(self):
+        """ 昼は発電し、夜は発電しない """
+        controller = ChargeController(seed=0)
+
+        noon = controller.get_status(NOON)
+        midnight = controller.get_status(MIDNIGHT)
+
+        self.assertEqual(1.0, controller.get_sun(NOON))
+        self.assertEqual(0.0, controller.get_sun(MIDNIGHT))
+        self.assertGreater(noon["Array Current"], 3.9)
+        self.assertGreater(noon["Battery Voltage"], midnight["Battery Voltage"])
+        self.assertEqual(0.0, midnight["Output Power"])
+        self.assertEqual(5, noon["Charge State"])
+        self.assertEqual(3, midnight["Charge State"])
+
+    def test_response(self):
+        """ レジスタ値を上位/下位バイトに分けてCSVで返す """
+        simulator = Simulator(seed=0)
+
+        scaling = RegisterValue.new(simulator.get_response(
+            {"ID": "1", "F": "4", "AHI": "0", "ALO": "0", "RHI": "0", "RLO": "2"}))
+        self.assertEqual([0, 78, 3, 166], scaling.values)
+
+        amp_hours = RegisterValue.new(simulator.get_response(
+            {"ID": "1", "F": "4", "AHI": "0", "ALO": "52", "RHI": "0", "RLO": "2"},
+            now=NOON))
+        self.assertEqual(1, amp_hours.mb_id)
+        self.assertEqual(4, amp_hours.field)
+        self.assertEqual(4, len(amp_hours.values))
+
+    def test_system_status(self):
+        """ tsmppt60_driverから実機と同じように値を取得できる """
+        self.simulators = start_simulators(2, seed=0)
+
+        ports = [simulator.get_port() for simulator in self.simulators]
+        self.assertEqual(2, len(set(ports)))
+
+        for port in ports:
+            status = SystemStatus("127.0.0.1", port=port).get(False)
+
+            self.assertEqual(15, len(status))
+            self.assertAlmostEqual(
+                28.56, status["Target Voltage"]["value"], delta=0.01)
+            self.assertEqual("V", status["Battery Voltage"]["unit"])
+            self.assertGreater(status["Battery Voltage"]["value"], 20.0)
+
+    def test_malformed(self):
+        """ 壊れたCSVを返す """
+        simulator = Simulator(malformed_rate=1.0, seed=0)
+        simulator.start()
+        self.simulators.append(simulator)
+
+        with self.assertRaises(ValueError):
+            SystemStatus("127.0.0.1", port=simulator.get_port())
+
+        self.assertEqual(1, simulator.get_status()["malformed"])
+
+    def test_timeout(self):
+        """ 応答せずにタイムアウトさせる """
+        simulator = Simulator(timeout_rate=1.0, hang=1.0, seed=0)
+        simulator.start()
+        self.simulators.append(simulator)
+
+        url = "http://127.0.0.1:{}/MBCSV.cgi?ID=1&F=4&AHI=0&ALO=0&RHI=0&RLO=2".format(
+            simulator.get_port())
+
+        with self.assertRaises((socket.timeout, urllib.error.URLError)):
+            urllib.request.urlopen(url, timeout=0.1)
+
+        self.assertEqual(1, simulator.get_status()["timeouts"])
+
+    def test_not_found(self):
+        """ CGI以外は404を返す """
+        simulator = Simulator(seed=0)
+        simulator.start()
+        self.simulators.append(simulator)
+
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            urllib.request.urlopen(
+                "http://127.0.0.1:{}/".format(simulator.get_port()), timeout=1)
+
+        self.assertEqual(404, cm.exception.code)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler
+from http.server import HTTPServer
+from datetime import datetime
+from solar_monitor.spool import Backoff
+from solar_monitor.spool import Spool
+from solar_monitor.spool import SpoolSender
+from solar_monitor.spool import parse_isoformat
+from unittest import mock
+
+
+class StandInServer(HTTPServer):
+    """ Local HTTP server to stand in for cloud service. """
+
+    def __init__(self):
+        HTTPServer.__init__(self, ("127.0.0.1", 0), StandInRequestHandler)
+        self.is_healthy_ = True
+        self.received_ = []
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+
+        if not self.server.is_healthy_:
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        self.server.received_.append(json.loads(body.decode("utf-8")))
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSpool(unittest.TestCase):
+    """test Spool and SpoolSender class."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server_ = StandInServer()
+        cls.thread_ = threading.Thread(target=cls.server_.serve_forever)
+        cls.thread_.start()
+        cls.url_ = "http://127.0.0.1:{}/events".format(cls.server_.server_port)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server_.shutdown()
+        cls.server_.server_close()
+        cls.thread_.join()
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.path_ = os.path.join(self.dir_, "test.spool")
+        self.server_.is_healthy_ = True
+        self.server_.received_ = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def send(self, key, payload):
+        req = urllib.request.Request(
+            self.url_,
+            data=json.dumps({"key": key, "payload": payload}).encode("utf-8"),
+            headers={"Content-Type": "application/json"})
+        urllib.request.urlopen(req, timeout=3).close()
+
+    def test_append_peek_commit(self):
+        """ appendした順にpeekでき、commitしたものは削除される """
+        spool = Spool(self.path_)
+
+        self.assertTrue(spool.append("a", [1]))
+        self.assertTrue(spool.append("b", {"x": 2}))
+        self.assertFalse(spool.append("a", [1]))
+
+        self.assertEqual(2, len(spool))
+        self.assertEqual([("a", [1]), ("b", {"x": 2})], spool.peek(10))
+
+        spool.commit(1)
+        self.assertEqual([("b", {"x": 2})], spool.peek(10))
+        self.assertNotIn("a", spool)
+
+        spool.commit(1)
+        self.assertEqual(0, len(spool))
+        self.assertEqual(0, os.path.getsize(self.path_))
+
+    def test_reload(self):
+        """ 再起動後も未配送のレコードが残り、壊れた末尾は切り捨てる """
+        spool = Spool(self.path_)
+        spool.append("a", 1)
+        spool.append("b", 2)
+        spool.append("c", 3)
+        spool.commit(1)
+
+        with open(self.path_, "ab") as f:
+            f.write(b'{"key": "d", "pay')
+
+        spool = Spool(self.path_)
+        self.assertEqual([("b", 2), ("c", 3)], spool.peek(10))
+
+        spool.append("d", 4)
+        self.assertEqual([("b", 2), ("c", 3), ("d", 4)], spool.peek(10))
+
+    def test_bounded(self):
+        """ 最大サイズを超えた場合は古いレコードから捨てる """
+        spool = Spool(self.path_, max_bytes=200)
+
+        for i in range(20):
+            spool.append(str(i), "x" * 10)
+
+        self.assertLessEqual(os.path.getsize(self.path_), 200)
+        self.assertLessEqual(spool.get_size(), 200)
+        self.assertEqual("19", spool.peek(100)[-1][0])
+        self.assertEqual(20, len(spool) + spool.get_dropped())
+
+    def test_crash_in_compaction(self):
+        """ compaction中にクラッシュしても未配送のレコードは失われない """
+        spool = Spool(self.path_, max_bytes=200)
+        for i in range(5):
+            spool.append(str(i), "x" * 10)
+        spool.commit(2)
+
+        replaced = []
+        replace = os.replace
+
+        def crash_at_second(src, dst):
+            if replaced:
+                raise OSError("crash")
+            replaced.append(dst)
+            replace(src, dst)
+
+        with mock.patch("os.replace", side_effect=crash_at_second):
+            self.assertRaises(OSError, spool._compact)
+
+        keys = [key for key, _ in Spool(self.path_).peek(10)]
+        self.assertEqual(["2", "3", "4"], keys[-3:])
+
+    def test_parse_isoformat(self):
+        """ isoformat()の文字列をdatetimeに戻す """
+        for at in (datetime(2016, 1, 1, 12, 34, 56), datetime(2016, 1, 1, 12, 34, 56, 789)):
+            self.assertEqual(at, parse_isoformat(at.isoformat()))
+
+    def test_backoff(self):
+        """ 失敗するごとに待ち時間が指数的に伸び、成功でリセットされる """
+        backoff = Backoff(initial=1, maximum=5, factor=2)
+
+        self.assertTrue(backoff.is_ready(0))
+        backoff.fail(0)
+        self.assertFalse(backoff.is_ready(0.5))
+        self.assertTrue(backoff.is_ready(1))
+        backoff.fail(1)
+        self.assertFalse(backoff.is_ready(2.5))
+        self.assertTrue(backoff.is_ready(3))
+        backoff.fail(3)
+        backoff.fail(3)
+        self.assertTrue(backoff.is_ready(8))
+        backoff.succeed()
+        self.assertTrue(backoff.is_ready(3))
+
+    def test_deliver_with_failing_server(self):
+        """ 配送先が落ちている間は保持し、復旧後にrate limitで配送する """
+        spool = Spool(self.path_)
+        sender = SpoolSender(
+            spool, self.send, rate=2, burst=2,
+            backoff=Backoff(initial=10, maximum=100))
+
+        self.server_.is_healthy_ = False
+        self.assertEqual(0, sender.put("a", 1))
+        self.assertEqual(1, len(spool))
+
+        # backoff中は配送しない
+        self.server_.is_healthy_ = True
+        self.assertEqual(0, sender.put("b", 2))
+        self.assertEqual(0, sender.put("c", 3))
+        self.assertEqual([], self.server_.received_)
+
+        # backoff後はburst分のみ配送し、残りは次の機会に配送する
+        now = sender.updated_at_ + 10
+        self.assertEqual(2, sender.deliver(now))
+        self.assertEqual(1, len(spool))
+        self.assertEqual(0, sender.deliver(now))
+        self.assertEqual(1, sender.deliver(now + 1))
+        self.assertEqual(0, len(spool))
+
+        self.assertEqual(
+            ["a", "b", "c"],
+            [received["key"] for received in self.server_.received_])
+
+
+if __name__ == "__main__":
+    unittest.main()
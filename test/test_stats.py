@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import gc
+import time
+import unittest
+from solar_monitor.stats import Histogram
+from solar_monitor.stats import Registry
+from solar_monitor.stats import TimedQueue
+from solar_monitor.stats import log_bounds
+
+
+class TestHistogram(unittest.TestCase):
+    """test Histogram class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_log_bounds(self):
+        """ 対数的に増える境界 """
+        self.assertEqual((1, 10, 100), log_bounds(start=1, factor=10, count=3))
+        self.assertEqual(21, len(log_bounds()))
+
+    def test_observe(self):
+        """ 値を境界で区切ったbucketに数える """
+        histogram = Histogram((0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        snapshot = histogram.get_snapshot()
+        self.assertEqual(4, snapshot["count"])
+        self.assertAlmostEqual(2.65, snapshot["sum"])
+        self.assertEqual(2.0, snapshot["max"])
+        self.assertEqual(
+            [(0.1, 2), (1.0, 1), (float("inf"), 1)], snapshot["buckets"])
+
+        histogram.reset()
+        self.assertEqual(0, histogram.get_snapshot()["count"])
+        self.assertEqual(None, histogram.get_snapshot()["max"])
+
+
+class Source(object):
+    def get_status(self):
+        return {"queued": 1}
+
+
+class TestTimedQueue(unittest.TestCase):
+    """test TimedQueue class."""
+
+    def test_wait(self):
+        """ queueで待った時間と最大の深さを記録する """
+        q = TimedQueue(5)
+        q.put(1)
+        q.put(2)
+        time.sleep(0.05)
+        self.assertEqual(1, q.get())
+        self.assertEqual(2, q.get_nowait())
+        q.put(3)
+
+        self.assertEqual([3], list(q.queue))
+        self.assertEqual(2, q.max_queued_)
+
+        snapshot = q.wait_.get_snapshot()
+        self.assertEqual(2, snapshot["count"])
+        self.assertLessEqual(0.05, snapshot["max"])
+
+
+class TestRegistry(unittest.TestCase):
+    """test Registry class."""
+
+    def test_measure(self):
+        """ stageの処理時間を例外時も含めて記録する """
+        registry = Registry()
+        with registry.measure("stage"):
+            time.sleep(0.01)
+
+        with self.assertRaises(IOError):
+            with registry.measure("stage"):
+                raise IOError("dummy")
+
+        registry.observe("other", 0.5)
+
+        stages = registry.get_snapshot()["stages"]
+        self.assertEqual(2, stages["stage"]["count"])
+        self.assertLessEqual(0.01, stages["stage"]["max"])
+        self.assertEqual(0.5, stages["other"]["sum"])
+
+    def test_sources(self):
+        """ 登録したobjectのstatusを取得でき、削除されたら外れる """
+        registry = Registry()
+        source1 = Source()
+        source2 = Source()
+        self.assertEqual("Source", registry.add_source(source1))
+        self.assertEqual("Source-2", registry.add_source(source2))
+        self.assertEqual("named", registry.add_source(source2, name="named"))
+
+        self.assertEqual(
+            {"Source": {"queued": 1}, "Source-2": {"queued": 1}, "named": {"queued": 1}},
+            registry.get_snapshot()["sources"])
+
+        del source2
+        gc.collect()
+        self.assertEqual(["Source"], list(registry.get_snapshot()["sources"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
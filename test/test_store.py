@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from datetime import timedelta
+from solar_monitor.event.handler import SqliteStoreEventHandler
+from solar_monitor.sample import Sample
+from solar_monitor.store import Compactor
+from solar_monitor.store import SqliteStore
+
+
+def make_samples(count, start=datetime(2016, 1, 1)):
+    samples = []
+    for i in range(count):
+        samples.append(Sample("solar", start + timedelta(minutes=5 * i), {
+            "Battery Voltage": {"group": "Battery", "unit": "V", "value": 12.0 + i},
+            "Array Current": {"group": "Array", "unit": "A", "value": float(i)}}))
+    return samples
+
+
+class TestSqliteStore(unittest.TestCase):
+    """test SqliteStore class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.path_ = os.path.join(self.dir_, "solar.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_insert_and_query(self):
+        """ 挿入したデータを時間範囲で取得できる """
+        store = SqliteStore(self.path_)
+        self.assertEqual(20, store.insert(make_samples(10)))
+
+        got = store.query(
+            "Battery Voltage", datetime(2016, 1, 1, 0, 10), datetime(2016, 1, 1, 0, 20))
+        self.assertEqual(
+            [(datetime(2016, 1, 1, 0, 10), 14.0), (datetime(2016, 1, 1, 0, 15), 15.0)],
+            got)
+        store.close()
+
+    def test_tables(self):
+        """ doc/database.umlのtable構造でWALモードとなる """
+        store = SqliteStore(self.path_, geo=(139.7, 35.6))
+        store.insert(make_samples(2))
+        store.insert(make_samples(1, start=datetime(2016, 1, 2)))
+        store.close()
+
+        conn = sqlite3.connect(self.path_)
+        self.assertEqual("wal", conn.execute("PRAGMA journal_mode").fetchone()[0])
+        self.assertEqual(6, conn.execute("SELECT COUNT(*) FROM data").fetchone()[0])
+        self.assertEqual(
+            [("Array",), ("Battery",)],
+            conn.execute("SELECT name FROM data_group ORDER BY name").fetchall())
+        self.assertEqual(
+            [("solar",)], conn.execute("SELECT name FROM source").fetchall())
+
+        rows = conn.execute(
+            "SELECT data.label, data_group.name, source.name, geo.latitude"
+            " FROM record"
+            " JOIN data ON record.data_ix = data.ix"
+            " JOIN data_group ON record.data_group_ix = data_group.ix"
+            " JOIN source ON record.source_ix = source.ix"
+            " JOIN geo ON record.geo_ix = geo.ix"
+            " WHERE data.label = 'Array Current'").fetchall()
+        self.assertEqual(3, len(rows))
+        self.assertEqual(("Array Current", "Array", "solar", 35.6), rows[0])
+
+        indexes = [row[1] for row in conn.execute("PRAGMA index_list(data)")]
+        self.assertIn("data_timestamp", indexes)
+        self.assertIn("data_label_timestamp", indexes)
+        conn.close()
+
+    def test_reopen(self):
+        """ 再度開いた後もixが重複しない """
+        store = SqliteStore(self.path_)
+        store.insert(make_samples(2))
+        store.close()
+
+        store = SqliteStore(self.path_)
+        store.insert(make_samples(2, start=datetime(2016, 1, 2)))
+        got = store.query("Array Current", datetime(2016, 1, 1), datetime(2016, 1, 3))
+        self.assertEqual(4, len(got))
+        store.close()
+
+    def test_merge_rollups_by_chunk(self):
+        """ rawデータを小さなchunkに分けて読んでも同じrollupになる """
+        store = SqliteStore(self.path_)
+        store.insert(make_samples(24, start=datetime(2016, 1, 1)))
+        rests = []
+
+        self.assertEqual(6, store.merge_rollups(
+            datetime(2016, 1, 1), datetime(2016, 1, 2), resolutions=(3600, 86400),
+            chunk_size=5, rest=rests.append))
+        self.assertEqual(9, len(rests))
+
+        got = store.query_rollups(
+            3600, "Battery Voltage", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual(
+            [(datetime(2016, 1, 1, 0), 12.0, 23.0, 17.5, 12, 23.0),
+             (datetime(2016, 1, 1, 1), 24.0, 35.0, 29.5, 12, 35.0)],
+            got)
+        got = store.query_rollups(
+            86400, "Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual([(datetime(2016, 1, 1), 0.0, 23.0, 11.5, 24, 23.0)], got)
+        store.close()
+
+    def test_event_handler(self):
+        """ event handlerとしてbatch単位で保存する """
+        handler = SqliteStoreEventHandler(self.path_, batch_size=3, q_max=10)
+        handler.start()
+        for sample in make_samples(5):
+            handler.put_q(sample)
+        handler.stop()
+        handler.join()
+
+        store = SqliteStore(self.path_)
+        got = store.query("Battery Voltage", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual([12.0, 13.0, 14.0, 15.0, 16.0], [value for _, value in got])
+        store.close()
+
+
+class TestCompactor(unittest.TestCase):
+    """test Compactor class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        self.dir_ = tempfile.mkdtemp()
+        self.path_ = os.path.join(self.dir_, "solar.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir_)
+
+    def test_run_once(self):
+        """ 保持期間を過ぎたrawデータはrollupへ統合して削除する """
+        store = SqliteStore(self.path_)
+        # 2 days of 5 minutes interval.
+        store.insert(make_samples(576, start=datetime(2016, 1, 1)))
+
+        compactor = Compactor(
+            self.path_, raw_retention=timedelta(days=7),
+            rollup_retentions={60: timedelta(days=30)},
+            chunk_size=100, duty=1)
+        ret = compactor.run_once(now=datetime(2016, 1, 9, 12))
+
+        # data of 2016/1/1 is compacted.
+        self.assertEqual(576, ret["deleted"])
+        self.assertEqual(
+            [], store.query("Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2)))
+        self.assertEqual(
+            288,
+            len(store.query("Array Current", datetime(2016, 1, 2), datetime(2016, 1, 3))))
+
+        got = store.query_rollups(
+            86400, "Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual(
+            [(datetime(2016, 1, 1), 0.0, 287.0, 143.5, 288, 287.0)], got)
+        self.assertEqual(24, len(store.query_rollups(
+            3600, "Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2))))
+
+        # 1 minute rollups older than 30 days are deleted.
+        ret = compactor.run_once(now=datetime(2016, 2, 1, 12))
+        self.assertEqual(
+            [], store.query_rollups(
+                60, "Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2)))
+        self.assertEqual(1, len(store.query_rollups(
+            86400, "Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2))))
+        self.assertEqual(0, ret["free"])
+        store.close()
+
+    def test_keep_complete_rollup(self):
+        """ sample数の少ないrawデータで既存のrollupを上書きしない """
+        store = SqliteStore(self.path_)
+        store.insert(make_samples(288, start=datetime(2016, 1, 1)))
+        compactor = Compactor(self.path_, raw_retention=timedelta(days=1), duty=1)
+        compactor.run_once(now=datetime(2016, 1, 3))
+
+        store.insert(make_samples(1, start=datetime(2016, 1, 1, 12)))
+        compactor.run_once(now=datetime(2016, 1, 3))
+
+        got = store.query_rollups(
+            86400, "Array Current", datetime(2016, 1, 1), datetime(2016, 1, 2))
+        self.assertEqual(288, got[0][4])
+        store.close()
+
+    def test_thread(self):
+        """ threadとして開始、停止できる """
+        compactor = Compactor(self.path_, interval=60)
+        compactor.start()
+        compactor.stop()
+        compactor.join()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,12 +6,23 @@
 import inspect
 import sys
 import threading
+import time
 import unittest
 
 from datetime import datetime
 from solar_monitor import timer
 
 
+def wait_until(predicate, timeout=3):
+    """ Wait until the predicate is true instead of sleeping exact time. """
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
 class MainLoop(object):
     def __init__(self, main_id="", max_count=0):
         self.main_id_ = main_id
@@ -149,5 +160,168 @@ class TestTimer(unittest.TestCase):
         self.assertFalse(rtimer.is_alive())
 
 
+class TestMonotonicTimer(unittest.TestCase):
+    """Test cases for MonotonicTimer class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_cancel_with_not_started(self):
+        mtimer = timer.MonotonicTimer(1, lambda: None)
+
+        with self.assertRaises(timer.NotStartedYetError):
+            mtimer.cancel()
+
+    def test_invalid_interval(self):
+        with self.assertRaises(ValueError):
+            timer.MonotonicTimer(0, lambda: None)
+
+    def test_fraction_interval(self):
+        """ 1秒未満の間隔でもずれずに実行される """
+        max_count = 10
+        main_loop = MainLoop(main_id="fraction", max_count=max_count)
+
+        interval_sec = 0.1
+        mtimer = timer.MonotonicTimer(interval_sec, main_loop.main)
+
+        time_start = time.monotonic()
+        mtimer.start()
+        res = main_loop.wait(max_count * interval_sec + 2)
+        elapsed = time.monotonic() - time_start
+        mtimer.cancel()
+
+        # never early, and late only by the load of the test runner.
+        self.assertTrue(res)
+        self.assertGreaterEqual(elapsed, max_count * interval_sec - 0.01)
+        self.assertLess(elapsed, max_count * interval_sec + 1)
+        self.assertFalse(mtimer.is_alive())
+
+    def test_immediate(self):
+        """ 開始直後に実行される """
+        main_loop = MainLoop(main_id="immediate", max_count=1)
+        mtimer = timer.MonotonicTimer(60, main_loop.main, is_immediate=True)
+
+        mtimer.start()
+        res = main_loop.wait(1)
+        mtimer.cancel()
+
+        self.assertTrue(res)
+
+    def test_fixed_rate(self):
+        """ 実行時間があっても開始時刻からの間隔を保つ """
+        times = []
+
+        def main(**kwargs):
+            times.append(time.monotonic())
+            time.sleep(0.05)
+
+        mtimer = timer.MonotonicTimer(0.1, main, is_immediate=True)
+        time_start = time.monotonic()
+        mtimer.start()
+        self.assertTrue(wait_until(lambda: len(times) >= 6))
+        mtimer.cancel()
+
+        # the deadlines are start + n * interval, so the lateness of a run
+        # doesn't add up to the following runs.
+        for i, t in enumerate(times[:6]):
+            self.assertGreaterEqual(t - time_start, i * 0.1 - 0.01)
+            self.assertLess(t - time_start, i * 0.1 + 0.09)
+
+    def test_overrun(self):
+        """ 間隔を超えた実行の後は次の周期に合わせる """
+        times = []
+
+        def main(**kwargs):
+            times.append(time.monotonic())
+            if len(times) == 1:
+                time.sleep(0.25)
+
+        mtimer = timer.MonotonicTimer(0.1, main, is_immediate=True)
+        time_start = time.monotonic()
+        mtimer.start()
+        self.assertTrue(wait_until(lambda: mtimer.get_status()["executed"] >= 3))
+        mtimer.cancel()
+
+        # not run at 0.25 when the first run ends, but on the deadline of 0.3.
+        self.assertGreaterEqual(times[1] - time_start, 0.3 - 0.01)
+        self.assertGreaterEqual(times[2] - times[1], 0.1 - 0.02)
+
+        status = mtimer.get_status()
+        self.assertEqual(len(times), status["executed"])
+        self.assertLessEqual(2, status["skipped"])
+        self.assertEqual(0, status["late"])
+        self.assertEqual(len(times), status["lateness"]["count"])
+
+    def test_overrun_catch_up(self):
+        """ catch_upでは逃した周期をまとめて実行する """
+        times = []
+
+        def main(**kwargs):
+            times.append(time.monotonic())
+            if len(times) == 1:
+                time.sleep(0.25)
+
+        mtimer = timer.MonotonicTimer(
+            0.1, main, is_immediate=True, overrun=timer.OVERRUN_CATCH_UP)
+        time_start = time.monotonic()
+        mtimer.start()
+        self.assertTrue(wait_until(lambda: mtimer.get_status()["executed"] >= 5))
+        mtimer.cancel()
+
+        # the deadlines of 0.1 and 0.2 run back to back when the first run ends.
+        self.assertGreaterEqual(times[1] - time_start, 0.25)
+        self.assertLess(times[2] - times[1], 0.05)
+        self.assertGreaterEqual(times[3] - time_start, 0.3 - 0.01)
+
+        status = mtimer.get_status()
+        self.assertEqual(len(times), status["executed"])
+        self.assertEqual(0, status["skipped"])
+        self.assertLessEqual(1, status["late"])
+
+    def test_overrun_concurrent(self):
+        """ concurrentでは最大数まで並行して実行し、超えた周期は飛ばす """
+        times = []
+        running = []
+        lock = threading.Lock()
+
+        def main(**kwargs):
+            with lock:
+                times.append(time.monotonic())
+                running.append(mtimer.get_status()["running"])
+            time.sleep(0.25)
+
+        mtimer = timer.MonotonicTimer(
+            0.1, main, is_immediate=True, overrun=timer.OVERRUN_CONCURRENT,
+            max_concurrent=2)
+        time_start = time.monotonic()
+        mtimer.start()
+        self.assertTrue(wait_until(lambda: len(times) >= 4))
+        mtimer.cancel()
+
+        # run at 0.0 and 0.1, skip 0.2, and run again after a run ends.
+        self.assertLessEqual(max(running), 2)
+        self.assertGreaterEqual(times[2] - time_start, 0.25)
+
+        status = mtimer.get_status()
+        self.assertEqual(len(times), status["executed"])
+        self.assertLessEqual(1, status["skipped"])
+        self.assertEqual(0, status["running"])
+
+    def test_invalid_overrun(self):
+        with self.assertRaises(ValueError):
+            timer.MonotonicTimer(1, lambda: None, overrun="wait")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+import os
+import threading
+import time
+import tracemalloc
+import unittest
+from unittest import mock
+from solar_monitor.exporter import render
+from solar_monitor.stats import Registry
+from solar_monitor.watchdog import MemoryWatchdog
+from solar_monitor.watchdog import get_package
+from solar_monitor.watchdog import get_peak_rss
+from solar_monitor.watchdog import get_rss
+from solar_monitor.watchdog import get_slope
+
+
+class Frame(object):
+    def __init__(self, filename):
+        self.filename = filename
+
+
+class TestMemoryWatchdog(unittest.TestCase):
+    """test MemoryWatchdog class."""
+
+    @classmethod
+    def setUpClass(cls):
+        pass
+
+    @classmethod
+    def tearDownClass(cls):
+        pass
+
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_get_rss(self):
+        """ 現在のRSSを取得できる """
+        self.assertLess(0, get_rss())
+        self.assertLess(0, get_peak_rss())
+
+    def test_get_package(self):
+        """ cloud clientのframeを含む確保はそのpackageに分類する """
+        traceback = [
+            Frame(os.sep + os.path.join("lib", "ssl.py")),
+            Frame(os.sep + os.path.join("site-packages", "tweepy", "api.py")),
+            Frame(os.sep + os.path.join("package", "solar_monitor", "event", "handler.py"))]
+        self.assertEqual("tweepy", get_package(traceback))
+        self.assertEqual("solar_monitor", get_package(traceback[2:]))
+        self.assertEqual("other", get_package(traceback[:1]))
+
+    def test_get_slope(self):
+        self.assertEqual(2.0, get_slope([(0, 1), (1, 3), (2, 5)]))
+        self.assertEqual(0.0, get_slope([(0, 1)]))
+
+    def test_rss_leak(self):
+        """ windowの間RSSが閾値以上増え続けるとleakを疑う """
+        watchdog = MemoryWatchdog(window=3, rss_threshold=3600)
+
+        self.assertEqual(set(), watchdog.check(now=0, rss=1000, sizes={}))
+        self.assertEqual(set(), watchdog.check(now=1, rss=1002, sizes={}))
+        self.assertEqual({"rss"}, watchdog.check(now=2, rss=1004, sizes={}))
+        self.assertEqual(7200, watchdog.get_status()["rss_growth_bytes_per_hour"])
+
+        self.assertEqual(set(), watchdog.check(now=3, rss=1004, sizes={}))
+        self.assertEqual(set(), watchdog.check(now=4, rss=1004, sizes={}))
+
+    def test_peak_rss(self):
+        """ 現在のRSSが分からない場合はpeakだけを出力し、増加を判定しない """
+        watchdog = MemoryWatchdog(window=2, rss_threshold=0)
+        with mock.patch("solar_monitor.watchdog.get_rss", return_value=None):
+            for i in range(3):
+                self.assertEqual(set(), watchdog.check(now=i, sizes={}))
+
+        status = watchdog.get_status()
+        self.assertEqual(0, status["rss_bytes"])
+        self.assertLess(0, status["rss_peak_bytes"])
+        self.assertEqual(0.0, status["rss_growth_bytes_per_hour"])
+
+    def test_package_leak(self):
+        """ packageのtrace量が毎回増え続けるとleakを疑う """
+        watchdog = MemoryWatchdog(window=3, package_threshold=100)
+
+        for i, size in enumerate((1000, 1100, 1200)):
+            suspected = watchdog.check(
+                now=i, rss=1000, sizes={"tweepy": size, "keen": 500, "other": size})
+        self.assertEqual({"tweepy"}, suspected)
+        self.assertEqual({"tweepy"}, watchdog.get_suspected())
+
+        status = watchdog.get_status()
+        self.assertEqual(1, status["suspected_leaks"])
+        self.assertEqual(1200, status["traced_bytes"]["tweepy"])
+        self.assertIn("gen0", status["gc_count"])
+
+        suspected = watchdog.check(now=3, rss=1000, sizes={"tweepy": 1200})
+        self.assertEqual(set(), suspected)
+
+    def test_tracing(self):
+        """ tracemallocでpackage毎のサイズを取得する """
+        is_tracing = tracemalloc.is_tracing()
+        watchdog = MemoryWatchdog(is_tracing=True, top=3)
+        try:
+            watchdog.check()
+            self.assertEqual({}, watchdog.get_status()["traced_growth_bytes"])
+            data = [bytearray(1000) for _ in range(100)]
+            watchdog.check()
+        finally:
+            if not is_tracing:
+                tracemalloc.stop()
+
+        status = watchdog.get_status()
+        self.assertIn("tweepy", status["traced_bytes"])
+        self.assertIn("other", status["traced_bytes"])
+        growth = status["traced_growth_bytes"]
+        self.assertLessEqual(1, len(growth))
+        self.assertGreaterEqual(3, len(growth))
+        self.assertLessEqual(100000, max(growth.values()))
+        del data
+
+    def test_thread(self):
+        """ 専用のthreadでintervalごとにcheckする """
+        watchdog = MemoryWatchdog(interval=0.05)
+        watchdog.start()
+        deadline = time.monotonic() + 3
+        while watchdog.get_status().get("checks", 0) < 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        watchdog.stop()
+        watchdog.join()
+
+        self.assertLessEqual(2, watchdog.get_status()["checks"])
+        self.assertNotIn(watchdog.thread_, threading.enumerate())
+        self.assertRaises(ValueError, MemoryWatchdog, interval=0)
+
+    def test_export(self):
+        """ metricsとして出力できる """
+        registry = Registry()
+        watchdog = MemoryWatchdog()
+        registry.add_source(watchdog)
+        watchdog.check(sizes={"tweepy": 10})
+
+        text = render(registry.get_snapshot())
+        self.assertIn("solar_monitor_rss_bytes{source=\"MemoryWatchdog\"}", text)
+        self.assertIn(
+            "solar_monitor_gc_count{source=\"MemoryWatchdog\",key=\"gen0\"}", text)
+        self.assertIn(
+            "solar_monitor_traced_bytes{source=\"MemoryWatchdog\",key=\"tweepy\"} 10", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+""" Compare size and speed of the encodings of the polled data. The data is
+read from the columnar archive if --archive-dir is given, otherwise generated
+like a battery voltage of 5 minutes interval.
+"""
+
+import argparse
+import csv
+import io
+import json
+import math
+import random
+import time
+
+from solar_monitor.archive import ColumnarArchive
+from solar_monitor.gorilla import decode_block
+from solar_monitor.gorilla import encode_block
+
+
+def generate(count, interval):
+    """ Generate timestamps in microseconds and voltages drifting by mV. """
+    start = 1451606400 * 1000000
+    timestamps = []
+    values = []
+    for i in range(count):
+        timestamps.append(start + interval * 1000000 * i + random.choice((0, 0, 0, 1000)))
+        hour = (i * interval / 3600.0) % 24
+        voltage = 12.4 + 1.6 * max(0.0, math.sin((hour - 6) / 12 * math.pi))
+        values.append(round(voltage + random.gauss(0, 0.005), 3))
+    return timestamps, values
+
+
+def encode_json(timestamps, values):
+    return "\n".join(
+        json.dumps({"timestamp": t, "value": v})
+        for t, v in zip(timestamps, values)).encode()
+
+
+def decode_json(data):
+    rows = [json.loads(line) for line in data.decode().split("\n")]
+    return [r["timestamp"] for r in rows], [r["value"] for r in rows]
+
+
+def encode_csv(timestamps, values):
+    f = io.StringIO()
+    csv.writer(f).writerows(zip(timestamps, values))
+    return f.getvalue().encode()
+
+
+def decode_csv(data):
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    return [int(r[0]) for r in rows], [float(r[1]) for r in rows]
+
+
+def encode_gorilla(timestamps, values, block_size):
+    return [
+        encode_block(timestamps[i:i + block_size], values[i:i + block_size])
+        for i in range(0, len(timestamps), block_size)]
+
+
+def decode_gorilla(blocks):
+    timestamps = []
+    values = []
+    for block in blocks:
+        t, v = decode_block(block)
+        timestamps.extend(t)
+        values.extend(v)
+    return timestamps, values
+
+
+def measure(encode, decode, timestamps, values, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        data = encode(timestamps, values)
+    encoded = (time.perf_counter() - started) / repeat
+
+    started = time.perf_counter()
+    for _ in range(repeat):
+        got = decode(data)
+    decoded = (time.perf_counter() - started) / repeat
+
+    size = sum(len(b) for b in data) if isinstance(data, list) else len(data)
+    assert list(got[0]) == list(timestamps)
+    return size, encoded, decoded
+
+
+def main():
+    arg = argparse.ArgumentParser(description=__doc__)
+    arg.add_argument("--archive-dir", default=None, help="columnar archive to read")
+    arg.add_argument("--label", default="Battery Voltage", help="label read from archive")
+    arg.add_argument("--count", type=int, default=105120, help="samples generated")
+    arg.add_argument("--interval", type=int, default=300, help="seconds between samples")
+    arg.add_argument("--block-size", type=int, default=288, help="samples per gorilla block")
+    arg.add_argument("--repeat", type=int, default=3, help="repeat count to average")
+    args = arg.parse_args()
+
+    if args.archive_dir:
+        archive = ColumnarArchive(args.archive_dir)
+        timestamps, values = archive.read(args.label)
+        timestamps = [int(t) for t in timestamps]
+        values = [float(v) for v in values]
+        archive.close()
+    else:
+        random.seed(0)
+        timestamps, values = generate(args.count, args.interval)
+
+    encodings = (
+        ("json", encode_json, decode_json),
+        ("csv", encode_csv, decode_csv),
+        ("gorilla", lambda t, v: encode_gorilla(t, v, args.block_size), decode_gorilla),
+    )
+
+    print("{} samples".format(len(timestamps)))
+    print("{:10s} {:>12s} {:>10s} {:>12s} {:>12s}".format(
+        "encoding", "bytes", "bytes/pt", "encode [s]", "decode [s]"))
+
+    for name, encode, decode in encodings:
+        size, encoded, decoded = measure(encode, decode, timestamps, values, args.repeat)
+        print("{:10s} {:>12d} {:>10.2f} {:>12.4f} {:>12.4f}".format(
+            name, size, size / max(1, len(timestamps)), encoded, decoded))
+
+
+if __name__ == "__main__":
+    main()
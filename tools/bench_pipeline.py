@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding:utf-8 -*-
+
+""" End-to-end benchmark of the monitor pipeline. The real event_loop() polls
+a fake charge controller in process, and the triggers/handlers made by
+config.init_triggers() upload to a local stand-in of keenio with the given
+latency and failure rate. The number of the uploading handlers is increased
+like 1, 10 and 100, and samples per second, p50/p99 tick latency, peak threads
+and peak memory are reported for each. With --workers, the handlers run on the
+worker threads of a shared dispatcher instead of a thread per handler.
+
+    PYTHONPATH=. python tools/bench_pipeline.py --handlers 1,10,100 --ticks 200
+    PYTHONPATH=. python tools/bench_pipeline.py --handlers 1,10,100 --workers 4
+"""
+
+import argparse
+import gc
+import json
+import math
+import random
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import solar_monitor.__main__ as monitor
+from solar_monitor import argparser
+from solar_monitor import config
+from solar_monitor.event.handler import KeenIoEventHandler
+from solar_monitor.watchdog import get_rss
+
+LABELS = (
+    ("Battery Voltage", "Battery", "V"),
+    ("Battery Sense Voltage", "Battery", "V"),
+    ("Target Voltage", "Battery", "V"),
+    ("Charge Current", "Battery", "A"),
+    ("Output Power", "Battery", "W"),
+    ("Array Voltage", "Array", "V"),
+    ("Array Current", "Array", "A"),
+    ("Sweep Vmp", "Array", "V"),
+    ("Sweep Voc", "Array", "V"),
+    ("Heat Sink Temperature", "Temperature", "C"),
+    ("Battery Temperature", "Temperature", "C"),
+    ("Amp Hours", "Counter", "Ah"),
+    ("Kilowatt Hours", "Counter", "kWh"),
+)
+
+
+class FakeSystemStatus(object):
+    """ Fake of tsmppt60_driver.SystemStatus returning diurnal values. """
+
+    started_ = time.monotonic()
+
+    def __init__(self, host_name, port=80):
+        self.host_name_ = host_name
+
+    def get(self, is_all=False):
+        phase = (time.monotonic() - self.started_) / 60.0 * 2 * math.pi
+        sun = max(0.0, math.sin(phase))
+        status = {}
+        for i, (label, group, unit) in enumerate(LABELS):
+            status[label] = {
+                "group": group, "unit": unit,
+                "value": round(10.0 + i + 4.0 * sun + random.gauss(0, 0.01), 2)}
+        return status
+
+
+class FakeChargeController(object):
+    """ Stand-in of tsmppt60_driver module for monitor.CHARGE_CONTROLLER. """
+    SystemStatus = FakeSystemStatus
+
+
+class EndpointServer(ThreadingHTTPServer):
+    """ HTTP server accepting the uploads of all the handlers at once. The
+        default listen backlog of 5 refuses some of 100 handlers connecting
+        at the same tick, which is counted as failure of the pipeline.
+    """
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def start_endpoint(latency, failure_rate):
+    """ Start the stand-in of keenio API.
+
+    Returns:
+        (server, base_url) tuple.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+
+            if random.random() < failure_rate:
+                code, body = 500, {"message": "stand-in failure", "error_code": "Fail"}
+            else:
+                code, body = 200, {"offgrid": [{"success": True}]}
+
+            data = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = EndpointServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, "http://127.0.0.1:{}".format(server.server_address[1])
+
+
+def percentile(values, ratio):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * ratio))]
+
+
+def run(handlers, args, base_url):
+    """ Run the pipeline with the handlers and measure it.
+
+    Returns:
+        dict object of the results.
+    """
+    options = [
+        "-kp", "bench", "-kw", "bench",
+        "--queue-policy", args.queue_policy,
+        "--workers", str(args.workers)]
+    if args.non_blocking:
+        options.append("--non-blocking")
+
+    kwargs = dict(argparser.init(options)._get_kwargs())
+    triggers = config.init_triggers(**kwargs)
+
+    data_updated_trigger = triggers[0]
+    listener_kwargs = {"q_policy": args.queue_policy}
+    if data_updated_trigger.dispatcher_ is not None:
+        listener_kwargs["dispatcher"] = data_updated_trigger.dispatcher_
+
+    while len(data_updated_trigger) < handlers:
+        data_updated_trigger.append(
+            KeenIoEventHandler("bench", "bench", **listener_kwargs))
+
+    for handler in data_updated_trigger.event_handlers_:
+        handler.client_.api.base_url = base_url
+
+    loop_kwargs = {
+        "host_name": "127.0.0.1", "status_all": True, "triggers": triggers,
+        "non_blocking": args.non_blocking}
+
+    gc.collect()
+    tracemalloc.start()
+    monitor.start_triggers(triggers)
+
+    latencies = []
+    peak_threads = threading.active_count()
+    started = time.monotonic()
+
+    for _ in range(args.ticks):
+        tick_started = time.monotonic()
+        monitor.event_loop(**loop_kwargs)
+        latencies.append(time.monotonic() - tick_started)
+        peak_threads = max(peak_threads, threading.active_count())
+
+    monitor.stop_triggers(triggers)
+    elapsed = time.monotonic() - started
+
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    failed = sum(
+        handler.get_status()["failed"]
+        for handler in data_updated_trigger.event_handlers_)
+
+    return {
+        "handlers": len(data_updated_trigger),
+        "samples_per_sec": args.ticks / elapsed,
+        "p50": percentile(latencies, 0.5),
+        "p99": percentile(latencies, 0.99),
+        "threads": peak_threads,
+        "traced_mb": peak_traced / 1024.0 / 1024.0,
+        "rss_mb": get_rss() / 1024.0 / 1024.0,
+        "failed": failed,
+    }
+
+
+def main():
+    arg = argparse.ArgumentParser(description=__doc__)
+    arg.add_argument("--handlers", default="1,10,100", help="comma separated handler counts")
+    arg.add_argument("--ticks", type=int, default=100, help="polls per run")
+    arg.add_argument("--latency", type=float, default=0.005, help="seconds of stand-in response")
+    arg.add_argument("--failure-rate", type=float, default=0.0, help="ratio of stand-in errors")
+    arg.add_argument("--workers", type=int, default=0, help="dispatcher workers, 0 for threads")
+    arg.add_argument("--queue-policy", default="drop_oldest", help="queue policy of listeners")
+    arg.add_argument("--non-blocking", action="store_true", help="don't wait for triggers")
+    args = arg.parse_args()
+
+    random.seed(0)
+    monitor.CHARGE_CONTROLLER = FakeChargeController
+    server, base_url = start_endpoint(args.latency, args.failure_rate)
+
+    print("{:>8s} {:>12s} {:>10s} {:>10s} {:>8s} {:>10s} {:>8s} {:>8s}".format(
+        "handlers", "samples/s", "p50 [ms]", "p99 [ms]", "threads",
+        "traced MB", "RSS MB", "failed"))
+
+    try:
+        for handlers in [int(n) for n in args.handlers.split(",")]:
+            result = run(handlers, args, base_url)
+            print("{handlers:>8d} {samples_per_sec:>12.1f} {p50_ms:>10.2f} {p99_ms:>10.2f} "
+                  "{threads:>8d} {traced_mb:>10.2f} {rss_mb:>8.1f} {failed:>8d}".format(
+                      p50_ms=result["p50"] * 1000, p99_ms=result["p99"] * 1000,
+                      **result))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()